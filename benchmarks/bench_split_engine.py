@@ -0,0 +1,91 @@
+"""单次解码分割 vs 逐片段分割 的耗时对比
+
+用法：python benchmarks/bench_split_engine.py [--length 600] [--min 5] [--max 15]
+
+用 lavfi 生成一段测试视频，按同一组随机切点分别用旧的逐片段方式
+（每段一个 ffmpeg，-ss 放在 -i 之后）和新的单次解码方式分割，输出墙钟时间和子进程 CPU 时间。
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feijian import split_engine  # noqa: E402
+
+
+def make_source(path, length, size):
+    command = ['ffmpeg', '-y', '-loglevel', 'error',
+               '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30:duration={length}',
+               '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={length}',
+               '-c:v', 'libx264', '-preset', 'veryfast', '-g', '250', '-c:a', 'aac', '-shortest', path]
+    subprocess.run(command, check=True)
+
+
+def legacy_split(video_path, segments, output_folder):
+    """旧实现：每个片段单独起一个 ffmpeg，4 个并发"""
+    def extract(part, start, end):
+        command = ['ffmpeg', '-y', '-loglevel', 'error', '-i', video_path,
+                   '-ss', str(start), '-to', str(end),
+                   *split_engine.ENCODE_ARGS,
+                   split_engine.segment_output_path(video_path, output_folder, part)]
+        subprocess.run(command, check=True)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(extract, part, start, end)
+                   for part, (start, end) in enumerate(segments, start=1)]
+        for future in futures:
+            future.result()
+
+
+def children_cpu_time():
+    try:
+        import resource
+    except ImportError:  # Windows 下没有 resource 模块
+        return float('nan')
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(func, *args):
+    cpu_before = children_cpu_time()
+    started = time.perf_counter()
+    func(*args)
+    wall = time.perf_counter() - started
+    return wall, children_cpu_time() - cpu_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--length', type=int, default=600, help='测试视频时长（秒）')
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--min', type=int, default=5, dest='min_duration')
+    parser.add_argument('--max', type=int, default=15, dest='max_duration')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, 'source.mp4')
+        make_source(source, args.length, args.size)
+        segments = split_engine.plan_segments(args.length, args.min_duration, args.max_duration,
+                                              random.Random(args.seed))
+
+        results = {}
+        for name, func in (('per-segment', legacy_split), ('single-pass', split_engine.split_video)):
+            output_folder = os.path.join(workdir, name)
+            os.makedirs(output_folder)
+            results[name] = measure(func, source, segments, output_folder)
+            produced = len([f for f in os.listdir(output_folder) if f.endswith('.mp4')])
+            print(f"{name:>12}: wall {results[name][0]:7.2f}s  cpu {results[name][1]:7.2f}s  files {produced}")
+
+        legacy, single = results['per-segment'], results['single-pass']
+        print(f"{len(segments)} segments, speedup wall x{legacy[0] / single[0]:.2f}, cpu x{legacy[1] / single[1]:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""冷启动耗时预算检查（需要 PyQt5）
+
+用法：python benchmarks/startup.py [--repeat 5] [--import-budget-ms 400] [--window-budget-ms 1200]
+
+每次在新的 Python 进程中测量：
+- import：import main 的耗时（-X importtime 统计的 main 模块累计时间）
+- window：创建 QApplication 和主窗口并显示出第一帧的耗时（包含 import）
+取多次运行的中位数与预算比较，同时检查启动阶段没有导入不该导入的模块
+（feijian 的处理模块、numpy、sqlite3、asyncio 等应在开始任务时才导入，混剪标签页应在第一次切换过去时才创建）。
+超出预算或导入了不该导入的模块时退出码为 1，可以直接放进 CI。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import main 之后不应出现的模块
+DEFERRED_MODULES = [
+    'split_tab', 'montage_tab',
+    'feijian.split_job', 'feijian.montage_job', 'feijian.async_engine', 'feijian.media_cache',
+    'feijian.render_cache', 'feijian.scheduler', 'feijian.library', 'feijian.cut_montage_job', 'feijian.renditions',
+    'feijian.previews', 'feijian.phash', 'numpy', 'sqlite3', 'asyncio', 'ctypes', 'concurrent.futures', 'tempfile',
+]
+
+# 主窗口显示后仍不应出现的模块（分割标签页默认显示，所以 split_tab 此时已导入）
+DEFERRED_AFTER_SHOW = [name for name in DEFERRED_MODULES if name != 'split_tab']
+
+WINDOW_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+import main
+app = QApplication(sys.argv)
+window = main.VideoEditorApp()
+window.show()
+app.processEvents()
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'modules': sorted(sys.modules)}))
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    return env
+
+
+def measure_import():
+    """返回 (import main 的秒数, import 后已加载的模块列表)"""
+    script = "import json, sys, main; print(json.dumps(sorted(sys.modules)))"
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], cwd=ROOT, env=_env(),
+                             capture_output=True, text=True, check=True)
+    seconds = None
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == 'main':
+            seconds = int(parts[1].strip()) / 1e6
+    if seconds is None:
+        raise RuntimeError("无法从 -X importtime 输出中找到 main 模块")
+    return seconds, json.loads(process.stdout)
+
+
+def measure_window():
+    """返回 (显示主窗口的秒数, 显示后已加载的模块列表)"""
+    process = subprocess.run([sys.executable, '-c', WINDOW_SCRIPT], cwd=ROOT, env=_env(),
+                             capture_output=True, text=True, check=True)
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    return result['seconds'], result['modules']
+
+
+def loaded(modules, names):
+    modules = set(modules)
+    return [name for name in names if name in modules]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='非丨剪 冷启动耗时预算检查')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--import-budget-ms', type=float, default=400)
+    parser.add_argument('--window-budget-ms', type=float, default=1200)
+    args = parser.parse_args()
+
+    import_times, window_times = [], []
+    failures = []
+    for _ in range(args.repeat):
+        try:
+            seconds, modules = measure_import()
+            import_times.append(seconds)
+            for name in loaded(modules, DEFERRED_MODULES):
+                failures.append(f"import main 时导入了 {name}")
+            seconds, modules = measure_window()
+            window_times.append(seconds)
+            for name in loaded(modules, DEFERRED_AFTER_SHOW):
+                failures.append(f"显示主窗口时导入了 {name}")
+        except subprocess.CalledProcessError as e:
+            # -X importtime 的统计也在 stderr 中，只输出最后的错误信息
+            print('\n'.join(e.stderr.strip().splitlines()[-5:]), file=sys.stderr)
+            sys.exit(1)
+
+    import_ms = statistics.median(import_times) * 1000
+    window_ms = statistics.median(window_times) * 1000
+    print(f"import main: {import_ms:.1f} ms (budget {args.import_budget_ms:.0f} ms)")
+    print(f"first window: {window_ms:.1f} ms (budget {args.window_budget_ms:.0f} ms)")
+    if import_ms > args.import_budget_ms:
+        failures.append(f"import main 超出预算：{import_ms:.1f} ms")
+    if window_ms > args.window_budget_ms:
+        failures.append(f"显示主窗口超出预算：{window_ms:.1f} ms")
+
+    for failure in sorted(set(failures)):
+        print(f"REGRESSION {failure}")
+    if not failures:
+        print("startup within budget")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
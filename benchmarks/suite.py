@@ -0,0 +1,233 @@
+"""性能基准套件
+
+    python benchmarks/suite.py generate [--media-dir DIR]
+    python benchmarks/suite.py run [--media-dir DIR] [--output result.json] [--repeat 3]
+    python benchmarks/suite.py compare baseline.json result.json [--threshold 0.1]
+
+generate 用 ffmpeg lavfi（testsrc2 + sine）生成固定参数的测试素材，覆盖不同分辨率、编码和时长；
+bitexact + 单线程编码，同一版本 ffmpeg 每次生成的文件相同。
+run 依次测量时长扫描（冷/热缓存）、重新编码分割、流复制分割和混剪（不使用渲染缓存，每次都实际编码），
+记录墙钟时间、CPU 时间（本进程 + 子进程）和吞吐（每秒处理的媒体秒数），取多次运行的中位数。
+compare 对比两份结果，墙钟时间变慢或吞吐下降超过阈值的用例记为回归，存在回归时退出码为 1。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feijian import library, media_cache, scheduler  # noqa: E402
+from feijian.montage_job import MontageJob, SEQUENTIAL  # noqa: E402
+from feijian.split_job import SplitJob  # noqa: E402
+
+DEFAULT_MEDIA_DIR = os.path.join(tempfile.gettempdir(), 'feijian-bench-media')
+
+# (名称, 分辨率, 视频编码, 时长)
+MEDIA_SPECS = [
+    ('h264_360p_20s', '640x360', 'libx264', 20),
+    ('h264_720p_60s', '1280x720', 'libx264', 60),
+    ('h264_1080p_30s', '1920x1080', 'libx264', 30),
+    ('h264_720p_10s', '1280x720', 'libx264', 10),
+    ('mpeg4_480p_30s', '854x480', 'mpeg4', 30),
+    ('mpeg4_720p_15s', '1280x720', 'mpeg4', 15),
+]
+
+
+def generate(media_dir):
+    os.makedirs(media_dir, exist_ok=True)
+    for name, size, codec, length in MEDIA_SPECS:
+        path = os.path.join(media_dir, f'{name}.mp4')
+        if os.path.exists(path):
+            continue
+        command = ['ffmpeg', '-y', '-loglevel', 'error',
+                   '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30:duration={length}',
+                   '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={length}',
+                   '-c:v', codec, '-g', '60', '-threads', '1', '-c:a', 'aac', '-b:a', '96k',
+                   '-map_metadata', '-1', '-fflags', '+bitexact', '-flags:v', '+bitexact',
+                   '-flags:a', '+bitexact', '-shortest', '-f', 'mp4', path + '.part']
+        subprocess.run(command, check=True)
+        os.replace(path + '.part', path)
+        print(f"generated {path}")
+
+
+def _cpu_time():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _media_seconds(folder):
+    cache = media_cache.get_cache()
+    # 分割的输出目录里还有任务日志（见 journal），只统计视频
+    return sum(cache.probe(os.path.join(folder, f)).duration for f in os.listdir(folder) if library.is_video_name(f))
+
+
+def _fresh_cache(workdir):
+    path = os.path.join(workdir, f'media-{time.monotonic_ns()}.sqlite3')
+    return media_cache.configure(db_path=path)
+
+
+def case_scan_cold(media_dir, workdir):
+    cache = _fresh_cache(workdir)
+    files = [os.path.join(media_dir, f) for f in sorted(os.listdir(media_dir))]
+    return lambda: sum(cache.probe(f).duration for f in files)
+
+
+def case_scan_warm(media_dir, workdir):
+    cache = _fresh_cache(workdir)
+    files = [os.path.join(media_dir, f) for f in sorted(os.listdir(media_dir))]
+    for f in files:
+        cache.probe(f)
+    return lambda: sum(cache.probe(f).duration for f in files)
+
+
+def _split_case(fast_copy):
+    def prepare(media_dir, workdir):
+        _fresh_cache(workdir)
+        output = tempfile.mkdtemp(dir=workdir)
+
+        def run():
+            SplitJob(media_dir, output, 3, 8, fast_copy=fast_copy, autotune=False, use_cache=False).run()
+            return _media_seconds(media_dir)
+        return run
+    return prepare
+
+
+def case_montage(media_dir, workdir):
+    # 混剪的输入用统一编码的分割结果，与实际的“先分割再混剪”流程一致
+    _fresh_cache(workdir)
+    clips = tempfile.mkdtemp(dir=workdir)
+    SplitJob(media_dir, clips, 3, 8, autotune=False, use_cache=False).run()
+    output = tempfile.mkdtemp(dir=workdir)
+
+    def run():
+        MontageJob(clips, output, SEQUENTIAL, 30, use_cache=False).run()
+        return _media_seconds(clips)
+    return run
+
+
+CASES = {
+    'scan_cold': case_scan_cold,
+    'scan_warm': case_scan_warm,
+    'split_reencode': _split_case(False),
+    'split_copy': _split_case(True),
+    'montage_concat': case_montage,
+}
+
+
+def measure(prepare, media_dir, repeat):
+    walls, cpus, media = [], [], 0.0
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as workdir:
+            run = prepare(media_dir, workdir)
+            cpu_before = _cpu_time()
+            started = time.perf_counter()
+            media = run()
+            walls.append(time.perf_counter() - started)
+            cpus.append(_cpu_time() - cpu_before)
+            # 释放临时目录里的数据库文件
+            media_cache.get_cache().close()
+            media_cache.configure(db_path=':memory:')
+    wall = statistics.median(walls)
+    return {'wall': round(wall, 4), 'cpu': round(statistics.median(cpus), 4),
+            'media_seconds': round(media, 3), 'throughput': round(media / wall, 3) if wall else None,
+            'runs': [round(w, 4) for w in walls]}
+
+
+def ffmpeg_version():
+    try:
+        output = subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, check=True).stdout
+        return output.decode('utf-8', 'replace').splitlines()[0]
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(media_dir, repeat, only=None, max_jobs=None):
+    generate(media_dir)
+    scheduler.configure(max_jobs=max_jobs)
+    results = {
+        'meta': {'host': platform.node(), 'cpu_count': os.cpu_count(), 'python': platform.python_version(),
+                 'platform': platform.platform(), 'ffmpeg': ffmpeg_version(),
+                 'max_jobs': scheduler.get_scheduler().max_jobs, 'repeat': repeat,
+                 'timestamp': time.strftime("%Y-%m-%d %H:%M:%S")},
+        'cases': {},
+    }
+    for name, prepare in CASES.items():
+        if only and name not in only:
+            continue
+        results['cases'][name] = measure(prepare, media_dir, repeat)
+        print(f"{name:>16}: {results['cases'][name]}", file=sys.stderr)
+    return results
+
+
+def compare(baseline, current, threshold):
+    """返回回归列表 [(用例, 指标, 基准值, 当前值, 变化比例)]"""
+    regressions = []
+    for name, base in baseline['cases'].items():
+        now = current['cases'].get(name)
+        if now is None:
+            continue
+        wall_change = now['wall'] / base['wall'] - 1 if base['wall'] else 0.0
+        if wall_change > threshold:
+            regressions.append((name, 'wall', base['wall'], now['wall'], wall_change))
+        if base.get('throughput') and now.get('throughput') is not None:
+            throughput_change = now['throughput'] / base['throughput'] - 1
+            if throughput_change < -threshold:
+                regressions.append((name, 'throughput', base['throughput'], now['throughput'], throughput_change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='非丨剪 性能基准')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    gen = subparsers.add_parser('generate', help='生成测试素材')
+    gen.add_argument('--media-dir', default=DEFAULT_MEDIA_DIR)
+
+    run_parser = subparsers.add_parser('run', help='运行基准')
+    run_parser.add_argument('--media-dir', default=DEFAULT_MEDIA_DIR)
+    run_parser.add_argument('--output', help='结果 JSON 路径，默认输出到 stdout')
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--max-jobs', type=int)
+    run_parser.add_argument('--case', action='append', choices=sorted(CASES), help='只运行指定用例，可重复')
+
+    cmp_parser = subparsers.add_parser('compare', help='与基准结果对比')
+    cmp_parser.add_argument('baseline')
+    cmp_parser.add_argument('current')
+    cmp_parser.add_argument('--threshold', type=float, default=0.10, help='允许的变化比例')
+
+    args = parser.parse_args()
+    if shutil.which('ffmpeg') is None and args.command != 'compare':
+        raise SystemExit("找不到 ffmpeg")
+
+    if args.command == 'generate':
+        generate(args.media_dir)
+    elif args.command == 'run':
+        results = json.dumps(run(args.media_dir, args.repeat, args.case, args.max_jobs), indent=2,
+                             ensure_ascii=False)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(results + '\n')
+        else:
+            print(results)
+    else:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        for name, metric, before, after, change in regressions:
+            print(f"REGRESSION {name} {metric}: {before} -> {after} ({change:+.1%})")
+        if not regressions:
+            print("no regressions")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
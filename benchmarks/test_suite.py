@@ -0,0 +1,34 @@
+from benchmarks import suite
+from feijian import journal
+
+
+def _result(**cases):
+    return {'meta': {}, 'cases': {name: {'wall': wall, 'throughput': throughput}
+                                  for name, (wall, throughput) in cases.items()}}
+
+
+def test_compare_flags_slower_wall_time_and_lower_throughput():
+    baseline = _result(split=(10.0, 5.0), scan=(1.0, 100.0))
+    current = _result(split=(12.0, 4.0), scan=(1.05, 98.0))
+    regressions = suite.compare(baseline, current, 0.1)
+    assert [(name, metric) for name, metric, _, _, _ in regressions] == [('split', 'wall'), ('split', 'throughput')]
+    assert regressions[0][4] == 12.0 / 10.0 - 1
+
+
+def test_compare_ignores_improvements_and_missing_cases():
+    baseline = _result(split=(10.0, 5.0), montage=(3.0, 10.0))
+    current = _result(split=(5.0, 10.0))
+    assert suite.compare(baseline, current, 0.1) == []
+
+
+def test_compare_tolerates_zero_and_missing_throughput():
+    baseline = _result(scan=(0.0, None))
+    current = _result(scan=(0.5, None))
+    assert suite.compare(baseline, current, 0.1) == []
+
+
+def test_media_seconds_skips_the_journal(tmp_path, fake_media):
+    fake_media(tmp_path / 'a_part1.mp4', 4)
+    fake_media(tmp_path / 'a_part2.mp4', 3.5)
+    (tmp_path / journal.JOURNAL_NAME).write_text('{}\n', encoding='utf-8')
+    assert suite._media_seconds(str(tmp_path)) == 7.5
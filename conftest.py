@@ -0,0 +1,75 @@
+"""pytest 公共设置和夹具"""
+import os
+import sys
+
+import pytest
+
+# 能通过 library.sniff_video 的最小 MP4 文件头
+MP4_HEADER = b'\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2'
+
+# 假 ffprobe：时长取文件中 "duration=<秒数>" 标记，没有标记时探测失败；关键帧每 2 秒一个
+_FAKE_FFPROBE = r'''
+import json
+import sys
+
+with open(sys.argv[-1], 'rb') as f:
+    data = f.read()
+marker = data.find(b'duration=')
+if marker < 0:
+    sys.stderr.write('Invalid data found when processing input\n')
+    sys.exit(1)
+duration = float(data[marker + len(b'duration='):].split()[0])
+if any(arg.startswith('packet=') for arg in sys.argv):
+    print('format|start_time=0.000000')
+    time = 0
+    while time < duration:
+        print(f'packet|pts_time={time:.6f}|flags=K_')
+        time += 2
+else:
+    print(json.dumps({
+        'streams': [
+            {'codec_type': 'video', 'codec_name': 'h264', 'width': 1280, 'height': 720, 'avg_frame_rate': '30/1',
+             'pix_fmt': 'yuv420p', 'time_base': '1/15360'},
+            {'codec_type': 'audio', 'codec_name': 'aac', 'sample_rate': '44100', 'channels': 2,
+             'channel_layout': 'stereo'},
+        ],
+        'format': {'duration': str(duration), 'start_time': '0.000000'},
+    }))
+'''
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """每个测试使用独立的缓存目录，不读写用户的 ~/.cache/feijian"""
+    monkeypatch.setenv('FEIJIAN_CACHE_DIR', str(tmp_path / 'cache'))
+    # 已创建的默认实例指向旧目录，清掉后按新目录重新创建
+    for name, attribute in (('feijian.media_cache', '_default_cache'), ('feijian.render_cache', '_default_cache'),
+                            ('feijian.library', '_default_index')):
+        module = sys.modules.get(name)
+        if module is not None:
+            monkeypatch.setattr(module, attribute, None)
+
+
+@pytest.fixture
+def fake_media(tmp_path, monkeypatch):
+    """把 PATH 中的 ffprobe 换成 _FAKE_FFPROBE，返回创建假视频文件的函数 make(路径, 时长)
+
+    时长为 None 时文件头合法（能被 library.scan 找到）但探测失败。
+    """
+    if sys.platform == 'win32':
+        pytest.skip("假 ffprobe 是带 shebang 的脚本")
+    bin_dir = tmp_path / 'fake-bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'ffprobe'
+    script.write_text(f'#!{sys.executable}\n{_FAKE_FFPROBE}')
+    script.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+
+    def make(path, duration):
+        os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(MP4_HEADER)
+            if duration is not None:
+                f.write(f' duration={duration} '.encode())
+        return str(path)
+    return make
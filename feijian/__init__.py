@@ -0,0 +1 @@
+"""非丨剪 处理核心（不依赖 PyQt5）"""
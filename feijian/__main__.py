@@ -0,0 +1,5 @@
+import sys
+
+from feijian.cli import main
+
+sys.exit(main())
@@ -0,0 +1,123 @@
+"""素材内容分析：镜头切换、黑场和静音
+
+每个源文件只解码一次（缩小到 ANALYSIS_WIDTH 宽再分析），同时得到：
+- 镜头切换：select 滤镜的 scene 分数超过 SCENE_MIN_SCORE 的时间点
+- 黑场：blackdetect 检测到的区间
+- 静音：silencedetect 检测到的区间
+结果由 media_cache 按文件缓存，之后的任务不再解码。修改分析参数时需增加 MediaCache.SCHEMA_VERSION。
+"""
+import json
+import re
+from collections import namedtuple
+
+from feijian.scheduler import ENCODE, get_scheduler
+
+ANALYSIS_WIDTH = 320
+# 记录的最低镜头切换分数；切分时只用分数不低于 SCENE_THRESHOLD 的点
+SCENE_MIN_SCORE = 0.1
+SCENE_THRESHOLD = 0.3
+BLACK_MIN_DURATION = 0.5
+SILENCE_NOISE = '-50dB'
+SILENCE_MIN_DURATION = 1.0
+
+# 黑场或静音占比超过这个值的素材视为无效素材
+DEAD_RATIO = 0.9
+
+# scenes 为 [(时间, 分数), ...]；black、silence 为 [(起点, 终点), ...]；时间均相对文件起点（秒）
+Analysis = namedtuple('Analysis', ['duration', 'scenes', 'black', 'silence'])
+
+_DURATION = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?), start: (-?\d+(?:\.\d+)?)')
+_PTS = re.compile(r'pts_time:(-?\d+(?:\.\d+)?)')
+_SCENE = re.compile(r'lavfi\.scene_score=(\d+(?:\.\d+)?)')
+_BLACK = re.compile(r'black_start:(-?\d+(?:\.\d+)?) black_end:(-?\d+(?:\.\d+)?)')
+_SILENCE_START = re.compile(r'silence_start: (-?\d+(?:\.\d+)?)')
+_SILENCE_END = re.compile(r'silence_end: (-?\d+(?:\.\d+)?)')
+
+
+def build_analysis_command(video_path):
+    video_filter = (f"scale={ANALYSIS_WIDTH}:-2:flags=fast_bilinear,"
+                    f"blackdetect=d={BLACK_MIN_DURATION}:pix_th=0.10,"
+                    f"select='gt(scene,{SCENE_MIN_SCORE})',metadata=print")
+    return ['ffmpeg', '-hide_banner', '-nostats', '-loglevel', 'info', '-i', video_path,
+            '-map', '0:v:0', '-map', '0:a:0?', '-sn', '-dn',
+            '-vf', video_filter,
+            '-af', f'silencedetect=n={SILENCE_NOISE}:d={SILENCE_MIN_DURATION}',
+            '-f', 'null', '-']
+
+
+def parse_analysis_output(stderr):
+    """解析分析命令的日志输出（bytes）"""
+    duration = 0.0
+    start_time = 0.0
+    scenes = []
+    black = []
+    silence = []
+    pts = None
+    silence_start = None
+    for line in stderr.decode('utf-8', 'replace').splitlines():
+        match = _DURATION.search(line)
+        if match:
+            hours, minutes, seconds, start = match.groups()
+            duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+            start_time = float(start)
+            continue
+        match = _PTS.search(line)
+        if match:
+            pts = float(match.group(1))
+            continue
+        match = _SCENE.search(line)
+        if match and pts is not None:
+            scenes.append((round(pts - start_time, 3), round(float(match.group(1)), 3)))
+            pts = None
+            continue
+        match = _BLACK.search(line)
+        if match:
+            black.append((float(match.group(1)) - start_time, float(match.group(2)) - start_time))
+            continue
+        match = _SILENCE_START.search(line)
+        if match:
+            silence_start = max(float(match.group(1)) - start_time, 0.0)
+            continue
+        match = _SILENCE_END.search(line)
+        if match and silence_start is not None:
+            silence.append((silence_start, float(match.group(1)) - start_time))
+            silence_start = None
+    if silence_start is not None:
+        # 静音持续到文件结尾
+        silence.append((silence_start, duration))
+    return Analysis(duration, scenes, black, silence)
+
+
+def analyze_media(video_path):
+    """对一个源文件做一次降分辨率解码，返回 Analysis"""
+    process = get_scheduler().run(build_analysis_command(video_path), kind=ENCODE)
+    if process.returncode != 0:
+        raise RuntimeError(f"素材分析失败: {process.stderr.decode('utf-8', 'replace').strip()[-500:]}")
+    return parse_analysis_output(process.stderr)
+
+
+def pack_analysis(analysis):
+    return json.dumps(analysis._asdict(), separators=(',', ':')).encode()
+
+
+def unpack_analysis(blob):
+    data = json.loads(bytes(blob).decode())
+    return Analysis(data['duration'], [tuple(item) for item in data['scenes']],
+                    [tuple(item) for item in data['black']], [tuple(item) for item in data['silence']])
+
+
+def scene_cuts(analysis, threshold=SCENE_THRESHOLD):
+    """分数不低于 threshold 的镜头切换时间点（升序）"""
+    return [time for time, score in analysis.scenes if score >= threshold]
+
+
+def _coverage(intervals, duration):
+    return sum(max(end - start, 0.0) for start, end in intervals) / duration if duration > 0 else 0.0
+
+
+def is_dead(analysis, duration=None, mute=False):
+    """几乎全是黑场，或（不静音导出时）几乎全是静音的素材"""
+    duration = duration or analysis.duration
+    if _coverage(analysis.black, duration) >= DEAD_RATIO:
+        return True
+    return not mute and _coverage(analysis.silence, duration) >= DEAD_RATIO
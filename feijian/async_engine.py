@@ -0,0 +1,301 @@
+"""asyncio 子进程引擎
+
+线程版调度器里每个 ffprobe/ffmpeg 都要占一个 Python 线程阻塞等待。这里用 asyncio.create_subprocess_exec
+在一个事件循环线程里同时管理大量子进程，按种类用信号量限流，适合一次探测成千上万个文件。
+
+- 异步接口：await engine.run(...) / engine.probe(...) / engine.probe_many(...) / engine.probe_stream(...)
+- 同步接口：engine.run_sync(协程) 在当前线程新建事件循环运行；probe_all / probe_durations / scan_probe 为常用封装
+- probe_stream 接受边扫描边产出路径的迭代器（如 library.scan），找到一个文件就开始探测
+- iter_probe 是同步的流水线阶段：在后台线程边扫描边探测，按扫描顺序逐个产出结果，消费者慢时自动暂停
+- cancel() 可以从任意线程调用，正在运行的子进程会被立即终止，run_sync 抛出 asyncio.CancelledError
+"""
+import asyncio
+import os
+import queue
+import subprocess
+import threading
+import time
+
+from feijian import media_cache, tracing
+from feijian.scheduler import ENCODE, PROBE, get_scheduler, no_window
+
+
+def default_max_probes():
+    return max(32, min(256, (os.cpu_count() or 1) * 8))
+
+
+def _kill(process):
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def _reap(process):
+    """等被杀掉的子进程退出并读完管道，让 transport 在事件循环结束前关闭
+
+    清理期间可能再次被取消（gather 在第一个工作协程取消时就返回，asyncio.run 随后取消剩余的任务），
+    子进程已被杀掉，很快就会结束，这里忽略重复的取消。
+    """
+    while True:
+        try:
+            await process.communicate()
+            return
+        except asyncio.CancelledError:
+            pass
+
+
+class AsyncProcessEngine:
+    def __init__(self, max_probes=None, max_jobs=None):
+        self.max_probes = max_probes or default_max_probes()
+        self.max_jobs = max_jobs  # 编码/复制任务的并发数，默认与全局调度器一致
+        self._cancelled = threading.Event()
+        self._loop = None
+        self._main_task = None
+        self._semaphores = {}
+
+    def _semaphore(self, kind):
+        semaphore = self._semaphores.get(kind)
+        if semaphore is None:
+            limit = self.max_probes if kind == PROBE else (self.max_jobs or get_scheduler().max_jobs)
+            semaphore = self._semaphores[kind] = asyncio.Semaphore(limit)
+        return semaphore
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    async def run(self, command, kind=PROBE, check=False):
+        """运行子进程，返回 subprocess.CompletedProcess（stdout/stderr 为 bytes）；被取消时先杀掉子进程"""
+        if self.cancelled:
+            raise asyncio.CancelledError()
+        if kind == ENCODE:
+            command = get_scheduler().with_threads(command)
+        tracer = tracing.get_tracer()
+        waited = time.perf_counter()
+        async with self._semaphore(kind):
+            started = time.perf_counter()
+            tracer.slot_wait(kind, waited, started)
+            process = await asyncio.create_subprocess_exec(
+                *command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                creationflags=no_window)
+            try:
+                stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                _kill(process)
+                await _reap(process)
+                raise
+        tracer.process(command, kind, started, time.perf_counter(), process.returncode, None)
+
+        result = subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+        if check:
+            result.check_returncode()
+        return result
+
+    async def probe(self, video_path, cache=None):
+        """与 MediaCache.probe 相同：优先读缓存，未命中时调用 ffprobe 并写入缓存"""
+        cache = cache or media_cache.get_cache()
+        st = os.stat(video_path)
+        info = cache.get(video_path, st)
+        if info is None:
+            process = await self.run(media_cache.probe_command(video_path), PROBE)
+            if process.returncode != 0:
+                raise RuntimeError(f"ffprobe 错误: {process.stderr.decode('utf-8', 'replace').strip()}")
+            info = media_cache.parse_probe_output(process.stdout)
+            cache.put(video_path, info, st)
+        return info
+
+    async def _probe_result(self, video_path, on_result):
+        try:
+            info, error = await self.probe(video_path), None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            info, error = None, e
+        if on_result is not None:
+            on_result(video_path, info, error)
+        return info if error is None else error
+
+    async def probe_many(self, video_paths, on_result=None):
+        """并发探测一批文件，返回与 video_paths 顺序一致的列表，失败的项为异常对象
+
+        每完成一个文件在事件循环线程回调 on_result(路径, MediaInfo 或 None, 异常或 None)。
+        只启动 max_probes 个工作协程轮流取文件，文件再多也不会一次创建大量任务。
+        """
+        video_paths = list(video_paths)
+        results = [None] * len(video_paths)
+        pending = iter(enumerate(video_paths))
+
+        async def worker():
+            for index, video_path in pending:
+                results[index] = await self._probe_result(video_path, on_result)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.max_probes, len(video_paths)))))
+        return results
+
+    async def _stream(self, video_paths, handle):
+        """在后台线程迭代 video_paths（扫描目录不阻塞事件循环），边产出边探测
+
+        每完成一个文件在事件循环线程回调 handle(序号, 路径, MediaInfo 或异常)，序号为迭代器产出的顺序。
+        迭代器本身抛出的异常在探测完已找到的文件后重新抛出。
+        """
+        loop = asyncio.get_running_loop()
+        found = asyncio.Queue()
+
+        def produce():
+            try:
+                with tracing.span('scan'):
+                    for item in enumerate(video_paths):
+                        if self.cancelled:
+                            break
+                        loop.call_soon_threadsafe(found.put_nowait, item)
+            finally:
+                try:
+                    loop.call_soon_threadsafe(found.put_nowait, None)
+                except RuntimeError:  # 已取消，事件循环已经结束
+                    pass
+
+        producer = loop.run_in_executor(None, produce)
+
+        async def worker():
+            while True:
+                item = await found.get()
+                if item is None:
+                    # 让其他工作协程也能取到结束标记
+                    found.put_nowait(None)
+                    return
+                index, video_path = item
+                handle(index, video_path, await self._probe_result(video_path, None))
+
+        await asyncio.gather(*(worker() for _ in range(self.max_probes)))
+        await producer
+
+    async def probe_stream(self, video_paths, on_result=None):
+        """与 probe_many 相同，但 video_paths 可以是边扫描边产出的迭代器，找到一个文件就开始探测
+
+        返回 (路径列表, 结果列表)，按迭代器产出的顺序。
+        """
+        paths, results = [], []
+
+        def handle(index, video_path, result):
+            if index >= len(paths):
+                grow = index + 1 - len(paths)
+                paths.extend([None] * grow)
+                results.extend([None] * grow)
+            paths[index], results[index] = video_path, result
+            if on_result is not None:
+                error = result if isinstance(result, Exception) else None
+                on_result(video_path, None if error else result, error)
+
+        await self._stream(video_paths, handle)
+        return paths, results
+
+    async def probe_in_order(self, video_paths, on_result):
+        """边扫描边探测，按迭代器产出的顺序回调 on_result(路径, MediaInfo 或异常)，不保留结果
+
+        先完成的文件等前面的文件完成后再回调。
+        """
+        waiting = {}
+        next_index = 0
+
+        def handle(index, video_path, result):
+            nonlocal next_index
+            waiting[index] = (video_path, result)
+            while next_index in waiting:
+                on_result(*waiting.pop(next_index))
+                next_index += 1
+
+        await self._stream(video_paths, handle)
+
+    def run_sync(self, coro):
+        """在当前线程新建事件循环运行协程并返回结果"""
+        async def main():
+            self._loop = asyncio.get_running_loop()
+            self._main_task = asyncio.current_task()
+            if self.cancelled:
+                raise asyncio.CancelledError()
+            return await coro
+
+        # 信号量属于创建它的事件循环，每次运行重新创建
+        self._semaphores = {}
+        try:
+            return asyncio.run(main())
+        finally:
+            self._loop = self._main_task = None
+            coro.close()
+
+    def cancel(self):
+        """从任意线程取消正在运行的 run_sync，子进程立即被终止"""
+        self._cancelled.set()
+        loop, task = self._loop, self._main_task
+        if loop is not None and task is not None:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:  # 事件循环已经结束
+                pass
+
+
+def probe_all(video_paths, max_probes=None):
+    """同步接口：并发探测，返回 MediaInfo 列表；有文件失败时在全部完成后抛出第一个错误"""
+    engine = AsyncProcessEngine(max_probes)
+    results = engine.run_sync(engine.probe_many(video_paths))
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return results
+
+
+def scan_probe(video_paths, max_probes=None):
+    """同步接口：video_paths 可以是 library.scan 的生成器，边扫描边探测；返回 (路径列表, 结果列表)，失败的项为异常对象"""
+    engine = AsyncProcessEngine(max_probes)
+    return engine.run_sync(engine.probe_stream(video_paths))
+
+
+def iter_probe(video_paths, max_probes=None, window=None):
+    """同步生成器：在后台线程边扫描边探测，按 video_paths 的顺序逐个产出 (路径, MediaInfo 或异常)
+
+    已找到但还没被取走的文件最多 window 个（默认 max_probes 的 4 倍），消费者处理得慢时扫描和探测随之暂停，
+    素材再多内存占用也不会增长。生成器提前关闭时取消剩余的探测。
+    """
+    engine = AsyncProcessEngine(max_probes)
+    slots = threading.Semaphore(window or engine.max_probes * 4)
+    results = queue.Queue()
+    finished = object()
+
+    def throttled():
+        for video_path in video_paths:
+            slots.acquire()
+            if engine.cancelled:
+                return
+            yield video_path
+
+    def run():
+        try:
+            engine.run_sync(engine.probe_in_order(throttled(), lambda *item: results.put(item)))
+            results.put((finished, None))
+        except BaseException as e:
+            results.put((finished, e))
+
+    thread = threading.Thread(target=run, name='feijian-probe', daemon=True)
+    thread.start()
+    try:
+        while True:
+            video_path, result = results.get()
+            if video_path is finished:
+                if result is not None and not engine.cancelled:
+                    raise result
+                return
+            slots.release()
+            yield video_path, result
+    finally:
+        engine.cancel()
+        # 唤醒可能正在等待窗口的扫描线程
+        slots.release()
+        thread.join()
+
+
+def probe_durations(video_paths, max_probes=None):
+    """同步接口：并发探测时长，失败的文件为 None"""
+    engine = AsyncProcessEngine(max_probes)
+    results = engine.run_sync(engine.probe_many(video_paths))
+    return [None if isinstance(result, Exception) else result.duration for result in results]
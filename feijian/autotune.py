@@ -0,0 +1,172 @@
+"""编码并发数自动调节
+
+任务运行期间定期统计吞吐（每秒墙钟时间处理的媒体秒数）和系统负载，
+用爬山法增减调度器的 max_jobs：吞吐提升就沿同一方向继续，下降就反向。
+每台机器、每种编码预设的最佳并发数记录在缓存目录，下次直接从该值起步。
+"""
+import json
+import logging
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+
+from feijian.media_cache import default_cache_dir
+from feijian.scheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+# 吞吐至少提升这么多才认为调整有效，过滤掉测量噪声
+MIN_GAIN = 0.05
+# 每核平均负载超过该值时不再加并发
+MAX_LOAD_PER_CORE = 1.5
+
+
+def machine_key(preset):
+    return f"{platform.node()}|{os.cpu_count()}|{preset}"
+
+
+def _state_path():
+    return os.path.join(default_cache_dir(), 'autotune.json')
+
+
+def _load_state(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _load_per_core():
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):  # Windows 没有 getloadavg
+        return None
+
+
+class ConcurrencyTuner:
+    """在后台线程里调节 scheduler.max_jobs
+
+    一个测量窗口至少持续 interval 秒，并且至少完成与当前并发数相同的任务数，
+    否则长任务还没结束时吞吐会被低估。
+    """
+
+    def __init__(self, preset, scheduler=None, interval=10.0, state_path=None):
+        self.preset = preset
+        self.scheduler = scheduler or get_scheduler()
+        self.interval = interval
+        self.state_path = state_path or _state_path()
+        self.key = machine_key(preset)
+        self.max_level = self.scheduler.cores
+        self.best_level = None
+        self.best_throughput = 0.0
+        self.history = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._initial_level = self.scheduler.max_jobs
+
+    def start(self):
+        saved = _load_state(self.state_path).get(self.key)
+        if saved:
+            self.scheduler.set_max_jobs(min(saved['max_jobs'], self.max_level))
+        self._thread = threading.Thread(target=self._loop, name='feijian-autotune', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._save()
+        # 之后的任务沿用测得的最佳并发数
+        self.scheduler.set_max_jobs(self.best_level or self._initial_level)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _measure(self):
+        """等待一个测量窗口结束，返回吞吐；任务结束时返回 None"""
+        scheduler = self.scheduler
+        started = time.monotonic()
+        media_start = scheduler.media_seconds
+        jobs_start = scheduler.completed_jobs
+        while not self._stop.wait(1.0):
+            elapsed = time.monotonic() - started
+            finished = scheduler.completed_jobs - jobs_start
+            if elapsed >= self.interval and (finished >= scheduler.max_jobs or elapsed >= self.interval * 6):
+                return (scheduler.media_seconds - media_start) / elapsed
+        return None
+
+    def _loop(self):
+        direction = 1
+        previous = None
+        while True:
+            throughput = self._measure()
+            if throughput is None:
+                return
+            level = self.scheduler.max_jobs
+            load = _load_per_core()
+            self.history.append({'max_jobs': level, 'throughput': throughput, 'load': load})
+            if throughput > self.best_throughput:
+                self.best_throughput = throughput
+                self.best_level = level
+
+            if previous is not None and throughput < previous * (1 + MIN_GAIN):
+                direction = -direction
+            if direction > 0 and load is not None and load > MAX_LOAD_PER_CORE:
+                direction = -1
+            previous = throughput
+
+            new_level = min(max(level + direction, 1), self.max_level)
+            if new_level == level:
+                direction = -direction
+                new_level = min(max(level + direction, 1), self.max_level)
+            self.scheduler.set_max_jobs(new_level)
+
+    def _save(self):
+        if self.best_level is None:
+            return
+        state = _load_state(self.state_path)
+        state[self.key] = {'max_jobs': self.best_level, 'throughput': round(self.best_throughput, 3),
+                           'updated': time.strftime("%Y-%m-%d %H:%M:%S")}
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.warning("无法保存并发调节结果: %s", e)
+
+
+_active_lock = threading.Lock()
+_active = None
+
+
+@contextmanager
+def tuned(preset, enabled=True):
+    """with tuned(preset): ... 在代码块运行期间启用自动调节
+
+    同一时间只允许一个调节器，分割和混剪同时运行时后来者不再另起调节，避免互相干扰。
+    """
+    global _active
+    tuner = None
+    if enabled:
+        with _active_lock:
+            if _active is None:
+                _active = tuner = ConcurrencyTuner(preset)
+    if tuner is None:
+        yield None
+        return
+    tuner.start()
+    try:
+        yield tuner
+    finally:
+        tuner.stop()
+        with _active_lock:
+            _active = None
@@ -0,0 +1,320 @@
+"""命令行入口（无界面，供渲染服务器批量使用）
+
+    python -m feijian split --manifest jobs.json
+    python -m feijian split 输入文件夹 输出目录 --min 5 --max 15 [--fast-copy] [--snap-scenes]
+    python -m feijian montage --manifest jobs.json
+    python -m feijian montage 输入文件夹 输出目录 --duration 60 [--order sequential|random] [--mute] [--skip-dead]
+        [--dedupe drop|spread]
+    python -m feijian cut-montage 输入文件夹 输出目录 --duration 60 --min 3 --max 8 [--fast-copy] [混剪参数...]
+    以上三种任务都可以加 --renditions 1080p,720p,vertical：一次解码输出多个规格，分别写到导出目录下的规格子目录
+    以及 --previews thumbnail,sprite,clip（或 all）：同一次解码生成缩略图、预览拼图和预览短片，写到 feijian-previews 子目录
+    python -m feijian cache stats|clear
+    python -m feijian probe 文件夹或视频文件... [--max-probes 128]
+    python -m feijian worker --connect 协调端地址:47800 [--capacity 4] [--no-shared-storage]
+
+清单文件是任务列表（或 {"jobs": [...]}），每项字段与命令行参数同名：
+    {"type": "split", "input": "...", "output": "...", "min": 5, "max": 15, "fast_copy": false,
+     "snap_scenes": false}
+    {"type": "montage", "input": "...", "output": "...", "duration": 60, "order": "random", "mute": false,
+     "tolerance": 3, "skip_dead": false, "dedupe": "drop"}
+    {"type": "cut-montage", ...混剪字段, "min": 3, "max": 8, "fast_copy": false, "snap_scenes": false}
+每项都可以有 "renditions": ["1080p", "vertical", "square=1080x1080:crop"]（规格写法见 renditions 模块）
+和 "previews": ["thumbnail", "sprite", "clip"]（见 previews 模块）。
+未写 type 的任务按当前子命令处理，type 与子命令不同的任务跳过。
+cut-montage 按分割的时长规则在内存中规划素材区间，直接从原素材合成，不生成中间片段文件。
+分割切点和乱序分组由 seed（默认 0）决定，参数相同的重复运行直接复用渲染缓存。
+--snap-scenes（切点对齐镜头切换）和 --skip-dead（跳过黑屏/静音素材）需要分析素材，结果存入元数据缓存。
+--dedupe 按感知哈希找出近似重复的素材（重新上传、转码的同一段画面，哈希存入元数据缓存）：
+drop 去掉后出现的重复素材，spread（只用于乱序合成）保留全部素材但让重复素材尽量分到不同的组。
+
+进度以 JSON Lines 输出到 stdout，每行一个事件：started / progress / error / completed / failed / summary；
+cache 子命令输出一行 cache 事件（条数、占用字节、命中率）。
+其它提示（缓存不可用、跳过的素材等）通过 logging 输出到 stderr，不混入事件流。
+--resume 跳过输出目录任务日志中已完成的文件或合成组，只重做未完成的部分。
+--trace / --metrics / --profile 输出各阶段耗时和子进程资源用量，见 tracing 模块。
+--coordinator 地址:端口 让本进程作为协调端，分割和拼接交给连接上来的工作节点（见 distributed 模块）；
+--local-workers N 在本机启动 N 个工作节点，只给出它时协调端只监听 127.0.0.1 的随机端口。
+工作节点加入/断开和任务重试输出 worker_joined / worker_lost / task_retry 事件。
+本模块及其依赖都不导入 PyQt5。
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from feijian import scheduler, tracing
+
+ORDERS = {'sequential': "顺序合成", 'random': "乱序合成", "顺序合成": "顺序合成", "乱序合成": "乱序合成"}
+
+_print_lock = threading.Lock()
+
+
+def emit(event, **fields):
+    """输出一行 JSON 事件"""
+    line = json.dumps({'event': event, 'time': round(time.time(), 3), **fields}, ensure_ascii=False)
+    with _print_lock:
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+
+
+def load_manifest(path, job_type):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    jobs = data.get('jobs', []) if isinstance(data, dict) else data
+    return [job for job in jobs if job.get('type', job_type) == job_type]
+
+
+def jobs_from_args(args):
+    if args.manifest:
+        return load_manifest(args.manifest, args.command)
+    if not args.input or not args.output:
+        raise SystemExit("需要 --manifest，或者同时给出输入和输出路径")
+    job = {'input': args.input, 'output': args.output}
+    if args.command in ('split', 'cut-montage'):
+        job.update({'min': args.min, 'max': args.max, 'fast_copy': args.fast_copy,
+                    'snap_scenes': args.snap_scenes})
+    if args.command in ('montage', 'cut-montage'):
+        job.update({'duration': args.duration, 'order': args.order, 'mute': args.mute,
+                    'tolerance': args.tolerance, 'skip_dead': args.skip_dead, 'dedupe': args.dedupe})
+    job['seed'] = args.seed
+    if args.renditions:
+        job['renditions'] = args.renditions.split(',')
+    if args.previews:
+        job['previews'] = args.previews.split(',')
+    return [job]
+
+
+class _Progress:
+    """任务进度事件：百分比、速度（相对实时的倍数）、合计 fps 和预计剩余秒数，约每半秒一行"""
+
+    def __init__(self, index, job):
+        self.index = index
+        self.input = job['input']
+
+    def __call__(self, info):
+        emit('progress', job=self.index, input=self.input, percent=info.percent,
+             speed=round(info.speed, 2) if info.speed else None, fps=round(info.fps, 1) if info.fps else None,
+             eta=round(info.eta) if info.eta is not None else None)
+
+    def error(self, message):
+        emit('error', job=self.index, input=self.input, message=message)
+
+
+def build_job(command, index, job, autotune, use_cache=True, resume=False, coordinator=None):
+    progress = _Progress(index, job)
+    seed = job.get('seed', 0)
+    renditions = None
+    if job.get('renditions'):
+        from feijian.renditions import parse_renditions
+        renditions = parse_renditions(job['renditions'])
+    previews = ()
+    if job.get('previews'):
+        from feijian.previews import parse_previews
+        previews = parse_previews(job['previews'])
+    if command == 'split':
+        from feijian.split_job import SplitJob
+        if job.get('min') is None or job.get('max') is None:
+            raise ValueError("分割任务需要 min 和 max")
+        os.makedirs(job['output'], exist_ok=True)
+        return SplitJob(job['input'], job['output'], int(job['min']), int(job['max']),
+                        fast_copy=bool(job.get('fast_copy')), autotune=autotune, status=progress,
+                        seed=seed, use_cache=use_cache, resume=resume,
+                        snap_scenes=bool(job.get('snap_scenes')), coordinator=coordinator, renditions=renditions,
+                        previews=previews)
+
+    if job.get('duration') is None:
+        raise ValueError("混剪任务需要 duration")
+    order = ORDERS[job.get('order') or 'random']
+    tolerance = job.get('tolerance')
+    options = dict(mute=bool(job.get('mute')), autotune=autotune,
+                   tolerance=float(tolerance) if tolerance is not None else None, status=progress,
+                   error=progress.error, seed=seed, use_cache=use_cache, resume=resume,
+                   skip_dead=bool(job.get('skip_dead')), coordinator=coordinator, renditions=renditions,
+                   previews=previews, dedupe=job.get('dedupe') or None)
+    if command == 'cut-montage':
+        from feijian.cut_montage_job import CutMontageJob
+        if job.get('min') is None or job.get('max') is None:
+            raise ValueError("剪切混剪任务需要 min 和 max")
+        return CutMontageJob(job['input'], job['output'], order, float(job['duration']), int(job['min']),
+                             int(job['max']), fast_copy=bool(job.get('fast_copy')),
+                             snap_scenes=bool(job.get('snap_scenes')), **options)
+
+    from feijian.montage_job import MontageJob
+    return MontageJob(job['input'], job['output'], order, float(job['duration']), **options)
+
+
+def run_jobs(command, jobs, autotune=True, use_cache=True, resume=False, coordinator=None):
+    """依次执行任务（每个任务内部由调度器并行），返回失败的任务数"""
+    failed = 0
+    started_all = time.monotonic()
+    for index, job in enumerate(jobs):
+        emit('started', job=index, type=command, input=job.get('input'), output=job.get('output'))
+        started = time.monotonic()
+        try:
+            runner = build_job(command, index, job, autotune, use_cache, resume, coordinator)
+            output_folder = runner.run()
+        except Exception as e:
+            failed += 1
+            emit('failed', job=index, input=job.get('input'), message=str(e))
+        else:
+            extra = {'plan': runner.plan_stats} if getattr(runner, 'plan_stats', None) else {}
+            emit('completed', job=index, input=job['input'], output=output_folder,
+                 elapsed=round(time.monotonic() - started, 3), **extra)
+        # 每个任务结束后更新追踪文件，批量运行中途也能查看
+        tracing.flush()
+    emit('summary', jobs=len(jobs), failed=failed, elapsed=round(time.monotonic() - started_all, 3))
+    return failed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m feijian', description='非丨剪 命令行批处理')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(sub):
+        sub.add_argument('input', nargs='?', help='输入文件夹或视频文件')
+        sub.add_argument('output', nargs='?', help='输出目录')
+        sub.add_argument('--manifest', help='任务清单 JSON 文件')
+        sub.add_argument('--max-jobs', type=int, help='同时运行的 ffmpeg 数量')
+        sub.add_argument('--cores', type=int, help='分配给 ffmpeg 的 CPU 核心数')
+        sub.add_argument('--no-autotune', action='store_true', help='关闭并发数自动调节')
+        sub.add_argument('--seed', type=int, default=0, help='随机种子，相同种子重复运行结果相同')
+        sub.add_argument('--no-render-cache', action='store_true', help='不读写渲染缓存')
+        sub.add_argument('--resume', action='store_true', help='按输出目录中的任务日志继续未完成的任务')
+        sub.add_argument('--trace', help='写入 Chrome trace JSON 的路径')
+        sub.add_argument('--metrics', help='写入 Prometheus textfile 的路径')
+        sub.add_argument('--profile', help='写入 cProfile 统计（pstats 格式）的路径')
+        sub.add_argument('--coordinator', help='作为协调端监听的地址（主机:端口），任务交给工作节点执行')
+        sub.add_argument('--local-workers', type=int, default=0, help='在本机启动的工作节点数量')
+        sub.add_argument('--worker-capacity', type=int, help='本机工作节点各自同时执行的任务数')
+        sub.add_argument('--renditions', help='输出规格，逗号分隔（如 1080p,720p,vertical），一次解码输出到各规格子目录')
+        sub.add_argument('--previews', help='同时生成的预览，逗号分隔（thumbnail,sprite,clip 或 all）')
+
+    def add_split(sub):
+        sub.add_argument('--min', type=int, help='最小时长（秒）')
+        sub.add_argument('--max', type=int, help='最大时长（秒）')
+        sub.add_argument('--fast-copy', action='store_true', help='切点对齐关键帧，不重新编码')
+        sub.add_argument('--snap-scenes', action='store_true', help='重新编码时切点尽量对齐镜头切换')
+
+    def add_montage(sub):
+        sub.add_argument('--duration', type=float, help='单个合成视频时长（秒）')
+        sub.add_argument('--order', choices=['sequential', 'random'], default='random')
+        sub.add_argument('--mute', action='store_true', help='静音导出')
+        sub.add_argument('--tolerance', type=float, help='输出时长允许偏离目标的秒数')
+        sub.add_argument('--skip-dead', action='store_true', help='跳过几乎全黑或全静音的素材')
+        sub.add_argument('--dedupe', choices=['drop', 'spread'], help='近似重复素材：去掉（drop）或分到不同的组（spread）')
+
+    split = subparsers.add_parser('split', help='视频分割')
+    add_common(split)
+    add_split(split)
+
+    montage = subparsers.add_parser('montage', help='视频混剪')
+    add_common(montage)
+    add_montage(montage)
+
+    cut_montage = subparsers.add_parser('cut-montage', help='剪切混剪（按分割规则取素材区间直接合成，不生成片段文件）')
+    add_common(cut_montage)
+    add_split(cut_montage)
+    add_montage(cut_montage)
+
+    cache = subparsers.add_parser('cache', help='渲染缓存')
+    cache.add_argument('action', choices=['stats', 'clear'])
+
+    probe = subparsers.add_parser('probe', help='并发探测媒体信息（结果写入元数据缓存）')
+    probe.add_argument('paths', nargs='+', help='文件夹或视频文件')
+    probe.add_argument('--max-probes', type=int, help='同时运行的 ffprobe 数量')
+
+    worker = subparsers.add_parser('worker', help='作为工作节点连接协调端')
+    worker.add_argument('--connect', required=True, help='协调端地址（主机:端口）')
+    worker.add_argument('--capacity', type=int, help='同时执行的任务数，默认为 ffmpeg 并发数')
+    worker.add_argument('--name', help='节点名称，默认为 主机名:进程号')
+    worker.add_argument('--no-shared-storage', action='store_true',
+                        help='与协调端没有共享存储：输入随任务上传，输出传回协调端')
+    worker.add_argument('--exit-when-done', action='store_true', help='协调端断开后退出，不再重连')
+    worker.add_argument('--max-jobs', type=int, help='同时运行的 ffmpeg 数量')
+    worker.add_argument('--cores', type=int, help='分配给 ffmpeg 的 CPU 核心数')
+    return parser
+
+
+def probe_command(paths, max_probes=None):
+    """每个文件输出一行 probe 事件，全部在一个事件循环里并发完成"""
+    from feijian import library
+    from feijian.async_engine import AsyncProcessEngine
+
+    def found():
+        # 递归扫描所有路径，找到一个文件就开始探测
+        for path in paths:
+            yield from library.scan(path)
+
+    def on_result(video_path, info, error):
+        if error is not None:
+            emit('error', input=video_path, message=str(error))
+        else:
+            emit('probe', input=video_path, **info._asdict())
+
+    started = time.monotonic()
+    engine = AsyncProcessEngine(max_probes)
+    video_paths, results = engine.run_sync(engine.probe_stream(found(), on_result))
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    emit('summary', files=len(video_paths), failed=failed, elapsed=round(time.monotonic() - started, 3))
+    return 1 if failed else 0
+
+
+def cache_command(action):
+    from feijian import render_cache
+    cache = render_cache.get_cache()
+    if action == 'clear':
+        cache.clear()
+    emit('cache', **cache.stats())
+    return 0
+
+
+def worker_command(args):
+    from feijian.distributed import Worker, parse_address
+    if args.max_jobs or args.cores:
+        scheduler.configure(max_jobs=args.max_jobs, cores=args.cores)
+    worker = Worker(parse_address(args.connect, '127.0.0.1'), capacity=args.capacity, name=args.name,
+                    shared_storage=not args.no_shared_storage)
+    worker.serve_forever(exit_when_done=args.exit_when_done)
+    return 0
+
+
+def start_coordinator(args):
+    """按 --coordinator / --local-workers 创建协调端，都没有给出时返回 None"""
+    if not args.coordinator and not args.local_workers:
+        return None
+    from feijian.distributed import Coordinator, parse_address
+    address = parse_address(args.coordinator) if args.coordinator else ('127.0.0.1', 0)
+    coordinator = Coordinator(address, on_event=emit)
+    emit('coordinator', address=f'{coordinator.address[0]}:{coordinator.address[1]}')
+    if args.local_workers:
+        coordinator.spawn_local_workers(args.local_workers, args.worker_capacity)
+    return coordinator
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s: %(message)s')
+    if args.command == 'cache':
+        return cache_command(args.action)
+    if args.command == 'probe':
+        return probe_command(args.paths, args.max_probes)
+    if args.command == 'worker':
+        return worker_command(args)
+    if args.max_jobs or args.cores:
+        scheduler.configure(max_jobs=args.max_jobs, cores=args.cores)
+    if args.trace or args.metrics or args.profile:
+        tracing.enable(args.trace, args.metrics, args.profile)
+    jobs = jobs_from_args(args)
+    coordinator = start_coordinator(args)
+    run = tracing.get_tracer().wrap(run_jobs)
+    try:
+        failed = run(args.command, jobs, autotune=not args.no_autotune and not args.max_jobs,
+                     use_cache=not args.no_render_cache, resume=args.resume, coordinator=coordinator)
+    finally:
+        if coordinator is not None:
+            coordinator.close()
+    tracing.flush()
+    return 1 if failed else 0
@@ -0,0 +1,144 @@
+"""剪切混剪：不生成中间片段文件，直接从原素材的时间区间合成
+
+按分割的时长规则在内存中规划每个素材的随机区间（见 split_engine.plan_split），把区间当作素材交给混剪的分组，
+每组用一个 ffmpeg 从原文件读出各个区间拼接：
+- 流复制：fast_copy 且本组素材规格一致、可直接封装时，用 concat 分离器的 inpoint/outpoint（区间已对齐关键帧）
+- 重新编码：其它情况（包括多规格输出），每个区间作为一个输入端 seek 的输入，在一个滤镜图里统一规格后 concat
+  （见 montage_job.build_encode_command）
+"""
+import os
+import tempfile
+from collections import deque
+
+from feijian import journal, media_cache, normalize, render_cache, split_engine, tracing
+from feijian import previews as preview_specs
+from feijian.montage_job import MontageJob, add_copy_previews, preview_part_paths, run_encode
+from feijian.scheduler import COPY, ENCODE, get_scheduler
+
+# 渲染命令变化时增加版本号，旧的渲染缓存自然失效
+CUT_VERSION = 1
+
+
+def _format_time(seconds):
+    return f"{seconds:.3f}"
+
+
+def _copy_command(clips, infos, list_path, output_path, mute, preview_paths=None):
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for (video_file, start, end), info in zip(clips, infos):
+            escaped = os.path.abspath(video_file).replace("'", "'\\''")
+            # inpoint/outpoint 是文件内的时间戳，要加上起始时间
+            offset = info.start_time or 0.0
+            f.write(f"file '{escaped}'\ninpoint {_format_time(start + offset)}\n"
+                    f"outpoint {_format_time(end + offset)}\n")
+    command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+               '-f', 'concat', '-safe', '0', '-i', list_path]
+    preview_args = add_copy_previews(command, sum(end - start for _, start, end in clips), preview_paths, mute)
+    command.extend(['-c', 'copy'])
+    if mute:
+        command.append('-an')
+    command.extend(['-f', 'mp4', output_path])
+    command.extend(preview_args)
+    return command
+
+
+def render_ranges(clips, output_video_path, mute=False, fast_copy=False, progress=None, renditions=None,
+                  previews=()):
+    """把 [(源文件, 起点, 终点), ...] 依次拼接成 output_video_path，失败时抛出异常（分布式模式下由远程节点直接调用）
+
+    renditions 不为空时一次解码输出各规格，路径见 renditions.output_paths；previews 不为空时同时生成预览。
+    """
+    infos = [media_cache.get_media_info(video_file) for video_file, _, _ in clips]
+    copy = (fast_copy and not renditions and all(split_engine.can_stream_copy(info) for info in infos)
+            and len({normalize.profile_of(info, mute) for info in infos}) == 1)
+    if not copy:
+        run_encode(clips, output_video_path, mute, progress, renditions, previews)
+        return
+    list_path = None
+    part_path = journal.part_path(output_video_path)
+    preview_paths = preview_part_paths(output_video_path, previews)
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.txt') as f:
+            list_path = f.name
+        command = _copy_command(clips, infos, list_path, part_path, mute, preview_paths)
+        with tracing.span('encode', files=len(clips), output=output_video_path, mode='copy'):
+            get_scheduler().run(command, kind=ENCODE if previews else COPY, check=True, progress=progress)
+        journal.commit_part(output_video_path)
+        for path in preview_specs.preview_paths(output_video_path, previews).values():
+            journal.commit_part(path)
+    finally:
+        if list_path is not None:
+            try:
+                os.remove(list_path)
+            except OSError:
+                pass
+        render_cache.remove_quietly(part_path)
+        for path in preview_paths.values():
+            render_cache.remove_quietly(path)
+
+
+class CutMontageJob(MontageJob):
+    """剪切混剪：每个素材按 [min_duration, max_duration] 的随机时长规划区间，区间按目标时长分组后直接从原文件渲染
+
+    组内的素材为 [源文件, 起点, 终点]。切点由 (素材内容, 时长参数, seed) 决定，重复运行得到相同的区间和分组，
+    可以恢复和命中渲染缓存。其余参数与 MontageJob 相同。
+    """
+
+    def __init__(self, folder_path, export_path, order, target_duration, min_duration, max_duration,
+                 fast_copy=False, snap_scenes=False, **kwargs):
+        super().__init__(folder_path, export_path, order, target_duration, **kwargs)
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.fast_copy = fast_copy
+        self.snap_scenes = snap_scenes
+
+    def journal_params(self):
+        params = super().journal_params()
+        params.update({'cut': True, 'min': self.min_duration, 'max': self.max_duration,
+                       'fast_copy': bool(self.fast_copy), 'snap_scenes': bool(self.snap_scenes)})
+        return params
+
+    def plan_source(self, video_file):
+        rng = split_engine.plan_rng(video_file, self.min_duration, self.max_duration, self.fast_copy, self.seed)
+        segments, _ = split_engine.plan_split(video_file, self.min_duration, self.max_duration, self.fast_copy,
+                                              rng, self.snap_scenes)
+        return segments
+
+    def clip_source(self, clip):
+        return clip[0]
+
+    def stream_clips(self):
+        """按扫描顺序逐个产出 ([源文件, 起点, 终点], 时长)；后面几个素材的区间规划（关键帧、镜头分析）预先提交"""
+        scheduler = get_scheduler()
+        lookahead = scheduler.max_jobs * 2
+        planning = deque()
+        sources = super().stream_clips()
+
+        def ready():
+            video_file, future = planning.popleft()
+            for start, end in future.result():
+                yield [video_file, start, end], end - start
+
+        try:
+            for video_file, _ in sources:
+                planning.append((video_file, scheduler.submit(self.plan_source, video_file)))
+                while len(planning) > lookahead:
+                    yield from ready()
+            while planning:
+                yield from ready()
+        finally:
+            sources.close()
+
+    def render(self, group, output_video_path, progress=None):
+        render_ranges(group, output_video_path, self.mute, self.fast_copy, progress, self.renditions, self.previews)
+
+    def remote_task(self, group, output_video_path):
+        payload = {'clips': group, 'output': os.path.abspath(output_video_path), 'mute': self.mute,
+                   'fast_copy': self.fast_copy, 'renditions': [list(rendition) for rendition in self.renditions],
+                   'previews': list(self.previews)}
+        return 'cut', payload, list(dict.fromkeys(video_file for video_file, _, _ in group))
+
+    def cache_args(self, group):
+        ranges = [[round(start, 3), round(end, 3)] for _, start, end in group]
+        return ([video_file for video_file, _, _ in group],
+                ['cut', CUT_VERSION, ranges, self.mute, bool(self.fast_copy)])
@@ -0,0 +1,526 @@
+"""分布式分割/混剪
+
+一台机器运行任务（协调端），在本地完成扫描、探测和规划，把每个源文件的分割和每个合成组的拼接
+作为任务通过 TCP 发给工作节点执行；结果写回同一个导出目录，目录结构与单机运行相同。
+
+    python -m feijian worker --connect 协调端地址:47800 [--capacity 4] [--no-shared-storage]
+    python -m feijian split 输入 输出 --min 5 --max 15 --coordinator 0.0.0.0:47800 [--local-workers 3]
+
+协议为 JSON Lines，每条消息一行；消息带有 blobs 字段时，紧跟着按顺序的原始文件字节：
+    工作节点 -> 协调端  {"type": "hello", "name": ..., "capacity": 4, "shared_storage": true}
+    协调端 -> 工作节点  {"type": "task", "id": 1, "kind": "split"|"concat"|"cut", "payload": {...}, "inputs": [...]}
+    工作节点 -> 协调端  {"type": "progress", "id": 1, "position": 12.5, "speed": 3.1, "fps": 90}
+    工作节点 -> 协调端  {"type": "result", "id": 1, "ok": true, "folders": [...]} / {"type": "result", "id": 1, "ok": false, "error": ...}
+    协调端 -> 工作节点  {"type": "shutdown"}
+
+- 容量：每个工作节点在 hello 中声明可同时执行的任务数（默认为它自己调度器的 max_jobs），协调端不会超发
+- 数据：共享存储（各节点看到相同的绝对路径）时只传路径，输出直接写进导出目录；
+  工作节点声明 shared_storage 为 false 时，协调端随任务上传输入文件，工作节点把输出文件传回，
+  folders 为各文件所在的子目录（多规格输出的规格子目录、预览子目录，"." 表示输出目录本身）
+- 重试：任务失败或工作节点断开时换一个没试过的节点重做，最多 MAX_ATTEMPTS 次
+"""
+import itertools
+import json
+import logging
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from feijian import journal, tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 47800
+MAX_ATTEMPTS = 3
+# 工作节点上报进度的最短间隔（秒）
+PROGRESS_INTERVAL = 0.5
+HELLO_TIMEOUT = 10
+RECONNECT_INTERVAL = 2
+_CHUNK = 1 << 20
+
+
+def parse_address(text, default_host='0.0.0.0'):
+    """"主机:端口" 或 "端口" 解析为 (主机, 端口)"""
+    host, sep, port = str(text).rpartition(':')
+    if not sep:
+        host, port = default_host, text
+    return host or default_host, int(port)
+
+
+def send_message(stream, message, files=()):
+    """写一条消息，files 中的文件按顺序跟在消息行后面；调用方负责加锁"""
+    header = dict(message)
+    if files:
+        header['blobs'] = [{'name': os.path.basename(path), 'size': os.path.getsize(path)} for path in files]
+    stream.write(json.dumps(header, ensure_ascii=False).encode() + b'\n')
+    for path in files:
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, stream, _CHUNK)
+    stream.flush()
+
+
+def read_message(stream, blob_path=None):
+    """读一条消息，连接关闭时返回 None
+
+    消息带文件时调用 blob_path(消息, 序号, 文件名) 得到保存路径，保存后的路径列表放在消息的 files 字段。
+    """
+    line = stream.readline()
+    if not line:
+        return None
+    message = json.loads(line)
+    message['files'] = []
+    for index, blob in enumerate(message.pop('blobs', [])):
+        path = blob_path(message, index, os.path.basename(blob['name']))
+        remaining = blob['size']
+        with open(path, 'wb') as f:
+            while remaining > 0:
+                data = stream.read(min(_CHUNK, remaining))
+                if not data:
+                    raise ConnectionError("文件传输中连接断开")
+                f.write(data)
+                remaining -= len(data)
+        message['files'].append(path)
+    return message
+
+
+class _Task:
+    def __init__(self, task_id, kind, payload, inputs, output_folder, progress):
+        self.id = task_id
+        self.kind = kind
+        self.payload = payload
+        self.inputs = inputs
+        self.output_folder = output_folder
+        self.progress = progress
+        self.future = Future()
+        self.tried = set()
+        self.errors = []
+        self.attempts = 0
+
+
+class _WorkerConnection:
+    """协调端持有的一个工作节点连接；发送在单独的线程里进行，上传大文件时不阻塞分配"""
+
+    def __init__(self, sock, hello, reader):
+        self.sock = sock
+        self.name = hello.get('name') or '%s:%s' % sock.getpeername()[:2]
+        self.capacity = max(1, int(hello.get('capacity') or 1))
+        self.shared_storage = bool(hello.get('shared_storage', True))
+        self.tasks = {}
+        self.outbox = queue.Queue()
+        self.alive = True
+        self.reader = reader
+        self.writer = sock.makefile('wb')
+
+    @property
+    def free(self):
+        return self.capacity - len(self.tasks)
+
+    def close(self):
+        self.alive = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class Coordinator:
+    """接受工作节点连接并分配任务
+
+    call() 在调用线程阻塞直到任务完成（成功返回结果消息，重试用尽时抛出 RuntimeError）；
+    submit() 与 FFmpegScheduler.submit 用法相同，分布式模式下任务用它代替本地调度器提交。
+    on_event(事件名, **字段) 报告工作节点加入/断开和任务重试。
+    """
+
+    def __init__(self, address=('0.0.0.0', DEFAULT_PORT), max_attempts=MAX_ATTEMPTS, on_event=None):
+        self.max_attempts = max_attempts
+        self.on_event = on_event or _log_event
+        self._cond = threading.Condition()
+        self._workers = []
+        self._queue = []
+        self._ids = itertools.count(1)
+        self._closed = False
+        self._local_workers = []
+        self._executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix='feijian-remote')
+        self._server = socket.create_server(address)
+        self.address = self._server.getsockname()[:2]
+        threading.Thread(target=self._accept_loop, name='feijian-coordinator', daemon=True).start()
+
+    # 对外接口
+
+    def submit(self, fn, *args, **kwargs):
+        return self._executor.submit(tracing.get_tracer().wrap(fn), *args, **kwargs)
+
+    def call(self, kind, payload, inputs=(), output_folder=None, progress=None):
+        """执行一个远程任务；inputs 为需要上传的输入文件，output_folder 为非共享存储时回传文件的保存目录"""
+        task = _Task(next(self._ids), kind, payload, [os.path.abspath(path) for path in inputs], output_folder,
+                     progress)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("协调端已关闭")
+            self._queue.append(task)
+            self._dispatch()
+        return task.future.result()
+
+    @property
+    def workers(self):
+        with self._cond:
+            return [{'name': conn.name, 'capacity': conn.capacity, 'running': len(conn.tasks),
+                     'shared_storage': conn.shared_storage} for conn in self._workers]
+
+    def wait_for_workers(self, count=1, timeout=None):
+        """等待至少 count 个工作节点连接，超时返回 False"""
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self._workers) >= count, timeout)
+
+    def spawn_local_workers(self, count, capacity=None):
+        """在本机启动 count 个工作节点进程（共享存储），协调端关闭时一并结束"""
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, env.get('PYTHONPATH')]))
+        host = self.address[0] if self.address[0] not in ('0.0.0.0', '::', '') else '127.0.0.1'
+        for index in range(count):
+            command = [sys.executable, '-m', 'feijian', 'worker', '--connect', f'{host}:{self.address[1]}',
+                       '--name', f'local-{index + 1}', '--exit-when-done']
+            if capacity:
+                command.extend(['--capacity', str(capacity)])
+            # 工作节点的日志输出到 stderr，不混进命令行的 JSON 事件
+            self._local_workers.append(subprocess.Popen(command, env=env, stdin=subprocess.DEVNULL,
+                                                        stdout=sys.stderr))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            queued, self._queue = self._queue, []
+            workers = list(self._workers)
+        for task in queued:
+            task.future.set_exception(RuntimeError("协调端已关闭"))
+        for conn in workers:
+            conn.outbox.put({'type': 'shutdown'})
+            conn.outbox.put(None)
+        try:
+            self._server.close()
+        except OSError:
+            pass
+        for process in self._local_workers:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        self._executor.shutdown(wait=False)
+
+    # 连接处理
+
+    def _accept_loop(self):
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return  # 已关闭
+            threading.Thread(target=self._handle, args=(sock,), name='feijian-worker-conn', daemon=True).start()
+
+    def _handle(self, sock):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sock.settimeout(HELLO_TIMEOUT)
+        reader = sock.makefile('rb')
+        try:
+            hello = read_message(reader)
+            if hello is None or hello.get('type') != 'hello':
+                sock.close()
+                return
+        except (OSError, ValueError):
+            sock.close()
+            return
+        sock.settimeout(None)
+        conn = _WorkerConnection(sock, hello, reader)
+        with self._cond:
+            if self._closed:
+                conn.close()
+                return
+            self._workers.append(conn)
+            self._dispatch()
+            self._cond.notify_all()
+        self.on_event('worker_joined', worker=conn.name, capacity=conn.capacity,
+                      shared_storage=conn.shared_storage)
+        threading.Thread(target=self._send_loop, args=(conn,), name='feijian-worker-send', daemon=True).start()
+
+        try:
+            while True:
+                message = read_message(conn.reader, lambda m, index, name: self._result_path(conn, m, index, name))
+                if message is None:
+                    break
+                if message.get('type') == 'progress':
+                    task = conn.tasks.get(message.get('id'))
+                    if task is not None and task.progress is not None:
+                        task.progress(message.get('position'), message.get('speed'), message.get('fps'))
+                elif message.get('type') == 'result':
+                    self._finished(conn, message)
+        except (OSError, ValueError):
+            pass
+        self._lost(conn)
+
+    def _result_path(self, conn, message, index, name):
+        task = conn.tasks[message['id']]
+        folders = message.get('folders') or []
+        folder = folders[index] if index < len(folders) else '.'
+        # 只接受输出目录本身或其中的一层子目录
+        if folder != '.' and (folder in ('', '..') or os.path.basename(folder) != folder):
+            raise ValueError(f"无效的输出子目录：{folder}")
+        folder = os.path.normpath(os.path.join(task.output_folder, folder))
+        os.makedirs(folder, exist_ok=True)
+        return journal.part_path(os.path.join(folder, name))
+
+    def _send_loop(self, conn):
+        while True:
+            item = conn.outbox.get()
+            if item is None:
+                break
+            if not isinstance(item, _Task):
+                message, files = item, ()
+            else:
+                message = {'type': 'task', 'id': item.id, 'kind': item.kind, 'payload': item.payload,
+                           'inputs': item.inputs}
+                files = () if conn.shared_storage else item.inputs
+                missing = [path for path in files if not os.path.isfile(path)]
+                if missing:
+                    # 本地输入有问题，换节点也没用
+                    with self._cond:
+                        conn.tasks.pop(item.id, None)
+                        self._dispatch()
+                    item.future.set_exception(FileNotFoundError(f"找不到输入文件: {missing[0]}"))
+                    continue
+            try:
+                send_message(conn.writer, message, files)
+            except OSError:
+                break
+        conn.close()
+
+    def _finished(self, conn, message):
+        with self._cond:
+            task = conn.tasks.pop(message.get('id'), None)
+        if task is None:
+            return
+        if message.get('ok'):
+            try:
+                # 非共享存储时回传的输出先写成了 .part
+                for path in message.get('files', []):
+                    journal.commit_part(path[:-len(journal.PART_SUFFIX)])
+            except OSError as e:
+                message = {'ok': False, 'error': f"保存输出失败: {e}"}
+            else:
+                task.future.set_result(message)
+                with self._cond:
+                    self._dispatch()
+                return
+        self._retry(task, conn.name, message.get('error') or "未知错误")
+
+    def _lost(self, conn):
+        with self._cond:
+            if conn in self._workers:
+                self._workers.remove(conn)
+            tasks = list(conn.tasks.values())
+            conn.tasks.clear()
+        conn.outbox.put(None)
+        if not self._closed:
+            self.on_event('worker_lost', worker=conn.name, running=len(tasks))
+        for task in tasks:
+            self._retry(task, conn.name, "工作节点断开")
+
+    def _retry(self, task, worker_name, error):
+        task.attempts += 1
+        task.tried.add(worker_name)
+        task.errors.append(f"{worker_name}: {error}")
+        with self._cond:
+            if task.attempts >= self.max_attempts or self._closed:
+                task.future.set_exception(RuntimeError("；".join(task.errors)))
+                self._dispatch()
+                return
+            self._queue.insert(0, task)
+            self._dispatch()
+        self.on_event('task_retry', task=task.id, kind=task.kind, attempt=task.attempts + 1, error=error)
+
+    def _dispatch(self):
+        """把排队的任务分给有空闲容量的节点（调用方持有 _cond）
+
+        优先选没试过这个任务的节点；所有在线节点都试过时才回到试过的节点。
+        """
+        if not self._queue:
+            return
+        remaining = []
+        for task in self._queue:
+            alive = [conn for conn in self._workers if conn.alive]
+            untried = [conn for conn in alive if conn.name not in task.tried]
+            candidates = untried if untried else alive
+            candidates = [conn for conn in candidates if conn.free > 0]
+            if not candidates:
+                remaining.append(task)
+                continue
+            conn = max(candidates, key=lambda c: c.free)
+            conn.tasks[task.id] = task
+            conn.outbox.put(task)
+        self._queue = remaining
+
+
+def _log_event(event, **fields):
+    logger.info("%s: %s", event, fields)
+
+
+class Worker:
+    """工作节点：连接协调端，按声明的容量并行执行任务"""
+
+    def __init__(self, address, capacity=None, name=None, shared_storage=True):
+        from feijian.scheduler import get_scheduler
+        self.address = address
+        self.capacity = capacity or get_scheduler().max_jobs
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.shared_storage = shared_storage
+        self._send_lock = threading.Lock()
+
+    def serve_forever(self, exit_when_done=False):
+        """连接断开后重新连接；exit_when_done 为 True 时服务完一个协调端就退出"""
+        while True:
+            try:
+                sock = socket.create_connection(self.address)
+            except OSError:
+                time.sleep(RECONNECT_INTERVAL)
+                continue
+            try:
+                self._serve(sock)
+            except (OSError, ValueError) as e:
+                logger.warning("与协调端的连接中断: %s", e)
+            finally:
+                sock.close()
+            if exit_when_done:
+                return
+            time.sleep(RECONNECT_INTERVAL)
+
+    def _serve(self, sock):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        reader = sock.makefile('rb')
+        writer = sock.makefile('wb')
+        work_root = tempfile.mkdtemp(prefix='feijian-worker-')
+        executor = ThreadPoolExecutor(max_workers=self.capacity, thread_name_prefix='feijian-worker')
+        try:
+            self._send(writer, {'type': 'hello', 'name': self.name, 'capacity': self.capacity,
+                                'shared_storage': self.shared_storage})
+            logger.info("已连接协调端 %s:%s，容量 %s", self.address[0], self.address[1], self.capacity)
+            while True:
+                message = read_message(reader, lambda m, index, name: _input_path(work_root, m, index, name))
+                if message is None or message.get('type') == 'shutdown':
+                    break
+                if message.get('type') == 'task':
+                    executor.submit(tracing.get_tracer().wrap(self._run_task), writer, work_root, message)
+        finally:
+            executor.shutdown(wait=True)
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    def _send(self, writer, message, files=()):
+        with self._send_lock:
+            send_message(writer, message, files)
+
+    def _run_task(self, writer, work_root, message):
+        task_id = message['id']
+        task_dir = os.path.join(work_root, str(task_id))
+        # 上传的输入文件：协调端路径 -> 本地副本
+        local_inputs = dict(zip(message.get('inputs', []), message['files']))
+        output_folder = None
+        if message['files']:
+            output_folder = os.path.join(task_dir, 'out')
+            os.makedirs(output_folder, exist_ok=True)
+        last = [0.0]
+
+        def progress(position, speed=None, fps=None):
+            now = time.monotonic()
+            if now - last[0] < PROGRESS_INTERVAL:
+                return
+            last[0] = now
+            try:
+                self._send(writer, {'type': 'progress', 'id': task_id, 'position': position, 'speed': speed,
+                                    'fps': fps})
+            except OSError:
+                pass
+
+        try:
+            handler = TASK_HANDLERS[message['kind']]
+            outputs = handler(message['payload'], local_inputs, output_folder, progress)
+            result = {'type': 'result', 'id': task_id, 'ok': True}
+            files = outputs if output_folder is not None else ()
+            if files:
+                result['folders'] = [os.path.relpath(os.path.dirname(path), output_folder) for path in files]
+        except Exception as e:
+            result = {'type': 'result', 'id': task_id, 'ok': False, 'error': str(e) or type(e).__name__}
+            files = ()
+        try:
+            self._send(writer, result, files)
+        except OSError as e:
+            logger.warning("无法回传任务 %s 的结果: %s", task_id, e)
+        finally:
+            shutil.rmtree(task_dir, ignore_errors=True)
+
+
+def _input_path(work_root, message, index, name):
+    # 每个输入放在单独的目录里，保留原文件名（分割输出按源文件名命名）
+    folder = os.path.join(work_root, str(message['id']), 'in', str(index))
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, name)
+
+
+def _renditions(payload):
+    from feijian.renditions import parse_renditions
+    return parse_renditions(payload.get('renditions') or [])
+
+
+def _previews(payload):
+    from feijian.previews import parse_previews
+    return parse_previews(payload.get('previews') or [])
+
+
+def _run_split(payload, local_inputs, output_folder, progress):
+    # 渲染缓存由协调端检查和保存
+    from feijian import split_engine
+    source = local_inputs.get(payload['source'], payload['source'])
+    output_folder = output_folder or payload['output_folder']
+    segments = [tuple(segment) for segment in payload['segments']]
+    return split_engine.split_video(source, segments, output_folder, payload['codec_args'], progress=progress,
+                                    renditions=_renditions(payload), previews=_previews(payload))
+
+
+def _output_paths(payload, output_folder):
+    from feijian.previews import preview_paths
+    from feijian.renditions import output_paths
+    output = os.path.join(output_folder, os.path.basename(payload['output'])) if output_folder \
+        else payload['output']
+    return output, [*output_paths(output, _renditions(payload)), *preview_paths(output, _previews(payload)).values()]
+
+
+def _run_concat(payload, local_inputs, output_folder, progress):
+    from feijian.montage_job import render_files
+    files = [local_inputs.get(path, path) for path in payload['files']]
+    output, outputs = _output_paths(payload, output_folder)
+    render_files(files, output, payload.get('mute', False), progress, _renditions(payload), _previews(payload))
+    return outputs
+
+
+def _run_cut(payload, local_inputs, output_folder, progress):
+    from feijian.cut_montage_job import render_ranges
+    clips = [(local_inputs.get(path, path), start, end) for path, start, end in payload['clips']]
+    output, outputs = _output_paths(payload, output_folder)
+    render_ranges(clips, output, payload.get('mute', False), payload.get('fast_copy', False), progress,
+                  _renditions(payload), _previews(payload))
+    return outputs
+
+
+# 任务种类 -> handler(payload, 上传的输入 {协调端路径: 本地路径}, 回传目录或 None, progress)，返回输出文件列表
+TASK_HANDLERS = {
+    'split': _run_split,
+    'concat': _run_concat,
+    'cut': _run_cut,
+}
@@ -0,0 +1,164 @@
+"""可恢复的任务日志
+
+每个任务在输出目录里写一个追加式的 JSON Lines 日志（JOURNAL_NAME）：
+    {"type": "job", "kind": "split", "params": {...}}      任务参数
+    {"type": "plan", "item": "...", ...}                    每个源文件的切点 / 每个合成组的素材
+    {"type": "done", "item": "..."}                         该项的输出已全部落盘
+    {"type": "failed", "item": "...", "error": "..."}       该项失败，恢复时重做
+    {"type": "finished"}                                    整个任务结束
+每行写入后 fsync，进程或机器中途崩溃最多丢掉最后一行（读取时忽略不完整的行）。
+输出文件先写成 *.part 再原子改名，所以没有 done 记录的项只会留下 .part 文件，不会留下看似完整的视频。
+恢复时参数相同的任务沿用日志里的规划，跳过已完成的项，只重做未完成的。
+"""
+import json
+import os
+import threading
+
+JOURNAL_NAME = '.feijian-journal.jsonl'
+
+# 输出先写成 <最终文件名> + PART_SUFFIX，成功后改名
+PART_SUFFIX = '.part'
+
+
+def journal_path(folder):
+    return os.path.join(folder, JOURNAL_NAME)
+
+
+def part_path(path):
+    return path + PART_SUFFIX
+
+
+def commit_part(path):
+    """把写好的 .part 文件改名为最终文件名"""
+    os.replace(part_path(path), path)
+
+
+class Journal:
+    """线程安全的任务日志，用 open_job 创建或恢复"""
+
+    def __init__(self, folder, kind=None, params=None):
+        self.folder = folder
+        self.kind = kind
+        self.params = params
+        self.plans = {}
+        self.completed = set()
+        self.failures = {}
+        self.finished = False
+        self._lock = threading.Lock()
+        self._file = None
+
+    @classmethod
+    def load(cls, folder):
+        """读取已有日志，不存在或无法解析时返回 None"""
+        try:
+            with open(journal_path(folder), encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return None
+        journal = None
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 崩溃时写了一半的行
+            record_type = record.pop('type', None)
+            if record_type == 'job':
+                journal = cls(folder, record.get('kind'), record.get('params'))
+            elif journal is None:
+                continue
+            elif record_type == 'plan':
+                journal.plans[record.pop('item')] = record
+            elif record_type == 'done':
+                journal.completed.add(record['item'])
+                journal.failures.pop(record['item'], None)
+            elif record_type == 'failed':
+                journal.failures[record['item']] = record.get('error')
+            elif record_type == 'finished':
+                journal.finished = True
+        return journal
+
+    def matches(self, kind, params):
+        # 经过一次 JSON 往返再比较，元组和列表视为相同
+        return self.kind == kind and self.params == json.loads(json.dumps(params))
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(journal_path(self.folder), 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def planned(self, item):
+        """日志中记录的规划，没有时返回 None"""
+        return self.plans.get(item)
+
+    def is_done(self, item):
+        return item in self.completed
+
+    def plan(self, item, **data):
+        self.plans[item] = data
+        self._append({'type': 'plan', 'item': item, **data})
+
+    def done(self, item):
+        self.completed.add(item)
+        self.failures.pop(item, None)
+        self._append({'type': 'done', 'item': item})
+
+    def failed(self, item, error):
+        """记录失败的项，没有 done 记录，恢复时会重做"""
+        self.failures[item] = error
+        self._append({'type': 'failed', 'item': item, 'error': error})
+
+    def finish(self):
+        self.finished = True
+        self._append({'type': 'finished'})
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def remove_partials(folder):
+    """删除上次中断时留下的 .part 文件（包括子文件夹中的）"""
+    for directory, _, names in os.walk(folder):
+        for name in names:
+            if name.endswith(PART_SUFFIX):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+
+def open_job(folder, kind, params, resume=False):
+    """resume 为 True 且 folder 中有参数相同的日志时沿用它，否则新建（覆盖旧日志）"""
+    os.makedirs(folder, exist_ok=True)
+    if resume:
+        journal = Journal.load(folder)
+        if journal is not None and journal.matches(kind, params):
+            remove_partials(folder)
+            return journal
+    journal = Journal(folder, kind, params)
+    with open(journal_path(folder), 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'type': 'job', 'kind': kind, 'params': params}, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    return journal
+
+
+def find_resumable(parent, kind, params, prefix):
+    """在 parent 下名称以 prefix 开头的输出目录中，找最近一个参数相同且未完成的任务目录"""
+    try:
+        names = sorted((name for name in os.listdir(parent) if name.startswith(prefix)), reverse=True)
+    except OSError:
+        return None
+    for name in names:
+        folder = os.path.join(parent, name)
+        journal = Journal.load(folder)
+        if journal is not None and journal.matches(kind, params) and not journal.finished:
+            return folder
+    return None
@@ -0,0 +1,229 @@
+"""素材库扫描
+
+scan() 用 os.scandir 递归遍历文件夹，边遍历边逐个产出视频文件路径（生成器），可以直接交给
+async_engine.probe_stream 边找边探测。筛选分两步：
+- 扩展名属于 VIDEO_EXTENSIONS，且不是隐藏文件（以 . 开头，如 macOS 的 ._xxx.mp4）
+- 嗅探文件头，确认是常见的视频封装（MP4/MOV、MKV、AVI、FLV、ASF、MPEG-PS/TS），排除空文件和改了扩展名的文件
+
+目录列表记入 LibraryIndex：目录的 mtime 只在其中的条目增删或改名时变化，重复扫描时 mtime 未变的目录
+只需一次 stat，不再列目录和嗅探文件。文件内容的变化由 media_cache 按文件大小和 mtime 另行判断。
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from feijian.previews import PREVIEW_DIR
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.3gp', '.flv', '.wmv', '.mpeg', '.mpg')
+
+# mtime 距今不到这么多秒的目录不写入索引：同一时间刻度内的后续改动可能不会再改变 mtime
+RACY_SECONDS = 2.0
+_SNIFF_BYTES = 192
+_MP4_BOXES = (b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot')
+
+
+def is_video_name(name):
+    return name.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def sniff_video(path):
+    """根据文件头判断是否为常见的视频封装格式；读不到时视为不是"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(_SNIFF_BYTES)
+    except OSError:
+        return False
+    if len(head) < 12:
+        return False
+    return (head[4:8] in _MP4_BOXES  # MP4 / MOV / 3GP
+            or head.startswith(b'\x1a\x45\xdf\xa3')  # Matroska
+            or (head.startswith(b'RIFF') and head[8:12] == b'AVI ')
+            or head.startswith(b'FLV')
+            or head.startswith(b'\x30\x26\xb2\x75\x8e\x66\xcf\x11')  # ASF / WMV
+            or (head.startswith(b'\x00\x00\x01') and head[3] in (0xba, 0xb3))  # MPEG-PS
+            or (head[0] == 0x47 and len(head) > 188 and head[188] == 0x47))  # MPEG-TS
+
+
+class LibraryIndex:
+    """线程安全的目录索引（SQLite），每个目录一条：mtime、视频文件、子目录，以及扩展名符合但嗅探未通过的文件
+
+    嗅探未通过的文件（如还在下载的空文件）记下大小和 mtime，命中索引时只重新 stat 这些文件，有变化就重新列目录。
+    """
+    SCHEMA_VERSION = 1
+    TOUCH_INTERVAL = 3600
+
+    def __init__(self, db_path=None, max_age_days=90):
+        if db_path is None:
+            from feijian.media_cache import default_cache_dir
+            db_path = os.path.join(default_cache_dir(), 'library.sqlite3')
+        self.db_path = db_path
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._conn = self._connect(db_path)
+
+    def _connect(self, db_path):
+        try:
+            if db_path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("无法打开目录索引 %s: %s", db_path, e)
+            self.db_path = ':memory:'
+            conn = sqlite3.connect(':memory:', check_same_thread=False)
+
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if conn.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA_VERSION:
+            conn.execute('DROP TABLE IF EXISTS directories')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS directories (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                value TEXT NOT NULL
+            )
+        """)
+        conn.execute(f'PRAGMA user_version={self.SCHEMA_VERSION}')
+        conn.execute('DELETE FROM directories WHERE last_access < ?', (time.time() - self.max_age,))
+        conn.commit()
+        return conn
+
+    @staticmethod
+    def _key(directory):
+        return os.path.normcase(os.path.abspath(directory))
+
+    def lookup(self, directory, mtime_ns):
+        """返回 (视频文件名, 子目录名, {未通过嗅探的文件名: [大小, mtime_ns]})；没有记录或目录已变化时返回 None"""
+        key = self._key(directory)
+        with self._lock:
+            row = self._conn.execute('SELECT mtime_ns, last_access, value FROM directories WHERE path=?',
+                                     (key,)).fetchone()
+            if row is None or row[0] != mtime_ns:
+                return None
+            now = time.time()
+            if now - row[1] > self.TOUCH_INTERVAL:
+                self._conn.execute('UPDATE directories SET last_access=? WHERE path=?', (now, key))
+                self._conn.commit()
+        value = json.loads(row[2])
+        return value['files'], value['dirs'], value['rejected']
+
+    def store(self, directory, mtime_ns, files, dirs, rejected):
+        value = json.dumps({'files': files, 'dirs': dirs, 'rejected': rejected}, ensure_ascii=False,
+                           separators=(',', ':'))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO directories (path, mtime_ns, last_access, value) VALUES (?, ?, ?, ?)',
+                (self._key(directory), mtime_ns, time.time(), value))
+            self._conn.commit()
+
+    def invalidate(self, directory=None):
+        """删除某个目录的记录；不传目录时清空索引"""
+        with self._lock:
+            if directory is None:
+                self._conn.execute('DELETE FROM directories')
+            else:
+                self._conn.execute('DELETE FROM directories WHERE path=?', (self._key(directory),))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_index():
+    """进程内共享的默认目录索引"""
+    global _default_index
+    if _default_index is None:
+        with _default_index_lock:
+            if _default_index is None:
+                _default_index = LibraryIndex()
+    return _default_index
+
+
+def _unchanged(directory, rejected):
+    for name, (size, mtime_ns) in rejected.items():
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except OSError:
+            return False
+        if st.st_size != size or st.st_mtime_ns != mtime_ns:
+            return False
+    return True
+
+
+def list_directory(directory, index=None, sniff=True):
+    """返回目录中的 (视频文件名, 子目录名)，均已排序；index 为 None 时不读写索引"""
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError as e:
+        logger.warning("无法读取目录 %s: %s", directory, e)
+        return [], []
+    if index is not None:
+        cached = index.lookup(directory, mtime_ns)
+        if cached is not None and _unchanged(directory, cached[2]):
+            return cached[0], cached[1]
+
+    files, dirs, rejected = [], [], {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    # 不跟随目录的符号链接，避免循环
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.name)
+                        continue
+                    if not entry.is_file() or not is_video_name(entry.name):
+                        continue
+                    if sniff and not sniff_video(entry.path):
+                        st = entry.stat()
+                        rejected[entry.name] = [st.st_size, st.st_mtime_ns]
+                        continue
+                except OSError:
+                    continue
+                files.append(entry.name)
+    except OSError as e:
+        logger.warning("无法读取目录 %s: %s", directory, e)
+        return [], []
+    files.sort()
+    dirs.sort()
+    if index is not None and time.time() - mtime_ns / 1e9 > RACY_SECONDS:
+        index.store(directory, mtime_ns, files, dirs, rejected)
+    return files, dirs
+
+
+def scan(root, recursive=True, exclude=(), skip_dir=None, sniff=True, use_index=True):
+    """逐个产出 root 下的视频文件路径：先产出一个目录里的文件（按文件名排序），再依次进入子目录
+
+    root 是文件时原样产出（用户明确指定的文件不再筛选）。exclude 中的目录（如位于输入目录内的导出目录）
+    以及 skip_dir(目录名) 为真的子目录不进入；预览目录（previews.PREVIEW_DIR）也不进入。
+    """
+    if not os.path.isdir(root):
+        if os.path.isfile(root):
+            yield root
+        return
+    index = get_index() if use_index else None
+    excluded = {os.path.normcase(os.path.abspath(path)) for path in exclude if path}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        files, dirs = list_directory(directory, index, sniff)
+        for name in files:
+            yield os.path.join(directory, name)
+        if recursive:
+            for name in reversed(dirs):
+                path = os.path.join(directory, name)
+                if name == PREVIEW_DIR or (skip_dir is not None and skip_dir(name)):
+                    continue
+                if os.path.normcase(os.path.abspath(path)) not in excluded:
+                    stack.append(path)
@@ -0,0 +1,385 @@
+"""媒体元数据缓存
+
+所有 ffprobe 调用都经过这里。探测结果按 (路径, 文件大小, 修改时间) 存入
+SQLite，文件被改动后自动失效重新探测；长期未访问或超出条数上限的记录会被淘汰。
+关键帧索引、内容指纹、内容分析、感知哈希等按文件计算的结果也用同样的规则缓存。
+"""
+import json
+import logging
+import os
+from array import array
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from feijian.analysis import analyze_media, pack_analysis, unpack_analysis
+from feijian.fingerprint import file_fingerprint
+from feijian.phash import pack_hash, perceptual_hash, unpack_hash
+from feijian.scheduler import PROBE, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+MediaInfo = namedtuple('MediaInfo', [
+    'duration', 'video_codec', 'width', 'height', 'fps', 'pix_fmt', 'time_base',
+    'audio_codec', 'sample_rate', 'channels', 'channel_layout', 'start_time',
+])
+
+_COLUMNS = MediaInfo._fields
+
+def _pack_times(times):
+    return array('d', times).tobytes()
+
+
+def _unpack_times(blob):
+    times = array('d')
+    times.frombytes(blob)
+    return times.tolist()
+
+
+def _pack_text(text):
+    return text.encode()
+
+
+def _unpack_text(blob):
+    return bytes(blob).decode()
+
+
+def default_cache_dir():
+    """缓存根目录，可用环境变量 FEIJIAN_CACHE_DIR 覆盖"""
+    path = os.environ.get('FEIJIAN_CACHE_DIR')
+    if path:
+        return path
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'feijian')
+
+
+def _parse_rate(rate):
+    try:
+        num, _, den = rate.partition('/')
+        num, den = float(num), float(den or 1)
+        return num / den if den else 0.0
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+def probe_command(video_path):
+    """获取时长、起始时间、编码、分辨率、帧率和音频布局的 ffprobe 命令"""
+    return ['ffprobe', '-v', 'error', '-print_format', 'json',
+            '-show_entries',
+            'format=duration,start_time:stream=codec_type,codec_name,width,height,avg_frame_rate,'
+            'r_frame_rate,pix_fmt,time_base,sample_rate,channels,channel_layout',
+            video_path]
+
+
+def parse_probe_output(stdout):
+    """把 probe_command 的 JSON 输出（bytes）解析成 MediaInfo"""
+    data = json.loads(stdout.decode('utf-8', 'replace') or '{}')
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+
+    # 与原来的 float(ffprobe 输出) 一致：拿不到时长视为探测失败
+    duration = float(data.get('format', {}).get('duration'))
+    try:
+        start_time = float(data['format']['start_time'])
+    except (KeyError, TypeError, ValueError):
+        start_time = 0.0
+    return MediaInfo(
+        duration=duration,
+        video_codec=video.get('codec_name'),
+        width=video.get('width'),
+        height=video.get('height'),
+        fps=_parse_rate(video.get('avg_frame_rate')) or _parse_rate(video.get('r_frame_rate')),
+        pix_fmt=video.get('pix_fmt'),
+        time_base=video.get('time_base'),
+        audio_codec=audio.get('codec_name'),
+        sample_rate=int(audio['sample_rate']) if audio.get('sample_rate') else None,
+        channels=audio.get('channels'),
+        channel_layout=audio.get('channel_layout'),
+        start_time=start_time,
+    )
+
+
+def probe_media(video_path):
+    """调用 ffprobe 获取视频的时长、编码、分辨率、帧率和音频布局"""
+    process = get_scheduler().run(probe_command(video_path), kind=PROBE)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffprobe 错误: {process.stderr.decode('utf-8', 'replace').strip()}")
+    return parse_probe_output(process.stdout)
+
+
+def probe_keyframes(video_path):
+    """读取视频流所有关键帧的时间点（秒，相对文件起点），只解析封装不解码"""
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'packet=pts_time,flags:format=start_time', '-of', 'compact', video_path]
+    process = get_scheduler().run(command, kind=PROBE)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffprobe 错误: {process.stderr.decode('utf-8', 'replace').strip()}")
+
+    start_time = 0.0
+    keyframes = []
+    for line in process.stdout.decode('utf-8', 'replace').splitlines():
+        section, _, rest = line.partition('|')
+        fields = dict(item.partition('=')[::2] for item in rest.split('|'))
+        try:
+            if section == 'packet' and 'K' in fields.get('flags', ''):
+                keyframes.append(float(fields['pts_time']))
+            elif section == 'format':
+                start_time = float(fields.get('start_time', 0))
+        except ValueError:  # pts_time=N/A
+            continue
+    # 输出时 ffmpeg 会把时间戳平移到 0 起，切点也要按同样的基准
+    return sorted(max(t - start_time, 0.0) for t in keyframes)
+
+
+class MediaCache:
+    """线程安全的 SQLite 元数据缓存
+
+    - 失效：命中时比对文件大小和 mtime，不一致则重新探测并覆盖旧记录
+    - 淘汰：超过 max_age_days 未访问的记录删除；总条数超过 max_entries 时按最近访问时间删除最旧的，
+      每写入 EVICT_EVERY 条（探测结果和各附加表合计）检查一次所有表
+    """
+    SCHEMA_VERSION = 6
+    # 访问时间只需粗略精度，避免每次命中都写库
+    TOUCH_INTERVAL = 3600
+    EVICT_EVERY = 500
+
+    # 按文件缓存的附加结果：表名 -> (计算函数, 编码为 BLOB, 从 BLOB 解码)
+    BLOB_TABLES = {
+        'keyframes': (probe_keyframes, _pack_times, _unpack_times),
+        'fingerprints': (file_fingerprint, _pack_text, _unpack_text),
+        'analysis': (analyze_media, pack_analysis, unpack_analysis),
+        'phashes': (perceptual_hash, pack_hash, unpack_hash),
+    }
+
+    def __init__(self, db_path=None, max_entries=200000, max_age_days=90):
+        if db_path is None:
+            db_path = os.path.join(default_cache_dir(), 'media.sqlite3')
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = self._connect(db_path)
+        self.evict()
+
+    def _connect(self, db_path):
+        try:
+            if db_path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+        except (OSError, sqlite3.Error) as e:
+            # 缓存目录不可写时退化为进程内缓存，不影响正常处理
+            logger.warning("无法打开元数据缓存 %s: %s", db_path, e)
+            self.db_path = ':memory:'
+            conn = sqlite3.connect(':memory:', check_same_thread=False)
+
+        conn.execute('PRAGMA synchronous=NORMAL')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            # 缓存可随时丢弃，结构变化时直接重建
+            for table in self._tables():
+                conn.execute(f'DROP TABLE IF EXISTS {table}')
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS media (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                {', '.join(_COLUMNS)}
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS media_last_access ON media(last_access)')
+        for table in self.BLOB_TABLES:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    value BLOB NOT NULL
+                )
+            """)
+        conn.execute(f'PRAGMA user_version={self.SCHEMA_VERSION}')
+        conn.commit()
+        return conn
+
+    @classmethod
+    def _tables(cls):
+        return ('media', *cls.BLOB_TABLES)
+
+    @staticmethod
+    def _key(video_path):
+        return os.path.normcase(os.path.abspath(video_path))
+
+    def get(self, video_path, st=None):
+        """返回缓存的 MediaInfo；未命中或文件已变化时返回 None"""
+        if st is None:
+            st = os.stat(video_path)
+        key = self._key(video_path)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT size, mtime_ns, last_access, {', '.join(_COLUMNS)} FROM media WHERE path=?",
+                (key,)).fetchone()
+            if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+                return None
+            now = time.time()
+            if now - row[2] > self.TOUCH_INTERVAL:
+                self._conn.execute('UPDATE media SET last_access=? WHERE path=?', (now, key))
+                self._conn.commit()
+        return MediaInfo(*row[3:])
+
+    def put(self, video_path, info, st=None):
+        if st is None:
+            st = os.stat(video_path)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO media (path, size, mtime_ns, last_access, {', '.join(_COLUMNS)}) "
+                f"VALUES (?, ?, ?, ?, {', '.join('?' for _ in _COLUMNS)})",
+                (self._key(video_path), st.st_size, st.st_mtime_ns, time.time(), *info))
+            self._conn.commit()
+            need_evict = self._count_put()
+        if need_evict:
+            self.evict()
+
+    def _count_put(self):
+        """调用方持有 _lock；所有表的写入合计每 EVICT_EVERY 次返回 True，由调用方释放锁后执行淘汰"""
+        self._puts += 1
+        return self._puts % self.EVICT_EVERY == 0
+
+    def probe(self, video_path):
+        """优先读缓存，未命中时调用 ffprobe 并写入缓存"""
+        st = os.stat(video_path)
+        info = self.get(video_path, st)
+        if info is None:
+            info = probe_media(video_path)
+            self.put(video_path, info, st)
+        return info
+
+    def _cached(self, table, video_path):
+        """读取 BLOB_TABLES 中某张表的结果，文件未变化时直接读缓存，否则重新计算"""
+        compute, pack, unpack = self.BLOB_TABLES[table]
+        st = os.stat(video_path)
+        key = self._key(video_path)
+        with self._lock:
+            row = self._conn.execute(f'SELECT size, mtime_ns, last_access, value FROM {table} WHERE path=?',
+                                     (key,)).fetchone()
+            if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+                now = time.time()
+                if now - row[2] > self.TOUCH_INTERVAL:
+                    self._conn.execute(f'UPDATE {table} SET last_access=? WHERE path=?', (now, key))
+                    self._conn.commit()
+                return unpack(row[3])
+
+        value = compute(video_path)
+        with self._lock:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {table} (path, size, mtime_ns, last_access, value) VALUES (?, ?, ?, ?, ?)',
+                (key, st.st_size, st.st_mtime_ns, time.time(), pack(value)))
+            self._conn.commit()
+            need_evict = self._count_put()
+        if need_evict:
+            self.evict()
+        return value
+
+    def keyframes(self, video_path):
+        """关键帧时间索引"""
+        return self._cached('keyframes', video_path)
+
+    def fingerprint(self, video_path):
+        """内容指纹（见 fingerprint 模块），避免每次任务都重新读文件"""
+        return self._cached('fingerprints', video_path)
+
+    def analysis(self, video_path):
+        """镜头切换、黑场和静音（见 analysis 模块），首次需要完整解码一遍"""
+        return self._cached('analysis', video_path)
+
+    def phash(self, video_path):
+        """感知哈希（见 phash 模块），没有画面时为 None"""
+        return self._cached('phashes', video_path)
+
+    def invalidate(self, video_path=None):
+        """删除某个文件的记录；不传路径时清空整个缓存"""
+        with self._lock:
+            for table in self._tables():
+                if video_path is None:
+                    self._conn.execute(f'DELETE FROM {table}')
+                else:
+                    self._conn.execute(f'DELETE FROM {table} WHERE path=?', (self._key(video_path),))
+            self._conn.commit()
+
+    def evict(self, prune_missing=False):
+        """按访问时间和条数上限淘汰记录，prune_missing 为 True 时顺带清理已不存在的文件"""
+        with self._lock:
+            for table in self._tables():
+                self._conn.execute(f'DELETE FROM {table} WHERE last_access < ?', (time.time() - self.max_age,))
+                count = self._conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        f'DELETE FROM {table} WHERE path IN '
+                        f'(SELECT path FROM {table} ORDER BY last_access LIMIT ?)',
+                        (count - self.max_entries,))
+                if prune_missing:
+                    missing = [(p,) for (p,) in self._conn.execute(f'SELECT path FROM {table}')
+                               if not os.path.exists(p)]
+                    self._conn.executemany(f'DELETE FROM {table} WHERE path=?', missing)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """进程内共享的默认缓存实例"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = MediaCache()
+    return _default_cache
+
+
+def configure(**kwargs):
+    """用指定参数（如 db_path）替换默认缓存实例，并关闭被替换的实例"""
+    global _default_cache
+    with _default_cache_lock:
+        previous, _default_cache = _default_cache, MediaCache(**kwargs)
+    if previous is not None:
+        previous.close()
+    return _default_cache
+
+
+def get_media_info(video_path):
+    return get_cache().probe(video_path)
+
+
+def get_keyframes(video_path):
+    return get_cache().keyframes(video_path)
+
+
+def get_fingerprint(video_path):
+    return get_cache().fingerprint(video_path)
+
+
+def get_analysis(video_path):
+    return get_cache().analysis(video_path)
+
+
+def get_phash(video_path):
+    return get_cache().phash(video_path)
+
+
+def get_video_duration(video_path):
+    """获取视频的持续时间（秒）"""
+    return get_media_info(video_path).duration
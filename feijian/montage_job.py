@@ -0,0 +1,653 @@
+"""混剪任务（不依赖 Qt，界面和命令行共用）"""
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from collections import deque
+
+import numpy as np
+
+from feijian import (analysis, async_engine, autotune, journal, library, media_cache, normalize, phash, planner,
+                     render_cache, split_engine, tracing)
+from feijian import previews as preview_specs
+from feijian import renditions as rendition_specs
+from feijian.progress import JobProgress
+from feijian.scheduler import COPY, ENCODE, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+SEQUENTIAL = "顺序合成"
+SHUFFLED = "乱序合成"
+
+# 近似重复素材（见 phash）的处理：去掉后出现的，或者（乱序合成时）在分组中隔开
+DEDUPE_DROP = 'drop'
+DEDUPE_SPREAD = 'spread'
+DEDUPE_MODES = (DEDUPE_DROP, DEDUPE_SPREAD)
+
+# 输出目录名前缀，后接时间戳
+OUTPUT_PREFIX = "合成结果_"
+
+# build_encode_command 变化时增加版本号，旧的渲染缓存自然失效
+ENCODE_VERSION = 1
+
+# 素材探测不到帧率/采样率时使用
+DEFAULT_FPS = 30
+DEFAULT_SAMPLE_RATE = 44100
+
+
+def _ignore(*args):
+    pass
+
+
+def preview_outputs(source, audio, duration, paths, mute=False, split_source=False):
+    """整个输出的预览（见 previews.build_graph）：返回 (滤镜列表, 输出参数)
+
+    paths 为 {预览种类: 路径}，audio 为预览短片使用的音频（如 '0:a:0?' 或滤镜标签）。
+    """
+    images = {kind: path for kind, path in paths.items() if kind != 'clip'}
+    filters, args, clip_label = preview_specs.build_graph(source, [(0.0, duration)], [images], 'clip' in paths,
+                                                          split_source)
+    if clip_label is not None:
+        args.extend(['-map', clip_label])
+        if not mute:
+            args.extend(['-map', audio])
+        args.extend(preview_specs.CLIP_ARGS)
+        if mute:
+            args.append('-an')
+        args.extend(['-f', 'mp4', paths['clip']])
+    return filters, args
+
+
+def add_copy_previews(command, duration, paths, mute=False):
+    """流复制命令（已添加输入）加上预览：只为预览解码，主输出显式映射后照常流复制；返回预览的输出参数"""
+    if not paths:
+        return []
+    filters, args = preview_outputs('0:v:0', '0:a:0?', duration, paths, mute)
+    command.extend(['-filter_complex', ';'.join(filters), '-map', '0:v:0'])
+    if not mute:
+        command.extend(['-map', '0:a:0?'])
+    return args
+
+
+def preview_part_paths(output_video_path, previews):
+    """output_video_path 的各预览 {种类: 临时路径}，并建好预览目录"""
+    paths = {kind: journal.part_path(path)
+             for kind, path in preview_specs.preview_paths(output_video_path, previews).items()}
+    for path in paths.values():
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return paths
+
+
+def concat_group(video_files, output_video_path, mute=False, progress=None, previews=()):
+    """把一组视频拼接成 output_video_path，失败时抛出异常（分布式模式下由远程节点直接调用）
+
+    previews 不为空时同一个 ffmpeg 同时生成预览（拼接本身仍是流复制）。
+    """
+    list_path = None
+    preview_paths = preview_part_paths(output_video_path, previews)
+    try:
+        # 规格与本组多数素材不一致的先转码（结果有缓存），保证下面的 concat 可以流复制
+        with tracing.span('encode', files=len(video_files), mode='normalize'):
+            video_files = normalize.normalize_group(video_files, mute=mute)
+        video_files = [os.path.abspath(video_file) for video_file in video_files]
+
+        with tempfile.NamedTemporaryFile(delete=False, mode='w', encoding='utf-8', suffix='.txt') as f:
+            list_path = f.name
+            for video_file in video_files:
+                escaped = video_file.replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        command = [
+            'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+            '-f', 'concat', '-safe', '0', '-i', list_path,
+        ]
+        duration = sum(media_cache.get_media_info(video_file).duration for video_file in video_files) \
+            if previews else 0.0
+        preview_args = add_copy_previews(command, duration, preview_paths, mute)
+        command.extend(['-c:v', 'copy'])
+
+        if mute:
+            command.extend(['-an'])
+        else:
+            command.extend(['-c:a', 'copy'])
+
+        # 先写 .part，成功后改名
+        command.extend(['-f', 'mp4', journal.part_path(output_video_path)])
+        command.extend(preview_args)
+
+        with tracing.span('concat', files=len(video_files), output=output_video_path):
+            get_scheduler().run(command, kind=ENCODE if previews else COPY, check=True, progress=progress)
+        journal.commit_part(output_video_path)
+        for path in preview_specs.preview_paths(output_video_path, previews).values():
+            journal.commit_part(path)
+    finally:
+        if list_path is not None:
+            try:
+                os.remove(list_path)
+            except OSError:
+                pass
+        render_cache.remove_quietly(journal.part_path(output_video_path))
+        for path in preview_paths.values():
+            render_cache.remove_quietly(path)
+
+
+def _format_time(seconds):
+    return f"{seconds:.3f}"
+
+
+def build_encode_command(clips, infos, output_paths, mute=False, renditions=None, preview_paths=None):
+    """在一个滤镜图里把 [(源文件, 起点, 终点), ...] 统一规格后拼接并重新编码，起点为 None 时取整个文件
+
+    没有 renditions 时输出一个文件，规格为本组多数素材的规格；有 renditions 时拼接结果用 split 分给各规格，
+    只解码一次，output_paths 与 renditions 一一对应。preview_paths（{预览种类: 路径}）不为空时再分出一路生成预览。
+    """
+    target = normalize.dominant_profile([normalize.profile_of(info, mute) for info in infos])
+    width, height = target.width, target.height
+    fps = target.fps or DEFAULT_FPS
+    # 多数素材没有音轨时与 normalize 一致，输出也不带音轨
+    muted = mute or target.audio_codec is None
+    sample_rate = target.sample_rate or DEFAULT_SAMPLE_RATE
+    layout = 'mono' if target.channels == 1 else 'stereo'
+
+    command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error']
+    filters, streams = [], []
+    duration = 0.0
+    for index, ((video_file, start, end), info) in enumerate(zip(clips, infos)):
+        duration += (end - start) if start is not None else info.duration
+        if start is None:
+            start, end = None, info.duration
+            command.extend(['-i', video_file])
+        else:
+            # 输入端 seek：只从区间前最近的关键帧开始解码
+            command.extend(['-ss', _format_time(start), '-t', _format_time(end - start), '-i', video_file])
+        filters.append(f"[{index}:v:0]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                       f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p,"
+                       f"setpts=PTS-STARTPTS[v{index}]")
+        streams.append(f"[v{index}]")
+        if muted:
+            continue
+        if info.audio_codec is None:
+            # 没有音轨的素材补等长的静音
+            filters.append(f"anullsrc=r={sample_rate}:cl={layout},atrim=duration={_format_time(end - (start or 0))}"
+                           f"[a{index}]")
+        else:
+            filters.append(f"[{index}:a:0]aresample={sample_rate},aformat=sample_fmts=fltp:channel_layouts={layout},"
+                           f"asetpts=PTS-STARTPTS[a{index}]")
+        streams.append(f"[a{index}]")
+    filters.append(f"{''.join(streams)}concat=n={len(clips)}:v=1:a={0 if muted else 1}[v]{'' if muted else '[a]'}")
+
+    video, audio, preview_args = 'v', 'a', []
+    if preview_paths:
+        # 拼接结果再分出一路给预览，预览短片带音轨时音频也分出一路
+        filters.append("[v]split=2[vm][pv]")
+        video = 'vm'
+        if 'clip' in preview_paths and not muted:
+            filters.append("[a]asplit=2[am][pa]")
+            audio = 'am'
+        graph, preview_args = preview_outputs('pv', '[pa]', duration, preview_paths, muted, split_source=True)
+        filters.extend(graph)
+
+    if renditions:
+        fanned, video_labels = rendition_specs.fan_out(video, renditions)
+        filters.extend(fanned)
+        audio_labels = [f"[ra{index}]" for index in range(len(renditions))]
+        if not muted and len(renditions) > 1:
+            filters.append(f"[{audio}]asplit={len(renditions)}{''.join(audio_labels)}")
+        elif not muted:
+            audio_labels = [f"[{audio}]"]
+    else:
+        video_labels, audio_labels = [f"[{video}]"], [f"[{audio}]"]
+
+    command.extend(['-filter_complex', ';'.join(filters)])
+    for output_path, video_label, audio_label in zip(output_paths, video_labels, audio_labels):
+        command.extend(['-map', video_label])
+        if not muted:
+            command.extend(['-map', audio_label])
+        command.extend(split_engine.ENCODE_ARGS)
+        if renditions or preview_paths:
+            command.extend(rendition_specs.thread_args(len(output_paths)))
+        if muted:
+            command.append('-an')
+        command.extend(['-f', 'mp4', output_path])
+    command.extend(preview_args)
+    return command
+
+
+def run_encode(clips, output_video_path, mute=False, progress=None, renditions=None, previews=()):
+    """用 build_encode_command 渲染，输出路径见 renditions.output_paths 和 previews.preview_paths；失败时抛出异常"""
+    infos = [media_cache.get_media_info(video_file) for video_file, _, _ in clips]
+    outputs = rendition_specs.output_paths(output_video_path, renditions)
+    outputs.extend(preview_specs.preview_paths(output_video_path, previews).values())
+    try:
+        for output in outputs:
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        parts = [journal.part_path(output) for output in outputs]
+        main_count = len(renditions) if renditions else 1
+        command = build_encode_command(clips, infos, parts[:main_count], mute, renditions,
+                                       dict(zip(previews, parts[main_count:])))
+        with tracing.span('encode', files=len(clips), output=output_video_path, renditions=len(renditions or ()),
+                          previews=len(previews)):
+            get_scheduler().run(command, kind=ENCODE, check=True, progress=progress)
+        for output in outputs:
+            journal.commit_part(output)
+    finally:
+        for output in outputs:
+            render_cache.remove_quietly(journal.part_path(output))
+
+
+def render_files(video_files, output_video_path, mute=False, progress=None, renditions=None, previews=()):
+    """渲染一组完整的素材：没有多规格时流复制拼接（concat_group），否则一次解码输出各规格"""
+    if renditions:
+        run_encode([(video_file, None, None) for video_file in video_files], output_video_path, mute, progress,
+                   renditions, previews)
+    else:
+        concat_group(video_files, output_video_path, mute, progress, previews)
+
+
+class MontageJob:
+    """把文件夹中的视频按目标时长分组（见 planner），每组用 concat 拼成一个视频
+
+    progress(百分比)、status(progress.ProgressInfo) 和 error(消息) 在工作线程中回调，进度按各组时长加权；
+    单组失败通过 error 上报，不中断其它组，全部结束后有失败的组时 run 抛出 RuntimeError。
+    顺序合成时扫描、探测、分组和渲染以流水线方式同时进行（见 run_pipelined），乱序合成需要先探测完全部素材。
+    素材按文件名排序，乱序合成的打乱由 seed 决定，重复运行得到相同分组，输出可从渲染缓存复用。
+    分组和各组完成状态记入输出目录的任务日志（见 journal）；resume 为 True 时找到最近一次参数相同的
+    未完成任务，沿用它的输出目录和分组，只渲染未完成的组。
+    skip_dead 为 True 时先分析素材（见 analysis，结果有缓存），跳过几乎全黑或几乎全静音的素材。
+    传入 coordinator（distributed.Coordinator）时分组仍在本机规划，拼接交给工作节点执行。
+    renditions（renditions.Rendition 列表）不为空时每组只解码一次，按各规格输出到输出目录下的规格子目录。
+    previews（预览种类，见 previews 模块）不为空时渲染每组的同一个 ffmpeg 同时生成该组的预览。
+    dedupe 为 DEDUPE_DROP 时按感知哈希（见 phash，结果有缓存）去掉与前面的素材近似重复的素材；
+    为 DEDUPE_SPREAD 时保留全部素材，乱序合成时同一簇的重复素材尽量分到不同的组（只能用于乱序合成）。
+    """
+
+    def __init__(self, folder_path, export_path, order, target_duration, mute=False, autotune=True,
+                 tolerance=None, progress=None, error=None, seed=0, use_cache=True, status=None, resume=False,
+                 skip_dead=False, coordinator=None, renditions=None, previews=(), dedupe=None):
+        if dedupe is not None and dedupe not in DEDUPE_MODES:
+            raise ValueError(f"无效的去重方式：{dedupe}（可用：{', '.join(DEDUPE_MODES)}）")
+        if dedupe == DEDUPE_SPREAD and order != SHUFFLED:
+            raise ValueError("顺序合成不能调整素材顺序，重复素材只能去掉（drop）")
+        self.folder_path = folder_path
+        self.export_path = export_path
+        self.order = order
+        self.target_duration = target_duration
+        self.tolerance = tolerance  # 输出时长允许偏离目标的秒数，默认见 planner.default_tolerance
+        self.plan_stats = None
+        self.mute = mute
+        self.autotune = autotune
+        self.progress = progress or _ignore
+        self.error = error or _ignore
+        self.status = status or _ignore
+        self.seed = seed
+        self.use_cache = use_cache
+        self.resume = resume
+        self.skip_dead = skip_dead
+        self.coordinator = coordinator
+        self.renditions = renditions or []
+        self.previews = tuple(previews or ())
+        self.dedupe = dedupe
+        self.clip_hashes = {}  # 素材路径 -> 感知哈希，dedupe 时由 stream_clips 记录
+        self.duplicate_index = None  # 流水线中按顺序去重的 phash.HashIndex
+        self.duplicates = 0
+
+    def journal_params(self):
+        """决定分组结果的参数，日志中参数相同的任务才能恢复"""
+        params = {'input': os.path.abspath(self.folder_path), 'order': self.order,
+                  'target': self.target_duration, 'tolerance': self.tolerance, 'mute': bool(self.mute),
+                  'seed': self.seed, 'skip_dead': bool(self.skip_dead)}
+        if self.renditions:
+            params['renditions'] = [list(rendition) for rendition in self.renditions]
+        if self.previews:
+            params['previews'] = list(self.previews)
+        if self.dedupe:
+            params['dedupe'] = self.dedupe
+        return params
+
+    def resumable_folder(self):
+        """可以恢复的输出目录，没有时返回 None"""
+        return journal.find_resumable(self.export_path, 'montage', self.journal_params(), OUTPUT_PREFIX)
+
+    def process_with_ffmpeg(self, video_files, output_video_path, progress=None):
+        """拼接一组视频，成功返回 True；失败通过 error 回调上报并返回 False
+
+        progress(已输出秒数, 速度, fps) 在拼接过程中实时回调
+        """
+        try:
+            self.render(video_files, output_video_path, progress)
+            return True
+        except subprocess.CalledProcessError as e:
+            self.error(f"FFmpeg 错误：{e.stderr.decode('utf-8', 'replace').strip() or e}")
+        except Exception as e:
+            self.error(f"发生错误：{str(e)}")
+        return False
+
+    def render(self, group, output_video_path, progress=None):
+        """渲染一组，失败时抛出异常"""
+        render_files(group, output_video_path, self.mute, progress, self.renditions, self.previews)
+
+    def remote_task(self, group, output_video_path):
+        """分布式模式下渲染一组的任务：(任务种类, payload, 需要上传的输入文件)"""
+        payload = {'files': group, 'output': os.path.abspath(output_video_path), 'mute': self.mute,
+                   'renditions': [list(rendition) for rendition in self.renditions],
+                   'previews': list(self.previews)}
+        return 'concat', payload, group
+
+    def cache_args(self, group):
+        """决定一组输出内容的 (源文件列表, 参数)"""
+        if self.renditions:
+            return group, ['encode', ENCODE_VERSION, self.mute]
+        return group, ['concat', normalize.NORMALIZE_VERSION, self.mute]
+
+    def outputs(self, output_video_path):
+        """一组的全部输出：各规格的主输出（见 renditions.output_paths），然后是预览"""
+        outputs = rendition_specs.output_paths(output_video_path, self.renditions)
+        outputs.extend(preview_specs.preview_paths(output_video_path, self.previews).values())
+        return outputs
+
+    def cache_keys(self, group):
+        """与 outputs 一一对应的渲染缓存键"""
+        sources, args = self.cache_args(group)
+        if not self.renditions:
+            keys = [render_cache.render_key(sources, None, args)]
+        else:
+            keys = [render_cache.render_key(sources, None, [*args, *rendition_specs.cache_args(rendition)])
+                    for rendition in self.renditions]
+        keys.extend(render_cache.render_key(sources, None, [*args, *preview_specs.cache_args(kind)])
+                    for kind in self.previews)
+        return keys
+
+    def concat_remote(self, video_files, output_video_path, progress=None):
+        """交给工作节点渲染，返回值和错误上报与 process_with_ffmpeg 相同"""
+        kind, payload, inputs = self.remote_task(video_files, output_video_path)
+        try:
+            with tracing.span('concat', files=len(video_files), output=output_video_path, remote=True):
+                self.coordinator.call(kind, payload, inputs=inputs,
+                                      output_folder=os.path.dirname(output_video_path), progress=progress)
+            return True
+        except Exception as e:
+            self.error(f"发生错误：{str(e)}")
+        return False
+
+    def render_group(self, group, group_duration, output_video_path, unit):
+        """渲染一组，成功返回 True；任何失败（包括读写渲染缓存）都通过 error 上报并返回 False"""
+        try:
+            cache = render_cache.get_cache() if self.use_cache else None
+            outputs = self.outputs(output_video_path)
+            if cache is not None:
+                keys = self.cache_keys(group)
+                for output in outputs:
+                    os.makedirs(os.path.dirname(output), exist_ok=True)
+                with tracing.span('write', output=output_video_path, cached=True):
+                    if cache.fetch_all(keys, outputs):
+                        return True
+                for output in outputs:
+                    render_cache.remove_quietly(output)
+            if self.coordinator is not None:
+                ok = self.concat_remote(group, output_video_path, progress=unit.update)
+            else:
+                ok = self.process_with_ffmpeg(group, output_video_path, progress=unit.update)
+            if ok:
+                get_scheduler().report_media_seconds(group_duration)
+                if cache is not None:
+                    with tracing.span('write', output=output_video_path, cached=False):
+                        cache.store_all(keys, outputs)
+            return ok
+        except Exception as e:
+            self.error(f"发生错误：{str(e)}")
+            return False
+        finally:
+            unit.finish()
+
+    def plan(self):
+        """扫描、探测并分组，返回 [{'output': 文件名, 'files': [...], 'duration': 秒}, ...]"""
+        # 素材由 stream_clips 边扫描边探测（在一个事件循环里并发探测，不为每个 ffprobe 占一个线程），
+        # 乱序合成需要全部素材，这里取完再分组
+        with tracing.span('probe', folder=self.folder_path):
+            clips = list(self.stream_clips())
+        clusters = None
+        if self.dedupe:
+            with tracing.span('dedupe', clips=len(clips)):
+                clips, clusters = self.find_duplicates(clips)
+        video_files = [video_file for video_file, _ in clips]
+        durations = [duration for _, duration in clips]
+
+        # 在目标时长的容差范围内装出尽可能多的组，乱序合成时由规划器打乱
+        with tracing.span('plan', clips=len(durations)):
+            plan, self.plan_stats = planner.plan_groups(durations, self.target_duration, self.tolerance,
+                                                        shuffle=self.order == SHUFFLED,
+                                                        rng=np.random.default_rng(self.seed), clusters=clusters)
+        self.add_duplicate_stats()
+
+        timestamp = time.strftime("%Y%m%d%H%M%S")
+        return timestamp, [{'output': f"montage_part_{idx + 1}_{timestamp}.mp4",
+                            'files': [video_files[i] for i in indices],
+                            'duration': sum(durations[i] for i in indices)}
+                           for idx, indices in enumerate(plan)]
+
+    def clip_source(self, clip):
+        """素材所在的源文件（感知哈希按源文件计算）"""
+        return clip
+
+    def find_duplicates(self, clips):
+        """按 dedupe 处理整批 (素材, 时长)：返回 (保留的素材, 重复簇标签或 None)
+
+        同一源文件的素材（剪切混剪的多个区间）属于同一簇，去重只在源文件之间进行。
+        """
+        sources = list(dict.fromkeys(self.clip_source(clip) for clip, _ in clips))
+        hashes = [self.clip_hashes.get(source) for source in sources]
+        if self.dedupe == DEDUPE_DROP:
+            kept = {source for source, keep in zip(sources, phash.first_occurrences(hashes)) if keep}
+            self.duplicates = len(sources) - len(kept)
+            for source in sources:
+                if source not in kept:
+                    logger.info("跳过重复素材：%s", source)
+            return [(clip, duration) for clip, duration in clips if self.clip_source(clip) in kept], None
+        labels = dict(zip(sources, phash.duplicate_clusters(hashes).tolist()))
+        self.duplicates = len(sources) - len(set(labels.values()))
+        return clips, np.array([labels[self.clip_source(clip)] for clip, _ in clips], dtype=np.int64)
+
+    def add_duplicate_stats(self):
+        if self.dedupe:
+            self.plan_stats['duplicates'] = self.duplicates
+
+    def hash_of(self, video_file, future):
+        """future 为感知哈希任务；失败时视为不与任何素材重复"""
+        try:
+            return future.result()
+        except Exception as e:
+            logger.warning("无法计算 %s 的感知哈希: %s", video_file, e)
+            return None
+
+    def is_duplicate(self, video_file, value):
+        """流水线中按顺序去重：与前面保留的素材重复时返回 True"""
+        if self.duplicate_index is None or value is None:
+            return False
+        match = self.duplicate_index.find(value)
+        if match is not None:
+            logger.info("跳过重复素材：%s（与 %s 相似）", video_file, match)
+            self.duplicates += 1
+            return True
+        self.duplicate_index.add(value, video_file)
+        return False
+
+    def is_live(self, video_file, duration, future):
+        """future 为素材分析任务；分析失败的素材视为有效"""
+        try:
+            dead = analysis.is_dead(future.result(), duration, self.mute)
+        except Exception as e:
+            logger.warning("无法分析 %s: %s", video_file, e)
+            return True
+        if dead:
+            logger.info("跳过无效素材：%s", video_file)
+        return not dead
+
+    def stream_clips(self):
+        """按扫描顺序逐个产出 (素材路径, 时长)：扫描、探测和（skip_dead 时的）分析、（dedupe 时的）感知哈希
+        都在后台进行，消费得慢时各阶段随之暂停；探测失败时抛出异常
+
+        dedupe 时记录各素材的感知哈希（clip_hashes）；设置了 duplicate_index 时（流水线）直接跳过重复素材。
+        """
+        scan = library.scan(self.folder_path, exclude=[self.export_path],
+                            skip_dir=lambda name: name.startswith(OUTPUT_PREFIX))
+        probes = async_engine.iter_probe(scan)
+        scheduler = get_scheduler()
+        lookahead = scheduler.max_jobs * 2
+        pending = deque()
+
+        def ready():
+            video_file, duration, analyzing, hashing = pending.popleft()
+            if analyzing is not None and not self.is_live(video_file, duration, analyzing):
+                return None
+            if hashing is not None:
+                value = self.clip_hashes[video_file] = self.hash_of(video_file, hashing)
+                if self.is_duplicate(video_file, value):
+                    return None
+            return video_file, duration
+
+        try:
+            for video_path, result in probes:
+                if isinstance(result, Exception):
+                    raise result
+                video_file = os.path.abspath(video_path)
+                if not self.skip_dead and not self.dedupe:
+                    yield video_file, result.duration
+                    continue
+                # 预先提交后面几个素材的分析和哈希，按顺序取结果
+                pending.append((video_file, result.duration,
+                                scheduler.submit(media_cache.get_analysis, video_file) if self.skip_dead else None,
+                                scheduler.submit(media_cache.get_phash, video_file) if self.dedupe else None))
+                while len(pending) > lookahead:
+                    clip = ready()
+                    if clip is not None:
+                        yield clip
+            while pending:
+                clip = ready()
+                if clip is not None:
+                    yield clip
+        finally:
+            probes.close()
+
+    def render_planned(self, job_journal, output_folder, group, unit):
+        ok = self.render_group(group['files'], group['duration'], os.path.join(output_folder, group['output']), unit)
+        if ok:
+            job_journal.done(group['output'])
+        return ok
+
+    def finish(self, job_journal, failed):
+        # 失败的组没有完成记录，恢复时会重做
+        if not failed:
+            job_journal.finish()
+
+    def run(self):
+        """执行混剪，返回输出目录"""
+        output_folder = self.resumable_folder() if self.resume else None
+        job_journal = planned = None
+        if output_folder is not None:
+            job_journal = journal.open_job(output_folder, 'montage', self.journal_params(), resume=True)
+            planned = job_journal.planned('groups')
+            logger.info("继续未完成的混剪：%s", output_folder)
+        if planned is None and self.order == SEQUENTIAL:
+            # 顺序合成的组只取决于前面的素材，不必等全部探测完
+            return self.run_pipelined(output_folder, job_journal)
+        if planned is not None:
+            groups, self.plan_stats = planned['groups'], planned['stats']
+        else:
+            timestamp, groups = self.plan()
+            if output_folder is None:
+                output_folder = os.path.join(self.export_path, f"{OUTPUT_PREFIX}{timestamp}")
+                job_journal = journal.open_job(output_folder, 'montage', self.journal_params())
+            # 整个分组写成一条记录，崩溃时不会只留下一部分分组
+            job_journal.plan('groups', groups=groups, stats=self.plan_stats)
+
+        total_groups = len(groups)
+        pending = [group for group in groups if not job_journal.is_done(group['output'])]
+
+        # 进度按各组时长加权，拼接中的组按 ffmpeg 实时输出的位置计算
+        tracker = JobProgress(sum(group['duration'] for group in pending), self.progress, self.status)
+
+        # 各组并行渲染，并发数由全局调度器控制；单组失败只上报错误，不影响其它组
+        try:
+            with autotune.tuned('concat', enabled=self.autotune):
+                scheduler = self.coordinator or get_scheduler()
+                futures = [scheduler.submit(self.render_planned, job_journal, output_folder, group,
+                                            tracker.unit(group['duration'])) for group in pending]
+                failed = sum(1 for future in futures if not future.result())
+            tracker.close()
+            self.finish(job_journal, failed)
+        finally:
+            job_journal.close()
+        normalize.prune()
+        if failed:
+            raise RuntimeError(f"{failed}/{total_groups} 个合成视频失败")
+        return output_folder
+
+    def run_pipelined(self, output_folder=None, job_journal=None):
+        """顺序合成的流水线：扫描 → 探测 →（分析）→ 分组 → 渲染同时进行，每凑齐一组立即提交渲染
+
+        各阶段之间都有上限（探测窗口、分析预读、调度器的提交窗口），渲染跟不上时前面的阶段暂停。
+        进度的总量随探测到的素材增长，结束时按实际成组的时长校正。
+        恢复未完成的任务时沿用原目录的时间戳，重新分组得到相同的输出文件名，素材相同且已完成的组跳过。
+        """
+        if output_folder is None:
+            timestamp = time.strftime("%Y%m%d%H%M%S")
+            output_folder = os.path.join(self.export_path, f"{OUTPUT_PREFIX}{timestamp}")
+            job_journal = journal.open_job(output_folder, 'montage', self.journal_params())
+        else:
+            timestamp = os.path.basename(output_folder)[len(OUTPUT_PREFIX):]
+
+        tracker = JobProgress(0.0, self.progress, self.status)
+        durations = []
+        self.duplicate_index = phash.HashIndex() if self.dedupe == DEDUPE_DROP else None
+
+        def clips():
+            for video_file, duration in self.stream_clips():
+                durations.append(duration)
+                tracker.add_total(duration)
+                yield (len(durations) - 1, video_file), duration
+
+        groups, indices, futures = [], [], []
+        stream = planner.stream_sequential(clips(), self.target_duration, self.tolerance)
+        try:
+            with autotune.tuned('concat', enabled=self.autotune):
+                scheduler = self.coordinator or get_scheduler()
+                try:
+                    with tracing.span('plan', folder=self.folder_path, pipelined=True):
+                        for members in stream:
+                            group = {'output': f"montage_part_{len(groups) + 1}_{timestamp}.mp4",
+                                     'files': [video_file for _, video_file in members],
+                                     'duration': sum(durations[index] for index, _ in members)}
+                            groups.append(group)
+                            indices.append([index for index, _ in members])
+                            unit = tracker.unit(group['duration'])
+                            previous = job_journal.planned(group['output'])
+                            if (job_journal.is_done(group['output']) and previous is not None
+                                    and previous['files'] == group['files']):
+                                unit.finish()
+                                continue
+                            job_journal.plan(group['output'], files=group['files'], duration=group['duration'])
+                            # 提交窗口已满时在这里阻塞，上游的探测也随之暂停
+                            futures.append(scheduler.submit(self.render_planned, job_journal, output_folder,
+                                                            group, unit))
+                finally:
+                    stream.close()
+                    # 中途出错时也等已提交的组结束，不留下还在写的文件
+                    failed = sum(1 for future in futures if not future.result())
+
+            # 没能成组的素材不计入进度
+            tracker.add_total(-(sum(durations) - sum(group['duration'] for group in groups)))
+            tracker.close()
+            self.plan_stats = planner.plan_stats(durations, indices, self.target_duration)
+            self.add_duplicate_stats()
+            job_journal.plan('groups', groups=groups, stats=self.plan_stats)
+            self.finish(job_journal, failed)
+        finally:
+            job_journal.close()
+        normalize.prune()
+        if failed:
+            raise RuntimeError(f"{failed}/{len(groups)} 个合成视频失败")
+        return output_folder
+
+    def get_video_duration(self, video_path):
+        return media_cache.get_video_duration(video_path)
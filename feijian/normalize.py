@@ -0,0 +1,166 @@
+"""混剪前的输入规格统一
+
+concat 只能在所有输入的编码、分辨率、帧率、时间基和音频参数一致时流复制。
+这里先找出一组素材中占多数的规格，只把不一致的素材转码成该规格，
+结果按 (内容指纹, 目标规格) 存入缓存目录，之后的任务直接复用。
+"""
+import hashlib
+import os
+import threading
+from collections import Counter, namedtuple
+
+from feijian import media_cache
+from feijian.scheduler import ENCODE, get_scheduler
+
+# 转码参数变化时增加版本号，旧缓存自然失效
+NORMALIZE_VERSION = 1
+
+# 缓存总大小上限，超过后按最近使用时间删除
+MAX_CACHE_BYTES = 20 * 1024 ** 3
+
+Profile = namedtuple('Profile', [
+    'video_codec', 'width', 'height', 'fps', 'pix_fmt', 'time_base',
+    'audio_codec', 'sample_rate', 'channels',
+])
+
+VIDEO_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265', 'mpeg4': 'mpeg4'}
+AUDIO_ENCODERS = {'aac': 'aac', 'mp3': 'libmp3lame'}
+
+# 多数规格的编码没有对应编码器时，整组统一成这个规格
+FALLBACK = {'video_codec': 'h264', 'pix_fmt': 'yuv420p', 'audio_codec': 'aac'}
+
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+
+def cache_dir():
+    return os.path.join(media_cache.default_cache_dir(), 'normalized')
+
+
+def profile_of(info, mute=False):
+    fps = round(info.fps or 0, 2)
+    if mute:
+        return Profile(info.video_codec, info.width, info.height, fps, info.pix_fmt, info.time_base,
+                       None, None, None)
+    return Profile(info.video_codec, info.width, info.height, fps, info.pix_fmt, info.time_base,
+                   info.audio_codec, info.sample_rate, info.channels)
+
+
+def dominant_profile(profiles):
+    """取数量最多的规格；其编码无法用现有编码器生成时改用 h264/aac"""
+    profile = Counter(profiles).most_common(1)[0][0]
+    if not profile.fps:
+        # 多数素材探测不到帧率时取已知帧率中最多的；全都未知时保持源帧率（见 build_normalize_command）
+        rates = Counter(candidate.fps for candidate in profiles if candidate.fps)
+        if rates:
+            profile = profile._replace(fps=rates.most_common(1)[0][0])
+    if profile.video_codec not in VIDEO_ENCODERS or profile.pix_fmt is None:
+        profile = profile._replace(video_codec=FALLBACK['video_codec'], pix_fmt=FALLBACK['pix_fmt'])
+    # 多数素材没有音轨时保持无音轨，其它素材转码时去掉音频
+    if profile.audio_codec is not None and profile.audio_codec not in AUDIO_ENCODERS:
+        profile = profile._replace(audio_codec=FALLBACK['audio_codec'],
+                                   sample_rate=profile.sample_rate or 44100, channels=profile.channels or 2)
+    return profile
+
+
+def _time_scale(time_base):
+    try:
+        return int(time_base.split('/')[1])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def build_normalize_command(video_path, info, profile, output_path):
+    width, height = profile.width, profile.height
+    # 帧率未知（0）时不加 fps 滤镜，fps=0 是无效参数
+    rate = f"fps={profile.fps}," if profile.fps else ""
+    video_filter = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+                    f"{rate}format={profile.pix_fmt}")
+    command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-i', video_path]
+    muted = profile.audio_codec is None
+    if not muted and info.audio_codec is None:
+        # 源文件没有音轨时补一段静音，保证与其它素材的流数量一致
+        layout = 'mono' if profile.channels == 1 else 'stereo'
+        command.extend(['-f', 'lavfi', '-i', f'anullsrc=r={profile.sample_rate}:cl={layout}'])
+    command.extend(['-map', '0:v:0'])
+    if not muted:
+        command.extend(['-map', '1:a:0' if info.audio_codec is None else '0:a:0'])
+    command.extend(['-vf', video_filter, '-c:v', VIDEO_ENCODERS[profile.video_codec]])
+    if profile.video_codec in ('h264', 'hevc'):
+        command.extend(['-preset', 'veryfast', '-crf', '18'])
+    else:
+        command.extend(['-q:v', '2'])
+    scale = _time_scale(profile.time_base)
+    if scale:
+        command.extend(['-video_track_timescale', str(scale)])
+    if muted:
+        command.append('-an')
+    else:
+        command.extend(['-c:a', AUDIO_ENCODERS[profile.audio_codec], '-ar', str(profile.sample_rate),
+                        '-ac', str(profile.channels), '-b:a', '192k', '-shortest'])
+    command.extend(['-f', 'mp4', output_path])
+    return command
+
+
+def _cache_path(video_path, profile):
+    key = hashlib.sha256(f"{NORMALIZE_VERSION}|{media_cache.get_fingerprint(video_path)}|{tuple(profile)}".encode())
+    digest = key.hexdigest()
+    return os.path.join(cache_dir(), digest[:2], f"{digest}.mp4")
+
+
+def _key_lock(path):
+    with _key_locks_lock:
+        return _key_locks.setdefault(path, threading.Lock())
+
+
+def normalize_file(video_path, info, profile):
+    """返回符合 profile 的文件路径，缓存中没有时转码生成"""
+    output_path = _cache_path(video_path, profile)
+    # 不同的组可能同时需要同一个文件，同一个缓存键只转码一次
+    with _key_lock(output_path):
+        if os.path.exists(output_path):
+            os.utime(output_path)  # 记录最近使用时间，供淘汰使用
+            return output_path
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        partial_path = output_path + '.part'
+        try:
+            get_scheduler().run(build_normalize_command(video_path, info, profile, partial_path),
+                                kind=ENCODE, check=True)
+            os.replace(partial_path, output_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+    return output_path
+
+
+def normalize_group(video_files, mute=False):
+    """让一组素材可以直接流复制拼接，返回替换后的文件列表（规格一致的保持原路径）"""
+    infos = [media_cache.get_media_info(video_file) for video_file in video_files]
+    profiles = [profile_of(info, mute) for info in infos]
+    target = dominant_profile(profiles)
+    return [video_file if profile == target else normalize_file(video_file, info, target)
+            for video_file, info, profile in zip(video_files, infos, profiles)]
+
+
+def prune(max_bytes=MAX_CACHE_BYTES):
+    """缓存超过上限时删除最久未使用的文件"""
+    entries = []
+    for root, _, files in os.walk(cache_dir()):
+        for name in files:
+            if name.endswith('.mp4'):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,238 @@
+"""素材感知哈希与近似重复检测
+
+同一段素材重新上传、转码、缩放后文件内容完全不同，但画面几乎一样。这里给每个素材算一个 64 位感知哈希：
+- 在素材内均匀取 HASH_FRAMES 个时间点，每个点输入端 seek 后只解码一帧，缩小成 HASH_SIZE x HASH_SIZE 的灰度图
+- 各帧做二维 DCT（矩阵乘法，NumPy 向量化），取左上角 LOW_FREQUENCY x LOW_FREQUENCY 的低频系数按帧平均，
+  与中位数比较得到 64 位
+结果由 media_cache 按文件缓存。修改哈希参数时需增加 MediaCache.SCHEMA_VERSION。
+
+两个哈希的汉明距离不超过 DUPLICATE_DISTANCE 视为重复。查找用多索引哈希（multi-index hashing）：
+64 位分成 CHUNKS 段，距离不超过 r 的两个哈希至少有一段的距离不超过 r // CHUNKS，
+只需在各段的桶里查找这么多位以内的邻居再核对完整距离：
+- duplicate_pairs：一次性对整批哈希做向量化的自连接，十万个素材约一秒；
+  first_occurrences（去掉重复）和 duplicate_clusters（重复归簇）在它的基础上计算
+- HashIndex：边扫描边加入、边查询，供流水线中的去重使用，结果与 first_occurrences 相同
+"""
+import numpy as np
+
+from feijian.scheduler import ENCODE, get_scheduler
+
+HASH_FRAMES = 4
+HASH_SIZE = 32
+LOW_FREQUENCY = 8
+DUPLICATE_DISTANCE = 6
+
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+# Python 3.10 起 int 有 bit_count
+_popcount = getattr(int, 'bit_count', None) or (lambda value: bin(value).count('1'))
+
+
+def _dct_matrix(size):
+    """正交 DCT-II 矩阵"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_LOW_DCT = _dct_matrix(HASH_SIZE)[:LOW_FREQUENCY]
+
+
+def build_hash_command(video_path, duration):
+    """在 HASH_FRAMES 个时间点各解码一帧，以 HASH_SIZE x HASH_SIZE 的灰度原始数据输出到 stdout"""
+    command = ['ffmpeg', '-hide_banner', '-nostats', '-loglevel', 'error']
+    filters = []
+    for index in range(HASH_FRAMES):
+        command.extend(['-ss', f"{duration * (index + 0.5) / HASH_FRAMES:.3f}", '-i', video_path])
+        filters.append(f"[{index}:v:0]trim=end_frame=1,scale={HASH_SIZE}:{HASH_SIZE}:flags=area,format=gray,"
+                       f"setsar=1,setpts=PTS-STARTPTS[f{index}]")
+    filters.append(f"{''.join(f'[f{index}]' for index in range(HASH_FRAMES))}concat=n={HASH_FRAMES}:v=1:a=0[out]")
+    command.extend(['-filter_complex', ';'.join(filters), '-map', '[out]', '-frames:v', str(HASH_FRAMES),
+                    '-f', 'rawvideo', '-pix_fmt', 'gray', '-'])
+    return command
+
+
+def hash_frames(frames):
+    """由灰度帧 (..., 帧数, HASH_SIZE, HASH_SIZE) 计算感知哈希，返回 uint64 数组（形状为前面的维度）
+
+    前面的维度可以是一批素材，一次矩阵运算算完。
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    coefficients = np.einsum('kn,...nm,lm->...kl', _LOW_DCT, frames, _LOW_DCT).mean(axis=-3)
+    flat = coefficients.reshape(*coefficients.shape[:-2], LOW_FREQUENCY * LOW_FREQUENCY)
+    # 直流分量只反映整体亮度，不参与中位数
+    median = np.median(flat[..., 1:], axis=-1, keepdims=True)
+    bits = np.packbits(flat > median, axis=-1)
+    return np.ascontiguousarray(bits).view('>u8')[..., 0].astype(np.uint64)
+
+
+def perceptual_hash(video_path):
+    """计算一个素材的感知哈希（int），没有画面时返回 None"""
+    # media_cache 在导入时引用本模块，这里再导入它
+    from feijian import media_cache
+    info = media_cache.get_media_info(video_path)
+    if info.video_codec is None or not info.duration:
+        return None
+    process = get_scheduler().run(build_hash_command(video_path, info.duration), kind=ENCODE)
+    if process.returncode != 0:
+        raise RuntimeError(f"感知哈希计算失败: {process.stderr.decode('utf-8', 'replace').strip()[-500:]}")
+    frame_bytes = HASH_SIZE * HASH_SIZE
+    count = len(process.stdout) // frame_bytes
+    if count == 0:
+        return None
+    frames = np.frombuffer(process.stdout[:count * frame_bytes], dtype=np.uint8)
+    return int(hash_frames(frames.reshape(count, HASH_SIZE, HASH_SIZE)))
+
+
+def pack_hash(value):
+    return b'' if value is None else int(value).to_bytes(8, 'big')
+
+
+def unpack_hash(blob):
+    return int.from_bytes(bytes(blob), 'big') if blob else None
+
+
+def hamming(a, b):
+    """逐项计算两个 uint64 数组的汉明距离"""
+    xor = np.bitwise_xor(np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64))
+    if hasattr(np, 'bitwise_count'):  # NumPy 2.0 起
+        return np.bitwise_count(xor).astype(np.int64)
+    xor = np.ascontiguousarray(xor)
+    return _POPCOUNT[xor.view(np.uint8)].reshape(*xor.shape, 8).sum(axis=-1, dtype=np.int64)
+
+
+def _chunk_masks(radius):
+    """一段内汉明距离不超过 radius 的全部异或掩码（0 在最前）"""
+    values = np.arange(1 << CHUNK_BITS, dtype=np.int64)
+    weights = sum(_POPCOUNT[(values >> shift) & 0xFF] for shift in range(0, CHUNK_BITS, 8))
+    return values[weights <= radius]
+
+
+def duplicate_pairs(hashes, max_distance=DUPLICATE_DISTANCE):
+    """hashes（uint64 数组）中汉明距离不超过 max_distance 的全部下标对，返回 (左, 右)，左 < 右"""
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    n = len(hashes)
+    found = []
+    masks = _chunk_masks(max_distance // CHUNKS)
+    all_indices = np.arange(n)
+    for chunk in range(CHUNKS):
+        values = ((hashes >> np.uint64(chunk * CHUNK_BITS)) & np.uint64(CHUNK_MASK)).astype(np.int64)
+        # 按段值排序后每个桶是连续的一段，桶的起点和大小直接查表
+        order = np.argsort(values, kind='stable')
+        sizes = np.bincount(values, minlength=1 << CHUNK_BITS)
+        starts = np.cumsum(sizes) - sizes
+        for mask in masks:
+            probes = values ^ mask
+            counts = sizes[probes]
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            # 每个素材与它探测到的桶里的全部素材组成候选对
+            left = np.repeat(all_indices, counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            right = order[np.repeat(starts[probes], counts) + offsets]
+            keep = left < right
+            left, right = left[keep], right[keep]
+            keep = hamming(hashes[left], hashes[right]) <= max_distance
+            found.append(left[keep] * n + right[keep])
+    if not found:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # 同一对可能在几段里都被找到
+    pairs = np.unique(np.concatenate(found))
+    return pairs // n, pairs % n
+
+
+def _valid_unique(hashes):
+    """(有哈希的下标, 去重后的哈希, 各自在去重结果中的位置, 去重结果中每项第一次出现的位置)"""
+    valid = np.array([index for index, value in enumerate(hashes) if value is not None], dtype=np.int64)
+    values = np.array([hashes[index] for index in valid], dtype=np.uint64)
+    unique, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+    return valid, unique, inverse.reshape(-1), first
+
+
+def first_occurrences(hashes, max_distance=DUPLICATE_DISTANCE):
+    """按顺序去重：与前面某个保留下来的素材重复的素材去掉，返回是否保留的布尔数组
+
+    hashes 中为 None 的素材（没有画面或计算失败）总是保留。
+    """
+    keep = np.ones(len(hashes), dtype=bool)
+    valid, unique, inverse, first = _valid_unique(hashes)
+    # 完全相同的哈希只保留第一次出现的
+    keep[valid] = np.arange(len(valid)) == first[inverse]
+    left, right = duplicate_pairs(unique, max_distance)
+    # 只有出现在重复对里的哈希需要按出现顺序逐个判断，通常很少
+    earlier = np.where(first[left] < first[right], left, right)
+    later = np.where(first[left] < first[right], right, left)
+    dropped = set()
+    for index in np.argsort(first[later], kind='stable'):
+        if int(earlier[index]) not in dropped:
+            dropped.add(int(later[index]))
+    if dropped:
+        keep[valid[first[sorted(dropped)]]] = False
+    return keep
+
+
+def duplicate_clusters(hashes, max_distance=DUPLICATE_DISTANCE):
+    """把互相重复（传递闭包）的素材归为一簇，返回每个素材所在簇的标签（簇中第一个素材的下标）
+
+    hashes 中为 None 的素材（没有画面或计算失败）各自成簇。
+    """
+    n = len(hashes)
+    # 完全相同的哈希先合并，重复很多时也不会产生大量候选对
+    valid, unique, inverse, _ = _valid_unique(hashes)
+    left, right = duplicate_pairs(unique, max_distance)
+    labels = np.arange(len(unique))
+    while len(left):
+        # 标签沿边取较小值并跳跃压缩，直到不再变化
+        updated = labels.copy()
+        np.minimum.at(updated, left, labels[right])
+        np.minimum.at(updated, right, labels[left])
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+
+    indices = np.arange(n)
+    clusters = indices.copy()
+    members = labels[inverse]
+    first = np.full(len(unique), n)
+    np.minimum.at(first, members, indices[valid])
+    clusters[valid] = first[members]
+    return clusters
+
+
+class HashIndex:
+    """可增量加入的多索引哈希表：find 返回已加入的、距离不超过 max_distance 的一个哈希的键"""
+
+    def __init__(self, max_distance=DUPLICATE_DISTANCE):
+        self.max_distance = max_distance
+        self._masks = [int(mask) for mask in _chunk_masks(max_distance // CHUNKS)]
+        self._shifts = [chunk * CHUNK_BITS for chunk in range(CHUNKS)]
+        # 每段一个 {段值: [(哈希, 键), ...]}
+        self._buckets = [{} for _ in range(CHUNKS)]
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, value, key):
+        self._count += 1
+        for shift, buckets in zip(self._shifts, self._buckets):
+            buckets.setdefault((value >> shift) & CHUNK_MASK, []).append((value, key))
+
+    def find(self, value):
+        limit = self.max_distance
+        for shift, buckets in zip(self._shifts, self._buckets):
+            part = (value >> shift) & CHUNK_MASK
+            for mask in self._masks:
+                bucket = buckets.get(part ^ mask)
+                if bucket:
+                    for other, key in bucket:
+                        if _popcount(value ^ other) <= limit:
+                            return key
+        return None
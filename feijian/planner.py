@@ -0,0 +1,149 @@
+"""混剪分组规划
+
+把素材时长装进尽可能多的输出，每个输出的总时长落在 [target - tolerance, target + tolerance] 内。
+
+顺序合成：素材顺序不变，每组是一段连续的素材，放不进任何一组的素材跳过。
+    用前缀和 + searchsorted 一次算出每个起点“刚好达到下限”的终点，组的终点随起点单调不减，
+    所以从左到右每次取最早结束的可行组就是组数最多的方案。
+乱序合成：打乱剩余素材后按顺序合成的方法装箱，把没装进去的素材重新打乱再装，直到装不出新组。
+顺序合成的组只取决于它前面的素材，stream_sequential 边读入素材时长边产出分组，供流水线使用。
+乱序合成时可以传入重复簇标签（见 phash.duplicate_clusters），每轮打乱后同一簇的素材尽量隔开，不落在同一组里。
+"""
+from collections import deque
+
+import numpy as np
+
+# 乱序合成最多重新打乱的轮数
+MAX_ROUNDS = 8
+
+# 时长范围两端放宽的秒数：远小于 ffprobe 时长的精度（微秒），只吸收浮点累加误差，
+# 让前缀和（_pack_sequential）与逐个累加（stream_sequential）对恰好落在边界上的组判断一致
+BOUND_SLACK = 1e-9
+
+
+def default_tolerance(target_duration):
+    return max(2.0, target_duration * 0.05)
+
+
+def _bounds(target_duration, tolerance):
+    if tolerance is None:
+        tolerance = default_tolerance(target_duration)
+    return target_duration - tolerance - BOUND_SLACK, target_duration + tolerance + BOUND_SLACK
+
+
+def _pack_sequential(durations, lo, hi):
+    """返回 [(起点, 终点), ...]，每组为 durations[起点:终点]"""
+    n = len(durations)
+    if n == 0:
+        return []
+    prefix = np.concatenate(([0.0], np.cumsum(durations)))
+    starts = np.arange(n)
+    # 每个起点的组至少包含一个素材，达到下限的最早终点
+    ends = np.maximum(np.searchsorted(prefix, prefix[:-1] + lo, side='left'), starts + 1)
+    sums = prefix[np.minimum(ends, n)] - prefix[:-1]
+    feasible = (ends <= n) & (sums >= lo) & (sums <= hi)
+    # next_start[i]：不小于 i 的第一个可行起点，没有时为 n
+    next_start = np.minimum.accumulate(np.where(feasible, starts, n)[::-1])[::-1]
+
+    groups = []
+    i = 0
+    while i < n:
+        start = next_start[i]
+        if start >= n:
+            break
+        end = int(ends[start])
+        groups.append((int(start), end))
+        i = end
+    return groups
+
+
+def stream_sequential(clips, target_duration, tolerance=None):
+    """顺序合成的流式版本：clips 为 (素材, 时长) 的迭代器，每凑齐一组立即产出该组的素材列表
+
+    规则与 _pack_sequential 相同：当前起点的素材累计到下限时，不超过上限就成组，否则起点后移一个素材。
+    只保留当前还没成组的素材，累计时长随素材进出增减，每个素材的处理是均摊 O(1) 的。
+    """
+    lo, hi = _bounds(target_duration, tolerance)
+    window = deque()
+    total = 0.0
+    for clip, duration in clips:
+        window.append((clip, duration))
+        total += duration
+        while window and total >= lo:
+            if total <= hi:
+                yield [clip for clip, _ in window]
+                window.clear()
+                total = 0.0
+                break
+            total -= window.popleft()[1]
+        if not window:
+            # 清空时重置，避免浮点误差累积
+            total = 0.0
+
+
+def spread_duplicates(order, clusters):
+    """重排 order，使同一簇的素材尽量隔开：先是各簇第一次出现的素材，然后是第二次出现的……，每轮内保持原顺序"""
+    labels = clusters[order]
+    by_label = np.argsort(labels, kind='stable')
+    sorted_labels = labels[by_label]
+    # 每个素材是本簇中第几次出现
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[by_label] = np.arange(len(order)) - np.searchsorted(sorted_labels, sorted_labels, side='left')
+    return order[np.argsort(rank, kind='stable')]
+
+
+def plan_groups(durations, target_duration, tolerance=None, shuffle=False, rng=None, clusters=None):
+    """规划分组，返回 (分组列表, 统计信息)
+
+    分组列表中每项是素材下标列表；shuffle 为 True 时组内顺序和组的顺序都是随机的。
+    clusters 为每个素材的重复簇标签，只在 shuffle 时使用（见 spread_duplicates）。
+    """
+    lo, hi = _bounds(target_duration, tolerance)
+    durations = np.asarray(durations, dtype=np.float64)
+
+    groups = []
+    if not shuffle:
+        groups = [list(range(start, end)) for start, end in _pack_sequential(durations, lo, hi)]
+    else:
+        rng = rng if rng is not None else np.random.default_rng()
+        remaining = np.arange(len(durations))
+        for _ in range(MAX_ROUNDS):
+            if len(remaining) == 0:
+                break
+            order = rng.permutation(remaining)
+            if clusters is not None:
+                order = spread_duplicates(order, np.asarray(clusters))
+            packed = _pack_sequential(durations[order], lo, hi)
+            if not packed:
+                break
+            used = np.zeros(len(order), dtype=bool)
+            for start, end in packed:
+                groups.append(order[start:end].tolist())
+                used[start:end] = True
+            remaining = order[~used]
+        rng.shuffle(groups)
+
+    return groups, plan_stats(durations, groups, target_duration)
+
+
+def plan_stats(durations, groups, target_duration):
+    """素材利用率和输出时长分布"""
+    durations = np.asarray(durations, dtype=np.float64)
+    sums = np.array([durations[group].sum() for group in groups], dtype=np.float64)
+    total = float(durations.sum())
+    used = float(sums.sum())
+    stats = {
+        'clips': int(len(durations)),
+        'groups': int(len(groups)),
+        'used_clips': int(sum(len(group) for group in groups)),
+        'total_seconds': round(total, 3),
+        'used_seconds': round(used, 3),
+        'utilisation': round(used / total, 4) if total else 0.0,
+    }
+    if len(sums):
+        stats.update({
+            'min_group_seconds': round(float(sums.min()), 3),
+            'max_group_seconds': round(float(sums.max()), 3),
+            'mean_abs_deviation': round(float(np.abs(sums - target_duration).mean()), 3),
+        })
+    return stats
@@ -0,0 +1,99 @@
+"""同一次 ffmpeg 中生成的预览文件
+
+分割和混剪写主输出的同一个 ffmpeg 进程里，解码后的画面再分出几路生成预览，不需要事后重新解码输出文件：
+- thumbnail：封面缩略图（片段 POSTER_POSITION 处的一帧）
+- sprite：预览拼图（片段内均匀取 SPRITE_COLUMNS x SPRITE_ROWS 帧拼成一张图）
+- clip：低码率的小尺寸预览短片
+
+预览写到主输出所在目录的 PREVIEW_DIR 子目录，文件名为 <主输出名>.jpg / <主输出名>_sprite.jpg / <主输出名>_preview.mp4。
+library.scan 不进入该子目录，分割结果再作为混剪素材时不会把预览当成素材。
+"""
+import os
+
+PREVIEW_KINDS = ('thumbnail', 'sprite', 'clip')
+PREVIEW_DIR = 'feijian-previews'
+
+# 预览参数变化时增加版本号，旧的渲染缓存自然失效
+PREVIEW_VERSION = 1
+
+THUMBNAIL_WIDTH = 320
+POSTER_POSITION = 0.3
+SPRITE_COLUMNS = 3
+SPRITE_ROWS = 3
+SPRITE_TILE_WIDTH = 160
+CLIP_HEIGHT = 360
+
+# 预览很小，每个输出只用一个编码线程，不和主输出抢 CPU
+IMAGE_ARGS = ['-update', '1', '-f', 'image2', '-c:v', 'mjpeg', '-q:v', '4', '-threads', '1']
+CLIP_ARGS = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '32', '-maxrate', '400k', '-bufsize', '800k',
+             '-c:a', 'aac', '-b:a', '48k', '-ac', '1', '-threads', '1']
+
+_SUFFIXES = {'thumbnail': '.jpg', 'sprite': '_sprite.jpg', 'clip': '_preview.mp4'}
+
+
+def parse_previews(kinds):
+    """把预览种类列表（或逗号分隔的字符串，all 表示全部）解析成按 PREVIEW_KINDS 排序的元组，无效时抛出 ValueError"""
+    if isinstance(kinds, str):
+        kinds = kinds.split(',')
+    kinds = {kind.strip() for kind in kinds if kind.strip()}
+    if 'all' in kinds:
+        return PREVIEW_KINDS
+    invalid = kinds.difference(PREVIEW_KINDS)
+    if invalid:
+        raise ValueError(f"无效的预览种类：{', '.join(sorted(invalid))}（可用：{', '.join(PREVIEW_KINDS)}, all）")
+    return tuple(kind for kind in PREVIEW_KINDS if kind in kinds)
+
+
+def preview_paths(output_path, kinds):
+    """主输出 output_path 的各预览路径 {种类: 路径}；output_path 可以是 segment 复用器的 %d 文件名模板"""
+    folder, name = os.path.split(output_path)
+    stem = os.path.splitext(name)[0]
+    return {kind: os.path.join(folder, PREVIEW_DIR, stem + _SUFFIXES[kind]) for kind in kinds}
+
+
+def _format_time(seconds):
+    return f"{seconds:.3f}"
+
+
+def build_graph(source, segments, image_paths, clip=False, split_source=False, prefix='p'):
+    """预览的滤镜和输出参数
+
+    segments 为滤镜图时间轴上的 [(起点, 终点), ...]，image_paths 与之一一对应，每项为 {种类: 路径}（缩略图和拼图）。
+    source 为输入流（如 '0:v:0'，可以被多个滤镜引用）；是滤镜的输出时 split_source 为 True，先用 split 分成多路。
+    返回 (滤镜列表, 图片输出参数, 预览短片的视频标签或 None)；预览短片的输出由调用方按各自的封装添加。
+    """
+    branches = []
+    args = []
+    for index, ((start, end), paths) in enumerate(zip(segments, image_paths)):
+        if 'thumbnail' in paths:
+            at = start + (end - start) * POSTER_POSITION
+            label = f"[{prefix}t{index}]"
+            branches.append((f"trim=start={_format_time(at)}:end={_format_time(end)},setpts=PTS-STARTPTS,"
+                             f"scale={THUMBNAIL_WIDTH}:-2", label))
+            args.extend(['-map', label, '-frames:v', '1', *IMAGE_ARGS, paths['thumbnail']])
+        if 'sprite' in paths:
+            # fps 按片段时长换算，片段内正好取满一张拼图；不足时 tile 在结尾输出不满的一张
+            rate = SPRITE_COLUMNS * SPRITE_ROWS / max(end - start, 0.001)
+            label = f"[{prefix}s{index}]"
+            branches.append((f"trim=start={_format_time(start)}:end={_format_time(end)},setpts=PTS-STARTPTS,"
+                             f"fps={rate:.6f},scale={SPRITE_TILE_WIDTH}:-2,tile={SPRITE_COLUMNS}x{SPRITE_ROWS}",
+                             label))
+            args.extend(['-map', label, '-frames:v', '1', *IMAGE_ARGS, paths['sprite']])
+    clip_label = None
+    if clip:
+        clip_label = f"[{prefix}c]"
+        branches.append((f"scale=-2:{CLIP_HEIGHT},format=yuv420p", clip_label))
+
+    if split_source and len(branches) > 1:
+        inputs = [f"[{prefix}in{index}]" for index in range(len(branches))]
+        filters = [f"[{source}]split={len(branches)}{''.join(inputs)}"]
+    else:
+        inputs = [f"[{source}]"] * len(branches)
+        filters = []
+    filters.extend(f"{branch_input}{chain}{label}" for branch_input, (chain, label) in zip(inputs, branches))
+    return filters, args, clip_label
+
+
+def cache_args(kind):
+    """渲染缓存键中区分预览种类的参数"""
+    return ['preview', kind, PREVIEW_VERSION]
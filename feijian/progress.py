@@ -0,0 +1,169 @@
+"""ffmpeg 实时进度
+
+ffmpeg 加上 -progress pipe:1 -nostats 后，会周期性地向 stdout 输出 key=value 块，
+每块以 progress=continue（或结束时的 progress=end）收尾。调度器逐行读取并解析，
+JobProgress 把一个任务中所有 ffmpeg 进程的位置按媒体时长加权汇总成整体进度、速度和剩余时间。
+"""
+import threading
+import time
+from collections import namedtuple
+
+PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats']
+
+# percent 整体百分比；speed 为相对实时的倍数；fps 为所有进行中进程的帧率之和；eta 为剩余秒数，未知时为 None
+ProgressInfo = namedtuple('ProgressInfo', ['percent', 'done_seconds', 'total_seconds', 'speed', 'fps', 'eta'])
+
+
+def with_progress(command):
+    """在 ffmpeg 后插入进度输出参数"""
+    if command[0] != 'ffmpeg' or '-progress' in command:
+        return list(command)
+    return [command[0], *PROGRESS_ARGS, *command[1:]]
+
+
+def _float(value):
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):  # N/A
+        return None
+
+
+def parse_progress(lines, callback):
+    """逐行解析 -progress 输出，每读完一块回调 callback(已输出秒数, 速度, fps)"""
+    block = {}
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            continue
+        if key != 'progress':
+            block[key] = value
+            continue
+        # out_time_us 在旧版本里叫 out_time_ms（单位同样是微秒）
+        out_us = _float(block.get('out_time_us') or block.get('out_time_ms'))
+        callback(max(out_us / 1e6, 0.0) if out_us is not None else None,
+                 _float(block.get('speed')), _float(block.get('fps')))
+        block = {}
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def format_details(info):
+    """速度、帧率和剩余时间，如 "3.2x  240 fps  剩余 01:05" """
+    parts = []
+    if info.speed:
+        parts.append(f"{info.speed:.1f}x")
+    if info.fps:
+        parts.append(f"{info.fps:.0f} fps")
+    if info.percent < 100:
+        parts.append(f"剩余 {format_eta(info.eta)}")
+    return '  '.join(parts)
+
+
+def format_status(info):
+    return f"{info.percent}%  {format_details(info)}".rstrip()
+
+
+class _Unit:
+    """一个 ffmpeg 进程（或一组命中缓存的输出）负责的媒体时长"""
+
+    def __init__(self, job, seconds):
+        self.job = job
+        self.seconds = seconds
+        self.position = 0.0
+        self.fps = None
+
+    def update(self, position, speed=None, fps=None):
+        """作为 scheduler.run 的 progress 回调"""
+        with self.job._lock:
+            if position is not None:
+                self.position = min(max(position, self.position), self.seconds)
+            self.fps = fps
+        self.job._changed()
+
+    def finish(self):
+        """完成（或失败）后调用，按全部时长计入进度；重复调用无效"""
+        with self.job._lock:
+            if self not in self.job._active:
+                return
+            self.job._active.discard(self)
+            self.job._finished += self.seconds
+        self.job._changed()
+
+    def fail(self):
+        """失败时调用：计入 JobProgress.failed，并按完成计入进度"""
+        with self.job._lock:
+            if self in self.job._active:
+                self.job.failed += 1
+        self.finish()
+
+
+class JobProgress:
+    """按媒体时长加权的任务进度
+
+    progress(百分比) 在百分比变化时回调；status(ProgressInfo) 最多每 interval 秒回调一次，结束时一定回调。
+    failed 为失败的单元数（见 _Unit.fail）。
+    """
+
+    def __init__(self, total_seconds, progress=None, status=None, interval=0.5):
+        self.total_seconds = total_seconds
+        self.progress = progress
+        self.status = status
+        self.interval = interval
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+        self._active = set()
+        self._finished = 0.0
+        self._started = time.monotonic()
+        self._last_percent = None
+        self._last_status = 0.0
+
+    def add_total(self, seconds):
+        with self._lock:
+            self.total_seconds += seconds
+
+    def unit(self, seconds):
+        unit = _Unit(self, seconds)
+        with self._lock:
+            self._active.add(unit)
+        return unit
+
+    def snapshot(self):
+        with self._lock:
+            done = self._finished + sum(unit.position for unit in self._active)
+            fps = sum(unit.fps or 0 for unit in self._active)
+            total = self.total_seconds
+            idle = not self._active
+        elapsed = time.monotonic() - self._started
+        if total > 0:
+            percent = min(int(done / total * 100), 100)
+        else:
+            percent = 100 if idle else 0
+        speed = done / elapsed if elapsed > 0 else None
+        eta = max(total - done, 0.0) / speed if speed else None
+        return ProgressInfo(percent, done, total, speed, fps, eta)
+
+    def _changed(self, force=False):
+        # 多个线程同时汇报时串行计算和回调，保证百分比只增不减
+        with self._emit_lock:
+            info = self.snapshot()
+            now = time.monotonic()
+            if self.progress is not None and (self._last_percent is None or info.percent > self._last_percent):
+                self._last_percent = info.percent
+                self.progress(info.percent)
+            if self.status is not None and (force or now - self._last_status >= self.interval):
+                self._last_status = now
+                self.status(info)
+
+    def close(self):
+        """任务结束时调用，输出最终状态"""
+        self._changed(force=True)
@@ -0,0 +1,229 @@
+"""渲染结果缓存
+
+分割片段和混剪输出按内容寻址：键 = (源文件内容指纹, 切点范围, 完整的 ffmpeg 参数)，
+源文件没变、参数没变时直接把上次的结果硬链接（不支持时复制）到输出位置，不再运行 ffmpeg。
+缓存文件放在 <缓存目录>/renders/objects，索引记录大小和最近使用时间，总大小超过上限时按 LRU 删除。
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from feijian import journal, media_cache
+
+logger = logging.getLogger(__name__)
+
+# 渲染流程变化（不体现在 ffmpeg 参数里的）时增加版本号，旧缓存自然失效
+RENDER_CACHE_VERSION = 1
+
+# 缓存总大小上限
+MAX_CACHE_BYTES = 50 * 1024 ** 3
+
+
+def cache_dir():
+    return os.path.join(media_cache.default_cache_dir(), 'renders')
+
+
+def render_key(sources, cut_range, args):
+    """sources 为源文件路径列表，cut_range 为 (起点, 终点) 或 None，args 为决定输出内容的参数"""
+    payload = json.dumps({
+        'version': RENDER_CACHE_VERSION,
+        'sources': [media_cache.get_fingerprint(source) for source in sources],
+        'range': [round(t, 3) for t in cut_range] if cut_range else None,
+        'args': list(args),
+    }, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def remove_quietly(path):
+    """渲染前删除旧输出：它可能是指向缓存文件的硬链接，ffmpeg 直接覆盖会改坏缓存"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        # 跨分区或文件系统不支持硬链接
+        shutil.copy2(source, target)
+
+
+class RenderCache:
+    """线程安全的渲染结果缓存"""
+
+    def __init__(self, root=None, max_bytes=MAX_CACHE_BYTES):
+        self.root = root or cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        try:
+            self._conn = self._connect(self.root)
+        except (OSError, sqlite3.Error) as e:
+            # 缓存目录不可写时改用临时目录，只在本进程内复用
+            logger.warning("无法打开渲染缓存 %s: %s", self.root, e)
+            self.root = tempfile.mkdtemp(prefix='feijian-renders-')
+            self._conn = self._connect(self.root)
+
+    @staticmethod
+    def _connect(root):
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        conn = sqlite3.connect(os.path.join(root, 'index.sqlite3'), timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS objects (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS objects_last_access ON objects(last_access)')
+        conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.commit()
+        return conn
+
+    def _object_path(self, key):
+        return os.path.join(self.root, 'objects', key[:2], f"{key}.mp4")
+
+    def _count(self, name):
+        self._conn.execute('INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)', (name,))
+        self._conn.execute('UPDATE counters SET value = value + 1 WHERE name=?', (name,))
+
+    def fetch(self, key, output_path):
+        """命中时把缓存结果放到 output_path 并返回 True"""
+        object_path = self._object_path(key)
+        with self._lock:
+            row = self._conn.execute('SELECT size FROM objects WHERE key=?', (key,)).fetchone()
+            if row is None or not os.path.exists(object_path):
+                if row is not None:
+                    self._conn.execute('DELETE FROM objects WHERE key=?', (key,))
+                self._count('misses')
+                self._conn.commit()
+                return False
+            self._conn.execute('UPDATE objects SET last_access=?, hits = hits + 1 WHERE key=?',
+                               (time.time(), key))
+            self._count('hits')
+            self._conn.commit()
+        # 先放到 .part 再改名，复制到一半中断时不会留下看似完整的输出
+        partial_path = journal.part_path(output_path)
+        remove_quietly(partial_path)
+        try:
+            _link_or_copy(object_path, partial_path)
+            os.replace(partial_path, output_path)
+        except OSError:
+            # 刚好被其它线程淘汰
+            remove_quietly(partial_path)
+            return False
+        return True
+
+    def fetch_all(self, keys, output_paths):
+        """全部命中才放置输出，任一未命中返回 False（已放置的会删除）"""
+        placed = []
+        for key, output_path in zip(keys, output_paths):
+            if not self.fetch(key, output_path):
+                for path in placed:
+                    remove_quietly(path)
+                return False
+            placed.append(output_path)
+        return True
+
+    def store(self, key, output_path):
+        """把刚渲染好的 output_path 存入缓存"""
+        object_path = self._object_path(key)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            partial_path = f"{object_path}.{threading.get_ident()}.part"
+            try:
+                _link_or_copy(output_path, partial_path)
+                os.replace(partial_path, object_path)
+            finally:
+                remove_quietly(partial_path)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO objects (key, size, created, last_access, hits) '
+                'VALUES (?, ?, ?, ?, COALESCE((SELECT hits FROM objects WHERE key=?), 0))',
+                (key, os.path.getsize(object_path), now, now, key))
+            self._conn.commit()
+        self.evict()
+
+    def store_all(self, keys, output_paths):
+        for key, output_path in zip(keys, output_paths):
+            self.store(key, output_path)
+
+    def evict(self, max_bytes=None):
+        """总大小超过上限时删除最久未使用的结果"""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        with self._lock:
+            total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+            if total <= max_bytes:
+                return
+            removed = []
+            for key, size in self._conn.execute('SELECT key, size FROM objects ORDER BY last_access'):
+                if total <= max_bytes:
+                    break
+                remove_quietly(self._object_path(key))
+                removed.append((key,))
+                total -= size
+            self._conn.executemany('DELETE FROM objects WHERE key=?', removed)
+            self._conn.commit()
+
+    def clear(self):
+        self.evict(max_bytes=0)
+        with self._lock:
+            self._conn.execute('DELETE FROM counters')
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects').fetchone()
+            counters = dict(self._conn.execute('SELECT name, value FROM counters'))
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        return {
+            'path': self.root,
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """进程内共享的默认缓存实例"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = RenderCache()
+    return _default_cache
+
+
+def configure(**kwargs):
+    """用指定参数（如 root、max_bytes）替换默认缓存实例，并关闭被替换的实例"""
+    global _default_cache
+    with _default_cache_lock:
+        previous, _default_cache = _default_cache, RenderCache(**kwargs)
+    if previous is not None:
+        previous.close()
+    return _default_cache
@@ -0,0 +1,95 @@
+"""多规格输出
+
+一次解码同时输出多个规格（如横屏 1080p、720p 和 9:16 竖屏裁切）：解码后的画面用 split 滤镜分成几路，
+每路单独缩放/裁切后各自编码，输出写到导出目录下以规格名命名的子目录。
+
+规格写作预设名（见 PRESETS），或 "名称=宽x高"（等比缩放，不足处补黑边）、"名称=宽x高:crop"（等比放大后居中裁切）。
+"""
+import os
+import re
+from collections import namedtuple
+
+from feijian.scheduler import get_scheduler
+
+Rendition = namedtuple('Rendition', ['name', 'width', 'height', 'crop'])
+
+PRESETS = {
+    '1080p': Rendition('1080p', 1920, 1080, False),
+    '720p': Rendition('720p', 1280, 720, False),
+    '480p': Rendition('480p', 854, 480, False),
+    'vertical': Rendition('vertical', 1080, 1920, True),
+}
+
+_SPEC = re.compile(r'^([\w-]+)=(\d+)x(\d+)(:crop)?$')
+
+
+def parse_renditions(specs):
+    """把规格列表（或逗号分隔的字符串）解析成 [Rendition, ...]，无效时抛出 ValueError"""
+    if isinstance(specs, str):
+        specs = specs.split(',')
+    renditions = []
+    for spec in specs:
+        if isinstance(spec, (list, tuple)):
+            rendition = Rendition(*spec)
+        else:
+            spec = spec.strip()
+            match = _SPEC.match(spec)
+            if spec in PRESETS:
+                rendition = PRESETS[spec]
+            elif match:
+                rendition = Rendition(match.group(1), int(match.group(2)), int(match.group(3)), bool(match.group(4)))
+            else:
+                raise ValueError(f"无效的输出规格：{spec}（可用预设：{', '.join(PRESETS)}）")
+        # yuv420p 要求宽高为偶数；规格名用作子目录名
+        if rendition.width <= 0 or rendition.height <= 0 or rendition.width % 2 or rendition.height % 2:
+            raise ValueError(f"输出规格 {rendition.name} 的宽高必须为正偶数")
+        if not re.match(r'^[\w-]+$', rendition.name):
+            raise ValueError(f"无效的输出规格名：{rendition.name}")
+        renditions.append(rendition)
+    if len({rendition.name for rendition in renditions}) != len(renditions):
+        raise ValueError("输出规格名不能重复")
+    return renditions
+
+
+def output_paths(path, renditions):
+    """一个输出在各规格子目录中的路径；没有多规格时就是它本身"""
+    if not renditions:
+        return [path]
+    folder, name = os.path.split(path)
+    return [os.path.join(folder, rendition.name, name) for rendition in renditions]
+
+
+def video_filter(rendition):
+    width, height = rendition.width, rendition.height
+    if rendition.crop:
+        fit = f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height}"
+    else:
+        fit = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+               f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2")
+    return f"{fit},setsar=1,format=yuv420p"
+
+
+def fan_out(source, renditions, prefix='r'):
+    """把滤镜图中的视频 source（如 '0:v:0'）分给各规格，返回 (滤镜列表, 各规格的输出标签)"""
+    if len(renditions) == 1:
+        return [f"[{source}]{video_filter(renditions[0])}[{prefix}0]"], [f"[{prefix}0]"]
+    branches = [f"[{prefix}s{index}]" for index in range(len(renditions))]
+    filters = [f"[{source}]split={len(renditions)}{''.join(branches)}"]
+    labels = []
+    for index, (branch, rendition) in enumerate(zip(branches, renditions)):
+        filters.append(f"{branch}{video_filter(rendition)}[{prefix}{index}]")
+        labels.append(f"[{prefix}{index}]")
+    return filters, labels
+
+
+def thread_args(count=1):
+    """主输出的编码线程数：调度器分给一个任务的线程由 count 个主输出平分
+
+    调度器给没有指定 -threads 的每个输出都分配整份线程，多个主输出时由这里平分。
+    """
+    return ['-threads', str(max(1, get_scheduler().threads_per_job // count))]
+
+
+def cache_args(rendition):
+    """渲染缓存键中区分规格的参数"""
+    return ['rendition', rendition.width, rendition.height, bool(rendition.crop)]
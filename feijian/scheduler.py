@@ -0,0 +1,253 @@
+"""进程级 ffmpeg/ffprobe 调度器
+
+分割和混剪共用同一个调度器，所有子进程都从这里启动：
+- 编码/复制任务占用任务槽，同时运行的数量不超过 max_jobs
+- 每个编码任务分到 cores // max_jobs 个线程（通过 -threads 传给 ffmpeg），避免多个 libx264 抢占全部核心
+- ffprobe 单独限流，不占用编码槽
+- submit 有提交窗口上限，排队中的任务过多时调用方会阻塞，不会一次堆积成千上万个 future
+- 需要进度的 ffmpeg 加上 -progress pipe:1，输出边读边解析，不等进程结束
+- 开启追踪时记录等待槽位的时间和每个子进程的资源用量（见 tracing）
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from feijian import tracing
+from feijian.progress import parse_progress, with_progress
+
+if sys.platform == 'win32':
+    no_window = subprocess.CREATE_NO_WINDOW
+else:
+    no_window = 0
+
+ENCODE = 'encode'
+COPY = 'copy'
+PROBE = 'probe'
+
+# 不带参数值的 ffmpeg 选项，其余选项都带一个参数值
+_FLAG_OPTIONS = {'-y', '-n', '-hide_banner', '-nostats', '-stats', '-nostdin', '-an', '-vn', '-sn', '-dn',
+                 '-shortest', '-copyts', '-re'}
+
+
+def _env_int(name):
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class FFmpegScheduler:
+    def __init__(self, max_jobs=None, cores=None, window=None, max_probes=None):
+        self.cores = cores or _env_int('FEIJIAN_CORES') or os.cpu_count() or 1
+        self.max_jobs = max_jobs or _env_int('FEIJIAN_MAX_JOBS') or max(1, self.cores // 4)
+        self.max_probes = max_probes or min(16, self.cores * 2)
+        self.window = window or self.max_jobs * 4
+
+        self._cond = threading.Condition()
+        self._jobs = 0
+        self._probes = 0
+        self._pending = 0
+        self._processes = set()
+        self._media_seconds = 0.0
+        self._completed_jobs = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(32, self.cores * 2),
+                                            thread_name_prefix='feijian-job')
+
+    @property
+    def threads_per_job(self):
+        return max(1, self.cores // self.max_jobs)
+
+    def set_max_jobs(self, max_jobs):
+        """调整同时运行的编码任务数，已在运行的任务不受影响"""
+        with self._cond:
+            self.max_jobs = max(1, int(max_jobs))
+            self.window = max(self.window, self.max_jobs * 4)
+            self._cond.notify_all()
+
+    def _acquire(self, kind):
+        with self._cond:
+            if kind == PROBE:
+                self._cond.wait_for(lambda: self._probes < self.max_probes)
+                self._probes += 1
+            else:
+                self._cond.wait_for(lambda: self._jobs < self.max_jobs)
+                self._jobs += 1
+
+    def _release(self, kind):
+        with self._cond:
+            if kind == PROBE:
+                self._probes -= 1
+            else:
+                self._jobs -= 1
+                self._completed_jobs += 1
+            self._cond.notify_all()
+
+    def with_threads(self, command, threads=None):
+        """在每个没有指定 -threads 的输出文件前插入 -threads（-threads 是每个输出单独的选项）"""
+        if command[0] != 'ffmpeg':
+            return list(command)
+        threads = str(threads or self.threads_per_job)
+        result = [command[0]]
+        # 当前输出的选项从上一个输入或输出之后开始
+        specified = False
+        index = 1
+        while index < len(command):
+            arg = command[index]
+            if arg == '-i':
+                result.extend(command[index:index + 2])
+                specified = False
+                index += 2
+            elif arg in _FLAG_OPTIONS:
+                result.append(arg)
+                index += 1
+            elif arg.startswith('-') and arg != '-':
+                specified = specified or arg == '-threads'
+                result.extend(command[index:index + 2])
+                index += 2
+            else:
+                # 输出文件（'-' 为 stdout）
+                if not specified:
+                    result.extend(['-threads', threads])
+                result.append(arg)
+                specified = False
+                index += 1
+        return result
+
+    def run(self, command, kind=ENCODE, check=False, progress=None):
+        """占用一个槽位运行子进程，返回 subprocess.CompletedProcess（stdout/stderr 为 bytes）
+
+        传入 progress 时 ffmpeg 的进度输出逐块回调 progress(已输出秒数, 速度, fps)，结果中的 stdout 为空。
+        """
+        if kind == ENCODE:
+            command = self.with_threads(command)
+        if progress is not None:
+            command = with_progress(command)
+        tracer = tracing.get_tracer()
+        waited = time.perf_counter()
+        self._acquire(kind)
+        started = time.perf_counter()
+        tracer.slot_wait(kind, waited, started)
+        usage = None
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, creationflags=no_window)
+            with self._cond:
+                self._processes.add(process)
+            try:
+                if progress is None and not tracer.enabled:
+                    stdout, stderr = process.communicate()
+                else:
+                    stdout, stderr, usage = self._stream(process, progress, tracer.enabled)
+            finally:
+                with self._cond:
+                    self._processes.discard(process)
+        finally:
+            self._release(kind)
+        tracer.process(command, kind, started, time.perf_counter(), process.returncode, usage)
+
+        result = subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+        if check:
+            result.check_returncode()
+        return result
+
+    @staticmethod
+    def _stream(process, progress, measure):
+        """stderr 由另一个线程读完，避免管道写满互相阻塞；stdout 在当前线程读取
+
+        有 progress 时逐行解析进度（返回的 stdout 为空）；measure 为 True 时用 wait4 回收进程并返回资源用量。
+        """
+        chunks = []
+        reader = threading.Thread(target=lambda: chunks.append(process.stderr.read()), daemon=True)
+        reader.start()
+        stdout = b''
+        usage = None
+        try:
+            if progress is None:
+                stdout = process.stdout.read()
+            else:
+                parse_progress(process.stdout, progress)
+            if measure:
+                usage = tracing.wait_with_usage(process)
+            else:
+                process.wait()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        finally:
+            reader.join()
+            process.stdout.close()
+            process.stderr.close()
+        return stdout, b''.join(chunks), usage
+
+    def submit(self, fn, *args, **kwargs):
+        """在调度器线程上执行 fn，提交窗口已满时阻塞直到有任务完成"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending < self.window)
+            self._pending += 1
+        try:
+            future = self._executor.submit(tracing.get_tracer().wrap(fn), *args, **kwargs)
+        except BaseException:
+            self._done()
+            raise
+        future.add_done_callback(lambda _: self._done())
+        return future
+
+    def _done(self):
+        with self._cond:
+            self._pending -= 1
+            self._cond.notify_all()
+
+    def report_media_seconds(self, seconds):
+        """任务完成后上报已处理的媒体时长，供吞吐统计使用"""
+        with self._cond:
+            self._media_seconds += seconds
+
+    @property
+    def media_seconds(self):
+        return self._media_seconds
+
+    @property
+    def completed_jobs(self):
+        return self._completed_jobs
+
+    def shutdown(self, wait=True):
+        """不再接受新任务；wait 为 False 时已提交的任务在后台照常完成"""
+        self._executor.shutdown(wait=wait)
+
+    def kill_all(self):
+        """终止当前所有子进程"""
+        with self._cond:
+            processes = list(self._processes)
+        for process in processes:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """进程内共享的调度器实例"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FFmpegScheduler()
+    return _scheduler
+
+
+def configure(**kwargs):
+    """用指定参数替换默认调度器，需在任务开始前调用；旧的调度器关闭，已提交的任务照常完成"""
+    global _scheduler
+    with _scheduler_lock:
+        previous, _scheduler = _scheduler, FFmpegScheduler(**kwargs)
+    if previous is not None:
+        previous.shutdown(wait=False)
+    return _scheduler
@@ -0,0 +1,326 @@
+"""单次解码多片段分割
+
+一个源文件的所有随机片段在同一个 ffmpeg 进程里完成：在切点强制关键帧，
+再交给 segment 复用器按切点切开，避免每个片段都从 0 秒重新解码到起点。
+需要多个输出规格时（见 renditions）同一次解码的画面分给各规格，每个规格一个 segment 输出；
+需要预览时（见 previews）同一次解码的画面再生成各片段的缩略图、拼图和预览短片。
+"""
+import os
+import random
+import subprocess
+from bisect import bisect_left, bisect_right
+
+from feijian import analysis, journal, media_cache, render_cache, renditions as rendition_specs, tracing
+from feijian import previews as preview_specs
+from feijian.scheduler import COPY, ENCODE, get_scheduler
+
+ENCODE_PRESET = 'ultrafast'
+ENCODE_ARGS = ['-c:v', 'libx264', '-preset', ENCODE_PRESET, '-crf', '23',
+               '-c:a', 'aac', '-b:a', '128k']
+
+COPY_ARGS = ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+
+# 流复制输出为 mp4 时能直接封装的编码
+COPY_VIDEO_CODECS = ('h264', 'hevc', 'mpeg4', 'av1')
+COPY_AUDIO_CODECS = (None, 'aac', 'mp3', 'ac3', 'eac3', 'alac', 'opus')
+
+# 关键帧时间比较的容差
+KEYFRAME_EPSILON = 0.001
+
+# 切点过多时命令行会超过 Windows 的长度限制，按块拆成多次（输入端 seek，几乎不增加解码量）
+MAX_CUTS_PER_PASS = 500
+MAX_PREVIEW_CUTS_PER_PASS = 50
+
+
+def plan_segments(duration, min_duration, max_duration, rng=random):
+    """按 [min_duration, max_duration] 的随机时长规划片段，返回 [(start, end), ...]"""
+    if max_duration <= 0 or min_duration > max_duration:
+        raise ValueError("时长区间无效")
+    segments = []
+    start = 0.0
+    while start < duration:
+        length = rng.randint(min_duration, max_duration)
+        if length <= 0:
+            continue
+        end = min(start + length, duration)
+        segments.append((start, end))
+        start = end
+    return segments
+
+
+def plan_keyframe_segments(duration, keyframes, min_duration, max_duration, rng=random):
+    """切点对齐关键帧的随机规划
+
+    每段先随机一个目标时长，再在 [min_duration, max_duration] 内找离目标最近的关键帧；
+    区间内没有关键帧时取离区间最近的那个，所以个别片段会略超出区间。
+    """
+    if max_duration <= 0 or min_duration > max_duration:
+        raise ValueError("时长区间无效")
+    segments = []
+    start = 0.0
+    while start < duration:
+        target = start + rng.randint(min_duration, max_duration)
+        # 切点必须严格在起点之后，min_duration 为 0 时也不会原地打转
+        lo = max(bisect_left(keyframes, start + min_duration - KEYFRAME_EPSILON),
+                 bisect_right(keyframes, start + KEYFRAME_EPSILON))
+        hi = bisect_right(keyframes, start + max_duration + KEYFRAME_EPSILON)
+        if target >= duration or lo >= len(keyframes):
+            end = duration
+        elif lo < hi:
+            end = min(keyframes[lo:hi], key=lambda t: abs(t - target))
+        else:
+            before = keyframes[lo - 1] if lo > 0 and keyframes[lo - 1] > start + KEYFRAME_EPSILON else None
+            after = keyframes[hi] if hi < len(keyframes) else None
+            if before is None:
+                end = after
+            elif after is None or (start + min_duration) - before <= after - (start + max_duration):
+                end = before
+            else:
+                end = after
+
+        end = min(end, duration)
+        segments.append((start, end))
+        start = end
+    return segments
+
+
+def plan_scene_segments(duration, scene_cuts, min_duration, max_duration, rng=random):
+    """切点对齐镜头切换的随机规划
+
+    每段先随机一个目标时长，[min_duration, max_duration] 内有镜头切换点时取离目标最近的那个，
+    没有时直接用目标时长，片段时长始终在区间内。
+    """
+    if max_duration <= 0 or min_duration > max_duration:
+        raise ValueError("时长区间无效")
+    segments = []
+    start = 0.0
+    while start < duration:
+        length = rng.randint(min_duration, max_duration)
+        if length <= 0:
+            continue
+        target = start + length
+        lo = max(bisect_left(scene_cuts, start + min_duration - KEYFRAME_EPSILON),
+                 bisect_right(scene_cuts, start + KEYFRAME_EPSILON))
+        hi = bisect_right(scene_cuts, start + max_duration + KEYFRAME_EPSILON)
+        end = min(scene_cuts[lo:hi], key=lambda t: abs(t - target)) if target < duration and lo < hi else target
+        end = min(end, duration)
+        segments.append((start, end))
+        start = end
+    return segments
+
+
+def can_stream_copy(info):
+    """源文件的编码能否不转码直接封装成 mp4"""
+    return info.video_codec in COPY_VIDEO_CODECS and info.audio_codec in COPY_AUDIO_CODECS
+
+
+def plan_split(video_path, min_duration, max_duration, fast_copy=False, rng=random, snap_scenes=False):
+    """规划一个源文件的分割，返回 (片段列表, 编码参数)
+
+    fast_copy 为 True 且源编码可直接封装时，切点对齐关键帧并使用流复制；否则重新编码。
+    重新编码时 snap_scenes 为 True 则切点尽量落在镜头切换处（需要内容分析，结果有缓存）。
+    """
+    info = media_cache.get_media_info(video_path)
+    if fast_copy and can_stream_copy(info):
+        keyframes = media_cache.get_keyframes(video_path)
+        segments = plan_keyframe_segments(info.duration, keyframes, min_duration, max_duration, rng)
+        return segments, COPY_ARGS
+    if snap_scenes:
+        cuts = analysis.scene_cuts(media_cache.get_analysis(video_path))
+        return plan_scene_segments(info.duration, cuts, min_duration, max_duration, rng), ENCODE_ARGS
+    return plan_segments(info.duration, min_duration, max_duration, rng), ENCODE_ARGS
+
+
+def plan_rng(video_path, min_duration, max_duration, fast_copy=False, seed=0):
+    """按 (源文件内容, 参数, 种子) 确定的随机数生成器：重复运行得到相同切点，可以命中渲染缓存
+
+    seed 为 None 时每次都随机。
+    """
+    if seed is None:
+        return random.Random()
+    fingerprint = media_cache.get_fingerprint(video_path)
+    return random.Random(f"{fingerprint}|{min_duration}|{max_duration}|{bool(fast_copy)}|{seed}")
+
+
+def segment_output_path(video_path, output_folder, part):
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(output_folder, f"{base_name}_part{part}.mp4")
+
+
+def segment_outputs(video_path, output_folder, parts, renditions=None, previews=()):
+    """片段序号 parts 的输出路径：先是片段（多规格时按规格依次排列，每个规格在以规格名命名的子目录中），
+    然后是各片段的预览（见 previews.preview_paths）"""
+    if not renditions:
+        outputs = [segment_output_path(video_path, output_folder, part) for part in parts]
+    else:
+        outputs = [segment_output_path(video_path, os.path.join(output_folder, rendition.name), part)
+                   for rendition in renditions for part in parts]
+    for part in parts:
+        path = segment_output_path(video_path, output_folder, part)
+        outputs.extend(preview_specs.preview_paths(path, previews).values())
+    return outputs
+
+
+def segment_keys(video_path, segments, codec_args, renditions=None, previews=()):
+    """与 segment_outputs 一一对应的渲染缓存键"""
+    if not renditions:
+        keys = [render_cache.render_key([video_path], segment, ['segment', *codec_args]) for segment in segments]
+    else:
+        keys = [render_cache.render_key([video_path], segment,
+                                        ['segment', *codec_args, *rendition_specs.cache_args(rendition)])
+                for rendition in renditions for segment in segments]
+    for segment in segments:
+        keys.extend(render_cache.render_key([video_path], segment, preview_specs.cache_args(kind))
+                    for kind in previews)
+    return keys
+
+
+def _format_time(seconds):
+    return f"{seconds:.3f}"
+
+
+def _segment_args(cuts, first_part, chunk_length, pattern):
+    args = ['-f', 'segment', '-segment_format', 'mp4', '-reset_timestamps', '1',
+            '-segment_start_number', str(first_part)]
+    if cuts:
+        args.extend(['-segment_times', cuts])
+    else:
+        # 只有一个片段时不让复用器按默认的 2 秒切开
+        args.extend(['-segment_time', _format_time(chunk_length + 1)])
+    args.append(pattern)
+    return args
+
+
+def build_split_commands(video_path, segments, output_folder, codec_args=None, first_part=1, suffix='',
+                         renditions=None, previews=()):
+    """生成完成全部片段所需的 ffmpeg 命令；通常只有一条
+
+    suffix 加在输出文件名末尾（如 .part，之后再改名）。返回 [(command, 起始片段序号, 片段数), ...]
+    renditions 不为空时画面分给各规格重新编码（codec_args 须为重新编码参数），输出到各规格的子目录。
+    previews 为预览种类（见 previews 模块），在同一个命令里从解码后的画面生成每个片段的预览。
+    """
+    if codec_args is None:
+        codec_args = ENCODE_ARGS
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    # segment 复用器的文件名模板里 % 需要转义
+    name = base_name.replace('%', '%%') + '_part%d.mp4'
+    pattern = os.path.join(output_folder, name + suffix.replace('%', '%%'))
+    clip_pattern = preview_specs.preview_paths(os.path.join(output_folder, name), ['clip'])['clip'] \
+        + suffix.replace('%', '%%')
+    if renditions:
+        rendition_filters, labels = rendition_specs.fan_out('0:v:0', renditions)
+        outputs = [(labels[index], os.path.join(output_folder, rendition.name, name + suffix.replace('%', '%%')))
+                   for index, rendition in enumerate(renditions)]
+    else:
+        rendition_filters, outputs = [], [('0:v:0', pattern)]
+    copy = 'copy' in codec_args
+    # 多个编码输出时每个输出单独指定线程数
+    thread_args = rendition_specs.thread_args(len(outputs)) if (renditions or previews) and not copy else []
+    # 每个片段的预览图是单独的输出，片段很多时分成较小的块
+    per_pass = MAX_PREVIEW_CUTS_PER_PASS if previews else MAX_CUTS_PER_PASS
+
+    commands = []
+    for offset in range(0, len(segments), per_pass):
+        chunk = segments[offset:offset + per_pass]
+        chunk_start = chunk[0][0]
+        chunk_end = chunk[-1][1]
+        # 切点相对于本块起点
+        cuts = ','.join(_format_time(start - chunk_start) for start, _ in chunk[1:])
+
+        command = ['ffmpeg', '-y', '-loglevel', 'error']
+        if chunk_start > 0:
+            command.extend(['-ss', _format_time(chunk_start)])
+        command.extend(['-i', video_path, '-t', _format_time(chunk_end - chunk_start)])
+
+        filters, preview_args, clip_label = list(rendition_filters), [], None
+        if previews:
+            image_paths = []
+            for part in range(first_part + offset, first_part + offset + len(chunk)):
+                paths = preview_specs.preview_paths(segment_output_path(video_path, output_folder, part), previews)
+                image_paths.append({kind: path + suffix for kind, path in paths.items() if kind != 'clip'})
+            graph, preview_args, clip_label = preview_specs.build_graph(
+                '0:v:0', [(start - chunk_start, end - chunk_start) for start, end in chunk], image_paths,
+                clip='clip' in previews)
+            filters.extend(graph)
+        if filters:
+            command.extend(['-filter_complex', ';'.join(filters)])
+
+        for label, output_pattern in outputs:
+            if filters:
+                command.extend(['-map', label, '-map', '0:a:0?'])
+            command.extend([*codec_args, *thread_args])
+            if cuts and not copy:
+                command.extend(['-force_key_frames', cuts])
+            command.extend(_segment_args(cuts, first_part + offset, chunk_end - chunk_start, output_pattern))
+        command.extend(preview_args)
+        if clip_label is not None:
+            command.extend(['-map', clip_label, '-map', '0:a:0?', *preview_specs.CLIP_ARGS])
+            if cuts:
+                command.extend(['-force_key_frames', cuts])
+            command.extend(_segment_args(cuts, first_part + offset, chunk_end - chunk_start, clip_pattern))
+        commands.append((command, first_part + offset, len(chunk)))
+    return commands
+
+
+def run_ffmpeg(command, kind=ENCODE, progress=None):
+    try:
+        get_scheduler().run(command, kind=kind, check=True, progress=progress)
+    except subprocess.CalledProcessError as e:
+        error_message = e.stderr.decode('utf-8', 'replace').strip()
+        raise Exception(f"FFmpeg 错误: {error_message}")
+
+
+def split_video(video_path, segments, output_folder, codec_args=None, progress=None, cache=None, renditions=None,
+                previews=()):
+    """一次解码输出全部片段，文件名为 <原文件名>_partN.mp4
+
+    progress(已处理秒数, 速度, fps) 在 ffmpeg 运行中实时回调，秒数从第一个片段的起点算起。
+    片段先写成 .part，ffmpeg 成功后再改名，中断时不会留下看似完整的片段。
+    传入 cache（render_cache.RenderCache）时，一个 ffmpeg 进程负责的片段全部命中缓存就跳过该进程，
+    否则照常渲染并把结果存入缓存。
+    renditions 不为空时每个片段按各规格输出到 output_folder/<规格名>/，返回的路径按规格依次排列。
+    previews 不为空时同一个 ffmpeg 同时生成各片段的预览，返回的路径在片段之后（见 segment_outputs）。
+    """
+    if codec_args is None:
+        codec_args = ENCODE_ARGS
+    if renditions and 'copy' in codec_args:
+        # 缩放和裁切需要重新编码；切点仍是规划时对齐的关键帧
+        codec_args = ENCODE_ARGS
+    if progress is None:
+        progress = _ignore
+    # 生成预览要解码，即使片段本身是流复制
+    kind = COPY if 'copy' in codec_args and not previews else ENCODE
+    for rendition in renditions or ():
+        os.makedirs(os.path.join(output_folder, rendition.name), exist_ok=True)
+    if previews:
+        os.makedirs(os.path.join(output_folder, preview_specs.PREVIEW_DIR), exist_ok=True)
+    for command, first, count in build_split_commands(video_path, segments, output_folder, codec_args,
+                                                      suffix=journal.PART_SUFFIX, renditions=renditions,
+                                                      previews=previews):
+        chunk = segments[first - 1:first - 1 + count]
+        offset = chunk[0][0] - segments[0][0]
+        outputs = segment_outputs(video_path, output_folder, range(first, first + count), renditions, previews)
+        keys = segment_keys(video_path, chunk, codec_args, renditions, previews) if cache is not None else None
+        if cache is not None:
+            with tracing.span('write', file=video_path, segments=count, cached=True):
+                hit = cache.fetch_all(keys, outputs)
+        if cache is None or not hit:
+            for output in outputs:
+                render_cache.remove_quietly(output)
+            with tracing.span('encode', file=video_path, mode=kind, segments=count,
+                              seconds=round(chunk[-1][1] - chunk[0][0], 3)):
+                run_ffmpeg(command, kind,
+                           progress=lambda position, speed, fps: progress(
+                               offset + position if position is not None else None, speed, fps))
+            for output in outputs:
+                journal.commit_part(output)
+            get_scheduler().report_media_seconds(chunk[-1][1] - chunk[0][0])
+            if cache is not None:
+                with tracing.span('write', file=video_path, segments=count, cached=False):
+                    cache.store_all(keys, outputs)
+        progress(chunk[-1][1] - segments[0][0], None, None)
+    return segment_outputs(video_path, output_folder, range(1, len(segments) + 1), renditions, previews)
+
+
+def _ignore(*args):
+    pass
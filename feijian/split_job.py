@@ -0,0 +1,191 @@
+"""分割任务（不依赖 Qt，界面和命令行共用）"""
+import os
+
+from feijian import async_engine, autotune, journal, library, media_cache, render_cache, split_engine, tracing
+from feijian.progress import JobProgress
+from feijian.scheduler import get_scheduler
+
+# 界面创建的输出目录名前缀，后接时间戳
+OUTPUT_PREFIX = "非丨本次分割结果_"
+
+
+def _ignore(*args):
+    pass
+
+
+class SplitJob:
+    """把文件夹中（含子文件夹，见 library.scan）的每个视频（或单个视频）按随机时长切成 *_partN.mp4
+
+    子文件夹中的视频输出到导出目录下相同的相对路径，不同文件夹里的同名文件不会互相覆盖。
+
+    progress(百分比) 和 status(progress.ProgressInfo) 在工作线程中回调，进度按各文件的时长加权。
+    切点由 (源文件内容, 参数, seed) 决定，重复运行结果相同，渲染结果可从缓存复用。
+    每个源文件的切点和完成状态记入导出目录的任务日志（见 journal），resume 为 True 时跳过已完成的文件。
+    snap_scenes 为 True 时重新编码的切点尽量对齐镜头切换（见 analysis，每个源文件首次需要多解码一遍）。
+    传入 coordinator（distributed.Coordinator）时规划仍在本机进行，分割交给工作节点执行。
+    renditions（renditions.Rendition 列表）不为空时每个源文件只解码一次，片段按各规格输出到导出目录下的规格子目录。
+    previews（预览种类，见 previews 模块）不为空时在同一次解码中生成每个片段的缩略图、拼图和预览短片。
+    """
+
+    def __init__(self, path, export_path, min_duration, max_duration, fast_copy=False, autotune=True,
+                 progress=None, seed=0, use_cache=True, status=None, resume=False, snap_scenes=False,
+                 coordinator=None, renditions=None, previews=()):
+        self.path = path
+        self.export_path = export_path
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.fast_copy = fast_copy  # 快速分割：切点对齐关键帧，流复制不重新编码
+        self.autotune = autotune
+        self.progress = progress or _ignore
+        self.status = status or _ignore
+        self.seed = seed
+        self.use_cache = use_cache
+        self.resume = resume
+        self.snap_scenes = snap_scenes
+        self.coordinator = coordinator
+        self.renditions = renditions or []
+        self.previews = tuple(previews or ())
+        self.journal = None
+
+    def journal_params(self):
+        """决定规划结果的参数，日志中参数相同的任务才能恢复"""
+        params = {'input': os.path.abspath(self.path), 'min': self.min_duration, 'max': self.max_duration,
+                  'fast_copy': bool(self.fast_copy), 'seed': self.seed, 'snap_scenes': bool(self.snap_scenes)}
+        if self.renditions:
+            params['renditions'] = [list(rendition) for rendition in self.renditions]
+        if self.previews:
+            params['previews'] = list(self.previews)
+        return params
+
+    def run(self):
+        """执行分割，返回输出目录"""
+        self.journal = journal.open_job(self.export_path, 'split', self.journal_params(), self.resume)
+        # 运行期间按吞吐自动调节 ffmpeg 并发数
+        preset = 'copy' if self.fast_copy and not (self.renditions or self.previews) else f'libx264-{split_engine.ENCODE_PRESET}'
+        try:
+            with autotune.tuned(preset, enabled=self.autotune):
+                # 如果是文件夹，遍历文件夹中的视频文件
+                if os.path.isdir(self.path):
+                    output_folder = self.split_videos_in_folder()
+                # 如果是单个文件，直接处理该文件
+                else:
+                    output_folder = self.split_single_video(self.path)
+            self.journal.finish()
+        finally:
+            self.journal.close()
+        return output_folder
+
+    def split_videos_in_folder(self):
+        output_folder = self.export_path
+
+        # 所有 ffmpeg 由全局调度器统一限流，这里只负责按文件提交；分布式模式下由协调端分配给工作节点
+        scheduler = self.coordinator or get_scheduler()
+
+        # 边扫描边探测，先取得各文件时长作为进度权重（有缓存）；探测失败的文件在分割时报错
+        with tracing.span('probe', folder=self.path):
+            video_paths, results = async_engine.scan_probe(library.scan(
+                self.path, exclude=[self.export_path], skip_dir=lambda name: name.startswith(OUTPUT_PREFIX)))
+            durations = [0.0 if isinstance(result, Exception) else result.duration for result in results]
+
+        tracker = JobProgress(sum(durations), self.progress, self.status)
+        futures = []
+        for video_path, duration in zip(video_paths, durations):
+            relative = os.path.relpath(os.path.dirname(video_path), self.path)
+            futures.append(scheduler.submit(self.split_single_video, video_path,
+                                            os.path.normpath(os.path.join(output_folder, relative)),
+                                            tracker.unit(duration)))
+
+        # 单个文件失败不影响其它文件，全部结束后汇总报错；失败的文件没有完成记录，恢复时会重做
+        errors = []
+        for video_path, future in zip(video_paths, futures):
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(f"{os.path.basename(video_path)}: {e}")
+                if self.journal is not None:
+                    self.journal.failed(os.path.abspath(video_path), str(e))
+        tracker.close()
+        if errors:
+            raise RuntimeError(f"{len(errors)}/{len(futures)} 个文件分割失败：" + "；".join(errors))
+
+        return output_folder
+
+    def split_single_video(self, video_path, output_folder=None, unit=None):
+        """unit 为文件夹任务中本文件的进度单元，单独处理一个文件时为 None"""
+        if output_folder is None:
+            output_folder = self.export_path
+
+        item = os.path.abspath(video_path)
+        tracker = None
+        try:
+            planned = self.journal.planned(item) if self.journal is not None else None
+            if planned is not None and self.journal.is_done(item):
+                # 恢复模式下已完成的文件
+                if unit is None:
+                    self.progress(100)
+                return output_folder
+            if planned is not None:
+                segments = [tuple(segment) for segment in planned['segments']]
+                codec_args = planned['codec_args']
+            else:
+                if self.snap_scenes and not self.fast_copy:
+                    with tracing.span('analyze', file=video_path):
+                        media_cache.get_analysis(video_path)
+                with tracing.span('plan', file=video_path):
+                    rng = split_engine.plan_rng(video_path, self.min_duration, self.max_duration, self.fast_copy,
+                                                self.seed)
+                    segments, codec_args = split_engine.plan_split(video_path, self.min_duration,
+                                                                   self.max_duration, self.fast_copy, rng,
+                                                                   snap_scenes=self.snap_scenes)
+                if self.renditions:
+                    # 多规格输出需要缩放，不能流复制；切点仍对齐关键帧
+                    codec_args = split_engine.ENCODE_ARGS
+                if self.journal is not None:
+                    self.journal.plan(item, segments=segments, codec_args=codec_args)
+            if unit is None:
+                length = segments[-1][1] - segments[0][0] if segments else 0.0
+                tracker = JobProgress(length, self.progress, self.status)
+                unit = tracker.unit(length)
+
+            os.makedirs(output_folder, exist_ok=True)
+            cache = render_cache.get_cache() if self.use_cache else None
+            if self.coordinator is not None:
+                self.split_remote(video_path, segments, output_folder, codec_args, unit, cache)
+            else:
+                # 所有片段在一次解码中完成
+                split_engine.split_video(video_path, segments, output_folder, codec_args, progress=unit.update,
+                                         cache=cache, renditions=self.renditions, previews=self.previews)
+            if self.journal is not None:
+                self.journal.done(item)
+        except Exception:
+            if unit is not None:
+                unit.fail()
+            raise
+        finally:
+            # 失败的文件也按完成计入进度
+            if unit is not None:
+                unit.finish()
+        if tracker is not None:
+            tracker.close()
+
+        return output_folder
+
+    def split_remote(self, video_path, segments, output_folder, codec_args, unit, cache=None):
+        """交给工作节点分割；渲染缓存在本机检查和保存，全部命中时不发任务"""
+        outputs = split_engine.segment_outputs(video_path, output_folder, range(1, len(segments) + 1),
+                                               self.renditions, self.previews)
+        keys = split_engine.segment_keys(video_path, segments, codec_args, self.renditions, self.previews)
+        if cache is not None:
+            with tracing.span('write', file=video_path, segments=len(segments), cached=True):
+                if cache.fetch_all(keys, outputs):
+                    return
+        payload = {'source': os.path.abspath(video_path), 'segments': segments, 'codec_args': codec_args,
+                   'output_folder': os.path.abspath(output_folder),
+                   'renditions': [list(rendition) for rendition in self.renditions],
+                   'previews': list(self.previews)}
+        with tracing.span('encode', file=video_path, segments=len(segments), remote=True):
+            self.coordinator.call('split', payload, inputs=[video_path], output_folder=output_folder,
+                                  progress=unit.update)
+        if cache is not None:
+            with tracing.span('write', file=video_path, segments=len(segments), cached=False):
+                cache.store_all(keys, outputs)
@@ -0,0 +1,60 @@
+from feijian import analysis
+from feijian.analysis import Analysis
+
+# ffmpeg -loglevel info 的日志片段（输入 start 为 1.5 秒）
+LOG = b"""Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'in.mp4':
+  Duration: 00:01:00.50, start: 1.500000, bitrate: 1000 kb/s
+[Parsed_metadata_2 @ 0x1] frame:0    pts:3      pts_time:4.5
+[Parsed_metadata_2 @ 0x1] lavfi.scene_score=0.812345
+[Parsed_metadata_2 @ 0x1] frame:1    pts:9      pts_time:11.25
+[Parsed_metadata_2 @ 0x1] lavfi.scene_score=0.15
+[blackdetect @ 0x2] black_start:1.5 black_end:3.5 black_duration:2
+[silencedetect @ 0x3] silence_start: 1.2
+[silencedetect @ 0x3] silence_end: 6.5 | silence_duration: 5.3
+[silencedetect @ 0x3] silence_start: 51.5
+"""
+
+
+def test_parse_analysis_output_is_relative_to_the_file_start():
+    result = analysis.parse_analysis_output(LOG)
+    assert result.duration == 60.5
+    assert result.scenes == [(3.0, 0.812), (9.75, 0.15)]
+    assert result.black == [(0.0, 2.0)]
+    # 静音起点不早于 0；没有结束的静音持续到结尾
+    assert result.silence == [(0.0, 5.0), (50.0, 60.5)]
+
+
+def test_parse_analysis_output_without_streams():
+    assert analysis.parse_analysis_output(b'') == Analysis(0.0, [], [], [])
+
+
+def test_pack_round_trip():
+    result = analysis.parse_analysis_output(LOG)
+    assert analysis.unpack_analysis(analysis.pack_analysis(result)) == result
+
+
+def test_scene_cuts_filters_by_score():
+    result = Analysis(10.0, [(1.0, 0.2), (4.0, 0.3), (7.5, 0.9)], [], [])
+    assert analysis.scene_cuts(result) == [4.0, 7.5]
+    assert analysis.scene_cuts(result, threshold=0.1) == [1.0, 4.0, 7.5]
+
+
+def test_is_dead():
+    black = Analysis(10.0, [], [(0.0, 9.5)], [])
+    silent = Analysis(10.0, [], [], [(0.0, 10.0)])
+    assert analysis.is_dead(black)
+    assert analysis.is_dead(silent)
+    # 静音导出时不看音频
+    assert not analysis.is_dead(silent, mute=True)
+    assert not analysis.is_dead(Analysis(10.0, [], [(0.0, 5.0)], [(5.0, 10.0)]))
+    # 以探测到的时长为准
+    assert not analysis.is_dead(black, duration=20.0)
+    assert not analysis.is_dead(Analysis(0.0, [], [], []))
+
+
+def test_build_analysis_command_decodes_once():
+    command = analysis.build_analysis_command('in.mp4')
+    assert command.count('-i') == 1
+    assert command[-3:] == ['-f', 'null', '-']
+    assert 'blackdetect' in command[command.index('-vf') + 1]
+    assert 'silencedetect' in command[command.index('-af') + 1]
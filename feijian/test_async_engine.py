@@ -0,0 +1,94 @@
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+
+from feijian import async_engine
+from feijian.async_engine import AsyncProcessEngine
+from feijian.scheduler import COPY
+
+
+def test_probe_all_keeps_input_order(tmp_path, fake_media):
+    paths = [fake_media(tmp_path / f'{index}.mp4', index + 1) for index in range(20)]
+    infos = async_engine.probe_all(paths, max_probes=4)
+    assert [info.duration for info in infos] == [float(index + 1) for index in range(20)]
+
+
+def test_probe_all_raises_after_probing_everything(tmp_path, fake_media):
+    good = fake_media(tmp_path / 'a.mp4', 5)
+    broken = fake_media(tmp_path / 'b.mp4', None)
+    with pytest.raises(RuntimeError, match='ffprobe'):
+        async_engine.probe_all([broken, good])
+    assert async_engine.probe_durations([broken, good]) == [None, 5.0]
+
+
+def test_probe_reads_the_cache(tmp_path, fake_media, monkeypatch):
+    path = fake_media(tmp_path / 'a.mp4', 5)
+    async_engine.probe_all([path])
+    # 找不到 ffprobe 时仍能从缓存取得结果
+    monkeypatch.setenv('PATH', '')
+    assert async_engine.probe_durations([path]) == [5.0]
+
+
+def test_scan_probe_accepts_a_generator(tmp_path, fake_media):
+    paths = [fake_media(tmp_path / f'{name}.mp4', 3) for name in 'abc']
+    broken = fake_media(tmp_path / 'x.mp4', None)
+    found, results = async_engine.scan_probe(iter(paths + [broken]), max_probes=2)
+    assert found == paths + [broken]
+    assert [result.duration for result in results[:3]] == [3.0] * 3
+    assert isinstance(results[3], Exception)
+
+
+def test_iter_probe_yields_in_scan_order(tmp_path, fake_media):
+    paths = [fake_media(tmp_path / f'{index:02d}.mp4', 20 - index) for index in range(12)]
+    assert [(path, info.duration) for path, info in async_engine.iter_probe(iter(paths), max_probes=4)] == \
+        [(path, float(20 - index)) for index, path in enumerate(paths)]
+
+
+def test_iter_probe_stops_scanning_when_closed_early(tmp_path, fake_media):
+    path = fake_media(tmp_path / 'a.mp4', 3)
+    scanned = []
+
+    def scan():
+        for index in range(1000):
+            scanned.append(index)
+            yield path
+
+    probes = async_engine.iter_probe(scan(), max_probes=2, window=4)
+    next(probes)
+    probes.close()
+    # 扫描最多领先消费者 window 个文件
+    assert len(scanned) <= 8
+
+
+def test_cancel_kills_running_processes():
+    engine = AsyncProcessEngine()
+    outcome = []
+
+    def run():
+        try:
+            engine.run_sync(engine.run([sys.executable, '-c', 'import time; time.sleep(30)'], kind=COPY))
+        except asyncio.CancelledError:
+            outcome.append('cancelled')
+
+    thread = threading.Thread(target=run)
+    started = time.monotonic()
+    thread.start()
+    time.sleep(0.3)
+    engine.cancel()
+    thread.join(10)
+    assert outcome == ['cancelled']
+    assert time.monotonic() - started < 10
+    # 取消之后不再启动新的子进程
+    with pytest.raises(asyncio.CancelledError):
+        engine.run_sync(engine.run([sys.executable, '-c', 'pass'], kind=COPY))
+
+
+def test_run_check_raises():
+    engine = AsyncProcessEngine()
+    result = engine.run_sync(engine.run([sys.executable, '-c', 'print("ok")'], kind=COPY))
+    assert (result.returncode, result.stdout.strip()) == (0, b'ok')
+    with pytest.raises(Exception):
+        engine.run_sync(engine.run([sys.executable, '-c', 'import sys; sys.exit(2)'], kind=COPY, check=True))
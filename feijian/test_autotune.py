@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from feijian import autotune
+from feijian.autotune import ConcurrencyTuner
+from feijian.scheduler import FFmpegScheduler
+
+
+def _tuner(tmp_path, monkeypatch, throughputs, load=0.5, max_jobs=2):
+    scheduler = FFmpegScheduler(max_jobs=max_jobs, cores=8)
+    tuner = ConcurrencyTuner('libx264-test', scheduler, state_path=str(tmp_path / 'autotune.json'))
+    measurements = iter(throughputs)
+    monkeypatch.setattr(tuner, '_measure', lambda: next(measurements, None))
+    monkeypatch.setattr(autotune, '_load_per_core', lambda: load)
+    return tuner, scheduler
+
+
+def test_hill_climb_turns_back_when_throughput_drops(tmp_path, monkeypatch):
+    tuner, scheduler = _tuner(tmp_path, monkeypatch, [10.0, 12.0, 11.0])
+    tuner._loop()
+    assert [entry['max_jobs'] for entry in tuner.history] == [2, 3, 4]
+    assert scheduler.max_jobs == 3
+    assert (tuner.best_level, tuner.best_throughput) == (3, 12.0)
+
+
+def test_small_gains_count_as_no_gain(tmp_path, monkeypatch):
+    # 提升不到 MIN_GAIN 视为测量噪声，反向调节
+    tuner, scheduler = _tuner(tmp_path, monkeypatch, [10.0, 10.2])
+    tuner._loop()
+    assert scheduler.max_jobs == 2
+
+
+def test_high_load_stops_adding_jobs(tmp_path, monkeypatch):
+    tuner, scheduler = _tuner(tmp_path, monkeypatch, [10.0], load=autotune.MAX_LOAD_PER_CORE + 1)
+    tuner._loop()
+    assert scheduler.max_jobs == 1
+
+
+def test_level_stays_within_bounds(tmp_path, monkeypatch):
+    tuner, scheduler = _tuner(tmp_path, monkeypatch, [10.0, 9.0], max_jobs=1)
+    tuner._loop()
+    assert 1 <= scheduler.max_jobs <= scheduler.cores
+
+
+def test_best_level_is_saved_and_reused(tmp_path, monkeypatch):
+    tuner, scheduler = _tuner(tmp_path, monkeypatch, [10.0, 12.0, 11.0])
+    tuner.start()
+    tuner.stop()
+    saved = json.loads((tmp_path / 'autotune.json').read_text(encoding='utf-8'))
+    assert saved[tuner.key]['max_jobs'] == 3
+    assert scheduler.max_jobs == 3
+
+    # 下次从保存的并发数起步
+    fresh = FFmpegScheduler(max_jobs=1, cores=8)
+    next_tuner = ConcurrencyTuner('libx264-test', fresh, state_path=str(tmp_path / 'autotune.json'))
+    monkeypatch.setattr(next_tuner, '_measure', lambda: None)
+    next_tuner.start()
+    assert fresh.max_jobs == 3
+    next_tuner.stop()
+
+
+def test_tuned_allows_only_one_active_tuner(monkeypatch):
+    started = []
+    monkeypatch.setattr(ConcurrencyTuner, 'start', lambda self: started.append(self) or self)
+    monkeypatch.setattr(ConcurrencyTuner, 'stop', lambda self: None)
+    with autotune.tuned('copy') as outer:
+        with autotune.tuned('copy') as inner:
+            assert inner is None
+    assert started == [outer]
+    with autotune.tuned('copy', enabled=False) as disabled:
+        assert disabled is None
+
+
+@pytest.mark.parametrize('preset', ['copy', 'libx264-ultrafast'])
+def test_machine_key_includes_the_preset(preset):
+    assert autotune.machine_key(preset).endswith(f'|{preset}')
@@ -0,0 +1,114 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from feijian import cli, montage_job, split_engine
+
+
+def _events(capsys):
+    # stdout 只能有事件：每一行都必须是 JSON
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+@pytest.fixture
+def no_ffmpeg_split(monkeypatch):
+    """分割不调用 ffmpeg，只记录源文件"""
+    calls = []
+    monkeypatch.setattr(split_engine, 'split_video', lambda video_path, *args, **kwargs: calls.append(video_path))
+    return calls
+
+
+def test_load_manifest_filters_by_type(tmp_path):
+    path = tmp_path / 'jobs.json'
+    path.write_text(json.dumps({'jobs': [{'type': 'split', 'input': 'a'}, {'type': 'montage', 'input': 'b'},
+                                         {'input': 'c'}]}), encoding='utf-8')
+    assert [job['input'] for job in cli.load_manifest(str(path), 'split')] == ['a', 'c']
+    path.write_text(json.dumps([{'type': 'montage', 'input': 'b'}]), encoding='utf-8')
+    assert [job['input'] for job in cli.load_manifest(str(path), 'montage')] == ['b']
+
+
+def test_jobs_from_args():
+    args = cli.build_parser().parse_args(['cut-montage', 'in', 'out', '--duration', '30', '--min', '2', '--max', '4',
+                                          '--order', 'sequential', '--renditions', '720p,vertical'])
+    [job] = cli.jobs_from_args(args)
+    assert job['input'] == 'in' and job['output'] == 'out'
+    assert (job['duration'], job['min'], job['max'], job['order']) == (30.0, 2, 4, 'sequential')
+    assert job['renditions'] == ['720p', 'vertical']
+    assert job['seed'] == 0
+
+
+def test_jobs_from_args_needs_paths_or_manifest():
+    with pytest.raises(SystemExit):
+        cli.jobs_from_args(cli.build_parser().parse_args(['split', '--min', '3', '--max', '5']))
+
+
+def test_build_job_validates_required_fields(tmp_path):
+    with pytest.raises(ValueError):
+        cli.build_job('split', 0, {'input': 'in', 'output': str(tmp_path)}, autotune=False)
+    with pytest.raises(ValueError):
+        cli.build_job('montage', 0, {'input': 'in', 'output': str(tmp_path)}, autotune=False)
+    job = cli.build_job('montage', 0, {'input': 'in', 'output': str(tmp_path), 'duration': 30,
+                                       'order': 'sequential'}, autotune=False)
+    assert job.order == "顺序合成"
+
+
+def test_split_command_emits_json_events(tmp_path, fake_media, no_ffmpeg_split, capsys):
+    video = fake_media(tmp_path / 'in' / 'a.mp4', 10)
+    status = cli.main(['split', str(tmp_path / 'in'), str(tmp_path / 'out'), '--min', '3', '--max', '5',
+                       '--no-autotune', '--no-render-cache'])
+    assert status == 0
+    assert no_ffmpeg_split == [video]
+    events = _events(capsys)
+    assert [event['event'] for event in events if event['event'] != 'progress'] == \
+        ['started', 'completed', 'summary']
+    assert events[-1]['failed'] == 0
+
+
+def test_failed_job_is_reported_and_the_batch_continues(tmp_path, fake_media, no_ffmpeg_split, capsys):
+    fake_media(tmp_path / 'good' / 'a.mp4', 10)
+    manifest = tmp_path / 'jobs.json'
+    manifest.write_text(json.dumps([
+        {'input': str(tmp_path / 'missing'), 'output': str(tmp_path / 'out1')},
+        {'input': str(tmp_path / 'good'), 'output': str(tmp_path / 'out2'), 'min': 3, 'max': 5},
+    ]), encoding='utf-8')
+    status = cli.main(['split', '--manifest', str(manifest), '--no-autotune', '--no-render-cache'])
+    assert status == 1
+    events = [event for event in _events(capsys) if event['event'] != 'progress']
+    assert [event['event'] for event in events] == ['started', 'failed', 'started', 'completed', 'summary']
+    assert events[-1]['failed'] == 1
+
+
+def test_failed_montage_groups_end_in_a_failed_event(tmp_path, fake_media, monkeypatch, capsys):
+    for name in 'ab':
+        fake_media(tmp_path / 'in' / f'{name}.mp4', 10)
+
+    def render_files(*args, **kwargs):
+        raise subprocess.CalledProcessError(1, ['ffmpeg'], stderr=b'boom')
+    monkeypatch.setattr(montage_job, 'render_files', render_files)
+    status = cli.main(['montage', str(tmp_path / 'in'), str(tmp_path / 'out'), '--duration', '10',
+                       '--no-autotune', '--no-render-cache'])
+    assert status == 1
+    events = [event for event in _events(capsys) if event['event'] != 'progress']
+    assert [event['event'] for event in events] == ['started', 'error', 'error', 'failed', 'summary']
+    assert '2/2 个合成视频失败' in events[-2]['message']
+
+
+def test_probe_command(tmp_path, fake_media, capsys):
+    fake_media(tmp_path / 'in' / 'a.mp4', 10)
+    fake_media(tmp_path / 'in' / 'sub' / 'b.mp4', None)
+    assert cli.main(['probe', str(tmp_path / 'in')]) == 1
+    events = {event['event']: event for event in _events(capsys)}
+    assert events['probe']['duration'] == 10.0
+    assert events['error']['input'].endswith('b.mp4')
+    assert (events['summary']['files'], events['summary']['failed']) == (2, 1)
+
+
+def test_core_modules_do_not_import_qt():
+    script = ("import sys, feijian.cli, feijian.split_job, feijian.montage_job, feijian.cut_montage_job; "
+              "print('PyQt5' in sys.modules)")
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    assert output.strip() == 'False'
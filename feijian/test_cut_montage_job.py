@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from feijian import cut_montage_job, scheduler
+from feijian.cut_montage_job import CutMontageJob
+from feijian.media_cache import MediaInfo
+from feijian.montage_job import SEQUENTIAL, SHUFFLED, build_encode_command
+
+
+def _info(audio_codec='aac', start_time=0.0):
+    return MediaInfo(30.0, 'h264', 1280, 720, 30.0, 'yuv420p', '1/15360', audio_codec, 44100, 2, 'stereo',
+                     start_time)
+
+
+def test_copy_command_offsets_ranges_by_the_start_time(tmp_path):
+    list_path = tmp_path / 'list.txt'
+    clips = [("/src/it's.mp4", 0.0, 4.0), ('/src/b.mp4', 6.5, 9.0)]
+    command = cut_montage_job._copy_command(clips, [_info(), _info(start_time=1.4)], str(list_path), 'out.mp4',
+                                            mute=True)
+    assert list_path.read_text(encoding='utf-8') == (
+        "file '/src/it'\\''s.mp4'\ninpoint 0.000\noutpoint 4.000\n"
+        "file '/src/b.mp4'\ninpoint 7.900\noutpoint 10.400\n")
+    assert command[command.index('-c') + 1] == 'copy'
+    assert '-an' in command and command[-1] == 'out.mp4'
+
+
+def test_encode_command_seeks_each_range():
+    clips = [('/src/a.mp4', 2.0, 5.5), ('/src/b.mp4', 0.0, 3.0)]
+    command = build_encode_command(clips, [_info(), _info(audio_codec=None)], ['out.mp4'])
+    assert command.count('-i') == 2
+    first = command.index('-ss')
+    assert command[first:first + 5] == ['-ss', '2.000', '-t', '3.500', '-i']
+    graph = command[command.index('-filter_complex') + 1]
+    # 没有音轨的区间补等长的静音
+    assert 'anullsrc=r=44100:cl=stereo,atrim=duration=3.000[a1]' in graph
+    assert 'concat=n=2:v=1:a=1[v][a]' in graph
+
+
+class _RecordingScheduler:
+    max_jobs = 2
+
+    def __init__(self):
+        self.commands = []
+
+    def run(self, command, kind=None, check=False, progress=None):
+        self.commands.append(command)
+        with open(command[-1], 'wb') as f:
+            f.write(b'montage')
+
+
+@pytest.mark.parametrize('fast_copy, copied', [(True, True), (False, False)])
+def test_render_ranges_copies_only_when_allowed(tmp_path, fake_media, monkeypatch, fast_copy, copied):
+    recording = _RecordingScheduler()
+    monkeypatch.setattr(cut_montage_job, 'get_scheduler', lambda: recording)
+    encoded = []
+    monkeypatch.setattr(cut_montage_job, 'run_encode', lambda clips, output, *args: encoded.append(clips))
+    clips = [(fake_media(tmp_path / 'a.mp4', 10), 0.0, 4.0), (fake_media(tmp_path / 'b.mp4', 10), 2.0, 6.0)]
+    output = str(tmp_path / 'out.mp4')
+    cut_montage_job.render_ranges(clips, output, fast_copy=fast_copy)
+    assert (len(recording.commands), len(encoded)) == ((1, 0) if copied else (0, 1))
+    if copied:
+        assert os.path.exists(output) and not os.path.exists(output + '.part')
+
+
+@pytest.fixture
+def cut_groups(monkeypatch):
+    """不调用 ffmpeg，记录每组的区间"""
+    groups = []
+    monkeypatch.setattr(scheduler, '_scheduler', scheduler.FFmpegScheduler(max_jobs=2, cores=2))
+
+    def render_ranges(clips, output_video_path, *args):
+        groups.append(clips)
+        with open(output_video_path, 'wb') as f:
+            f.write(b'montage')
+    monkeypatch.setattr(cut_montage_job, 'render_ranges', render_ranges)
+    return groups
+
+
+@pytest.mark.parametrize('order', [SEQUENTIAL, SHUFFLED])
+def test_groups_are_ranges_of_the_sources(tmp_path, fake_media, cut_groups, order):
+    sources = [fake_media(tmp_path / 'in' / f'{name}.mp4', 30) for name in 'abc']
+    job = CutMontageJob(str(tmp_path / 'in'), str(tmp_path / 'out'), order, 20, 3, 6, autotune=False,
+                        use_cache=False)
+    job.run()
+    assert cut_groups
+    ranges = [clip for group in cut_groups for clip in group]
+    assert {os.path.abspath(source) for source in sources} >= {video_file for video_file, _, _ in ranges}
+    for group in cut_groups:
+        assert 18 <= sum(end - start for _, start, end in group) <= 22
+    for video_file, start, end in ranges:
+        assert 0 <= start < end <= 30
+
+    # 同样的参数重复运行得到相同的区间和分组
+    first = sorted(map(str, cut_groups))
+    cut_groups.clear()
+    CutMontageJob(str(tmp_path / 'in'), str(tmp_path / 'out2'), order, 20, 3, 6, autotune=False,
+                  use_cache=False).run()
+    assert sorted(map(str, cut_groups)) == first
+
+
+def test_cache_args_include_the_ranges():
+    job = CutMontageJob('in', 'out', SEQUENTIAL, 20, 3, 6)
+    group = [['/src/a.mp4', 0.0, 4.0004], ['/src/b.mp4', 2.0, 6.0]]
+    sources, args = job.cache_args(group)
+    assert sources == ['/src/a.mp4', '/src/b.mp4']
+    assert args[2] == [[0.0, 4.0], [2.0, 6.0]]
+    kind, payload, inputs = job.remote_task(group, 'out/x.mp4')
+    assert kind == 'cut' and inputs == ['/src/a.mp4', '/src/b.mp4']
@@ -0,0 +1,128 @@
+import io
+import logging
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+from feijian import distributed
+from feijian.distributed import Coordinator, Worker
+
+
+def test_message_round_trip_with_files(tmp_path):
+    first, second = tmp_path / 'a.mp4', tmp_path / 'b.mp4'
+    first.write_bytes(b'first file')
+    second.write_bytes(b'')
+    stream = io.BytesIO()
+    distributed.send_message(stream, {'type': 'task', 'id': 1, 'payload': {'名称': '素材'}}, [str(first), str(second)])
+    distributed.send_message(stream, {'type': 'shutdown'})
+    stream.seek(0)
+
+    received = tmp_path / 'received'
+    received.mkdir()
+    message = distributed.read_message(stream, lambda m, index, name: str(received / f'{index}-{name}'))
+    assert message == {'type': 'task', 'id': 1, 'payload': {'名称': '素材'},
+                       'files': [str(received / '0-a.mp4'), str(received / '1-b.mp4')]}
+    assert [Path(path).read_bytes() for path in message['files']] == [b'first file', b'']
+    assert distributed.read_message(stream) == {'type': 'shutdown', 'files': []}
+    assert distributed.read_message(stream) is None
+
+
+def test_read_message_detects_truncated_files(tmp_path):
+    source = tmp_path / 'a.mp4'
+    source.write_bytes(b'0123456789')
+    stream = io.BytesIO()
+    distributed.send_message(stream, {'type': 'result'}, [str(source)])
+    truncated = io.BytesIO(stream.getvalue()[:-4])
+    with pytest.raises(ConnectionError):
+        distributed.read_message(truncated, lambda m, index, name: str(tmp_path / 'copy.mp4'))
+
+
+def test_read_message_keeps_only_the_base_name(tmp_path):
+    stream = io.BytesIO(b'{"type": "result", "blobs": [{"name": "../../evil.mp4", "size": 0}]}\n')
+    names = []
+    distributed.read_message(stream, lambda m, index, name: names.append(name) or str(tmp_path / name))
+    assert names == ['evil.mp4']
+
+
+@pytest.mark.parametrize('text, address', [('7000', ('0.0.0.0', 7000)), ('10.0.0.2:7000', ('10.0.0.2', 7000)),
+                                           (':7000', ('0.0.0.0', 7000))])
+def test_parse_address(text, address):
+    assert distributed.parse_address(text) == address
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    """本进程内的协调端和一个不共享存储的工作节点，任务由 handlers 中的函数执行"""
+    handlers = {}
+    monkeypatch.setattr(distributed, 'TASK_HANDLERS', handlers)
+    events = []
+    coordinator = Coordinator(('127.0.0.1', 0), on_event=lambda event, **fields: events.append(event))
+    worker = Worker(coordinator.address, capacity=2, name='w1', shared_storage=False)
+    thread = threading.Thread(target=worker.serve_forever, kwargs={'exit_when_done': True}, daemon=True)
+    thread.start()
+    assert coordinator.wait_for_workers(1, timeout=10)
+    yield coordinator, handlers, events
+    coordinator.close()
+    thread.join(10)
+
+
+def test_inputs_are_uploaded_and_outputs_returned(tmp_path, cluster):
+    coordinator, handlers, _ = cluster
+
+    def upper(payload, local_inputs, output_folder, progress):
+        [(original, local)] = local_inputs.items()
+        os.makedirs(os.path.join(output_folder, 'poster'))
+        outputs = [os.path.join(output_folder, payload['name']), os.path.join(output_folder, 'poster', 'p.jpg')]
+        for path in outputs:
+            with open(local, 'rb') as src, open(path, 'wb') as dst:
+                dst.write(src.read().upper())
+        return outputs
+    handlers['upper'] = upper
+    source = tmp_path / 'in.mp4'
+    source.write_bytes(b'content')
+    output_folder = tmp_path / 'out'
+
+    result = coordinator.call('upper', {'name': 'in_part1.mp4'}, inputs=[str(source)],
+                              output_folder=str(output_folder))
+    assert result['ok']
+    assert (output_folder / 'in_part1.mp4').read_bytes() == b'CONTENT'
+    assert (output_folder / 'poster' / 'p.jpg').read_bytes() == b'CONTENT'
+    assert not any(name.endswith('.part') for _, _, names in os.walk(output_folder) for name in names)
+    assert coordinator.workers == [{'name': 'w1', 'capacity': 2, 'running': 0, 'shared_storage': False}]
+
+
+def test_failed_tasks_are_retried_then_reported(cluster):
+    coordinator, handlers, events = cluster
+    attempts = []
+
+    def flaky(payload, local_inputs, output_folder, progress):
+        attempts.append(1)
+        if len(attempts) < payload['succeed_on']:
+            raise RuntimeError('boom')
+        return []
+    handlers['flaky'] = flaky
+
+    assert coordinator.call('flaky', {'succeed_on': 2})['ok']
+    assert events.count('task_retry') == 1
+
+    attempts.clear()
+    with pytest.raises(RuntimeError, match='w1: boom'):
+        coordinator.call('flaky', {'succeed_on': distributed.MAX_ATTEMPTS + 1})
+    assert len(attempts) == distributed.MAX_ATTEMPTS
+
+
+def test_default_events_go_to_logging(caplog, capsys):
+    caplog.set_level(logging.INFO, logger='feijian.distributed')
+    coordinator = Coordinator(('127.0.0.1', 0))
+    worker = Worker(coordinator.address, capacity=1, name='w1')
+    thread = threading.Thread(target=worker.serve_forever, kwargs={'exit_when_done': True}, daemon=True)
+    thread.start()
+    assert coordinator.wait_for_workers(1, timeout=10)
+    coordinator.close()
+    thread.join(10)
+    assert any(message.startswith('worker_joined: ') for message in caplog.messages)
+    assert any(message.startswith('已连接协调端') for message in caplog.messages)
+    # 命令行的 stdout 是事件流，这里不能有输出
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,104 @@
+import json
+import os
+
+from feijian import journal
+from feijian.journal import Journal
+
+
+def test_records_survive_a_reload(tmp_path):
+    job = journal.open_job(str(tmp_path), 'split', {'min': 3, 'max': (5, 6)})
+    job.plan('a.mp4', segments=[[0, 4], [4, 9]])
+    job.plan('b.mp4', segments=[[0, 5]])
+    job.done('a.mp4')
+    job.failed('b.mp4', 'boom')
+    job.close()
+
+    loaded = Journal.load(str(tmp_path))
+    assert loaded.kind == 'split'
+    assert loaded.planned('a.mp4') == {'segments': [[0, 4], [4, 9]]}
+    assert loaded.is_done('a.mp4') and not loaded.is_done('b.mp4')
+    assert loaded.failures == {'b.mp4': 'boom'}
+    assert not loaded.finished
+    # 参数经过 JSON 往返后比较，元组与列表相同
+    assert loaded.matches('split', {'min': 3, 'max': (5, 6)})
+    assert not loaded.matches('split', {'min': 3, 'max': (5, 7)})
+    assert not loaded.matches('montage', {'min': 3, 'max': (5, 6)})
+
+
+def test_done_clears_an_earlier_failure(tmp_path):
+    job = journal.open_job(str(tmp_path), 'split', {})
+    job.failed('a.mp4', 'boom')
+    job.done('a.mp4')
+    job.finish()
+    loaded = Journal.load(str(tmp_path))
+    assert loaded.failures == {} and loaded.completed == {'a.mp4'} and loaded.finished
+
+
+def test_load_ignores_a_torn_last_line(tmp_path):
+    job = journal.open_job(str(tmp_path), 'split', {})
+    job.done('a.mp4')
+    job.close()
+    with open(journal.journal_path(str(tmp_path)), 'a', encoding='utf-8') as f:
+        f.write('{"type": "done", "item": "b.m')
+    assert Journal.load(str(tmp_path)).completed == {'a.mp4'}
+
+
+def test_load_without_a_journal(tmp_path):
+    assert Journal.load(str(tmp_path)) is None
+
+
+def test_open_job_resumes_only_matching_params(tmp_path):
+    job = journal.open_job(str(tmp_path), 'split', {'seed': 1})
+    job.done('a.mp4')
+    job.close()
+    assert journal.open_job(str(tmp_path), 'split', {'seed': 1}, resume=True).is_done('a.mp4')
+    # 参数不同时新建日志，旧记录作废
+    assert not journal.open_job(str(tmp_path), 'split', {'seed': 2}, resume=True).is_done('a.mp4')
+    assert not Journal.load(str(tmp_path)).is_done('a.mp4')
+
+
+def test_resume_removes_partials_in_subfolders(tmp_path):
+    journal.open_job(str(tmp_path), 'split', {}).close()
+    os.makedirs(tmp_path / '720p')
+    leftovers = [tmp_path / 'a_part1.mp4.part', tmp_path / '720p' / 'a_part1.mp4.part']
+    for path in leftovers:
+        path.write_bytes(b'half')
+    (tmp_path / 'a_part2.mp4').write_bytes(b'whole')
+    journal.open_job(str(tmp_path), 'split', {}, resume=True)
+    assert not any(path.exists() for path in leftovers)
+    assert (tmp_path / 'a_part2.mp4').exists()
+
+
+def test_commit_part(tmp_path):
+    target = str(tmp_path / 'out.mp4')
+    with open(journal.part_path(target), 'wb') as f:
+        f.write(b'video')
+    journal.commit_part(target)
+    assert os.listdir(tmp_path) == ['out.mp4']
+
+
+def _job_folder(parent, name, params, finished=False):
+    job = journal.open_job(os.path.join(parent, name), 'montage', params)
+    if finished:
+        job.finish()
+    job.close()
+
+
+def test_find_resumable_picks_the_latest_unfinished_match(tmp_path):
+    params = {'target': 30}
+    _job_folder(tmp_path, 'out_1', params)
+    _job_folder(tmp_path, 'out_2', params)
+    _job_folder(tmp_path, 'out_3', params, finished=True)
+    _job_folder(tmp_path, 'out_4', {'target': 60})
+    _job_folder(tmp_path, 'other_5', params)
+    assert journal.find_resumable(str(tmp_path), 'montage', params, 'out_') == os.path.join(tmp_path, 'out_2')
+    assert journal.find_resumable(str(tmp_path), 'split', params, 'out_') is None
+    assert journal.find_resumable(str(tmp_path / 'missing'), 'montage', params, 'out_') is None
+
+
+def test_journal_lines_are_json(tmp_path):
+    job = journal.open_job(str(tmp_path), 'split', {'input': '素材'})
+    job.finish()
+    with open(journal.journal_path(str(tmp_path)), encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert records == [{'type': 'job', 'kind': 'split', 'params': {'input': '素材'}}, {'type': 'finished'}]
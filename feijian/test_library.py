@@ -0,0 +1,119 @@
+import os
+import time
+
+import pytest
+
+from conftest import MP4_HEADER
+from feijian import library
+from feijian.library import LibraryIndex
+from feijian.previews import PREVIEW_DIR
+
+
+def _video(path, header=MP4_HEADER):
+    os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(header + b'\x00' * 16)
+    return str(path)
+
+
+def _age(*folders):
+    """把目录 mtime 调到 RACY_SECONDS 之前，列表才会写入索引"""
+    past = time.time() - 60
+    for folder in folders:
+        os.utime(folder, (past, past))
+
+
+@pytest.mark.parametrize('header, expected', [
+    (MP4_HEADER, True),
+    (b'\x1a\x45\xdf\xa3' + b'\x00' * 8, True),
+    (b'RIFF\x00\x00\x00\x00AVI LIST', True),
+    (b'FLV\x01' + b'\x00' * 8, True),
+    (b'\x00\x00\x01\xba' + b'\x00' * 8, True),
+    (b'GIF89a' + b'\x00' * 8, False),
+    (b'', False),
+])
+def test_sniff_video(tmp_path, header, expected):
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(header)
+    assert library.sniff_video(str(path)) is expected
+
+
+def test_sniff_mpeg_ts(tmp_path):
+    path = tmp_path / 'clip.mpg'
+    path.write_bytes((b'\x47' + b'\x00' * 187) * 2)
+    assert library.sniff_video(str(path))
+
+
+def test_scan_order_and_filters(tmp_path):
+    root = tmp_path / 'lib'
+    expected = [_video(root / 'a.mp4'), _video(root / 'B.MOV'), _video(root / 'sub1' / 'c.mkv'),
+                _video(root / 'sub1' / 'deep' / 'd.mp4'), _video(root / 'sub2' / 'e.avi')]
+    _video(root / '.hidden.mp4')
+    _video(root / 'renamed.mp4', b'not really a video')
+    _video(root / 'notes.txt')
+    _video(root / PREVIEW_DIR / 'poster.mp4')
+    _video(root / 'skipped' / 'f.mp4')
+    _video(root / 'export' / 'g.mp4')
+    found = list(library.scan(str(root), exclude=[str(root / 'export')], skip_dir=lambda name: name == 'skipped'))
+    assert sorted(found[:2]) == sorted(expected[:2])
+    assert found[2:] == expected[2:]
+    assert list(library.scan(str(root), recursive=False, use_index=False)) == sorted(expected[:2])
+
+
+def test_scan_a_single_file(tmp_path):
+    path = str(tmp_path / 'anything.bin')
+    with open(path, 'wb') as f:
+        f.write(b'x')
+    assert list(library.scan(path)) == [path]
+    assert list(library.scan(str(tmp_path / 'missing'))) == []
+
+
+def test_unreadable_directory_is_skipped_with_a_warning(tmp_path, caplog, capsys):
+    assert library.list_directory(str(tmp_path / 'missing')) == ([], [])
+    assert '无法读取目录' in caplog.text
+    assert capsys.readouterr().out == ''
+
+
+def test_unchanged_directories_are_not_listed_again(tmp_path, monkeypatch):
+    root = tmp_path / 'lib'
+    videos = [_video(root / 'a.mp4'), _video(root / 'sub' / 'b.mp4')]
+    _age(root, root / 'sub')
+    assert list(library.scan(str(root))) == videos
+
+    def no_listing(path):
+        raise AssertionError(f"listed {path}")
+    monkeypatch.setattr(library.os, 'scandir', no_listing)
+    assert list(library.scan(str(root))) == videos
+
+
+def test_changed_directories_are_listed_again(tmp_path):
+    root = tmp_path / 'lib'
+    _video(root / 'a.mp4')
+    _age(root)
+    assert len(list(library.scan(str(root)))) == 1
+    _video(root / 'b.mp4')
+    # 新文件改变了目录 mtime（这里调到与第一次不同的过去时间）
+    os.utime(root, (time.time() - 30, time.time() - 30))
+    assert len(list(library.scan(str(root)))) == 2
+
+
+def test_rejected_files_are_checked_again_when_they_change(tmp_path):
+    root = tmp_path / 'lib'
+    # 还在下载中的文件：扩展名对但文件头还没写入
+    downloading = root / 'a.mp4'
+    os.makedirs(root)
+    downloading.write_bytes(b'')
+    _age(root)
+    assert list(library.scan(str(root))) == []
+    _video(downloading)
+    assert list(library.scan(str(root))) == [str(downloading)]
+
+
+def test_index_store_and_invalidate(tmp_path):
+    index = LibraryIndex(db_path=str(tmp_path / 'library.sqlite3'))
+    index.store(str(tmp_path), 123, ['a.mp4'], ['sub'], {'b.mp4': [0, 1]})
+    assert index.lookup(str(tmp_path), 123) == (['a.mp4'], ['sub'], {'b.mp4': [0, 1]})
+    assert index.lookup(str(tmp_path), 124) is None
+    index.invalidate(str(tmp_path))
+    assert index.lookup(str(tmp_path), 123) is None
+    index.close()
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from feijian import media_cache
+from feijian.media_cache import MediaCache, MediaInfo
+
+
+def _info(duration=12.5):
+    return MediaInfo(duration, 'h264', 1280, 720, 30.0, 'yuv420p', '1/15360', 'aac', 44100, 2, 'stereo', 0.0)
+
+
+def _write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+    return str(path)
+
+
+def test_parse_probe_output():
+    stdout = json.dumps({
+        'streams': [
+            {'codec_type': 'audio', 'codec_name': 'aac', 'sample_rate': '48000', 'channels': 2,
+             'channel_layout': 'stereo'},
+            {'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080,
+             'avg_frame_rate': '0/0', 'r_frame_rate': '30000/1001', 'pix_fmt': 'yuv420p', 'time_base': '1/90000'},
+        ],
+        'format': {'duration': '61.5', 'start_time': '1.25'},
+    }).encode()
+    info = media_cache.parse_probe_output(stdout)
+    assert info.duration == 61.5
+    assert info.start_time == 1.25
+    assert (info.video_codec, info.width, info.height) == ('h264', 1920, 1080)
+    # avg_frame_rate 无效时用 r_frame_rate
+    assert info.fps == pytest.approx(29.97, abs=0.01)
+    assert (info.audio_codec, info.sample_rate, info.channels) == ('aac', 48000, 2)
+
+
+def test_parse_probe_output_without_audio_or_start_time():
+    stdout = json.dumps({'streams': [{'codec_type': 'video', 'codec_name': 'vp9'}],
+                         'format': {'duration': '3'}}).encode()
+    info = media_cache.parse_probe_output(stdout)
+    assert info.audio_codec is None and info.sample_rate is None
+    assert info.start_time == 0.0
+
+
+def test_parse_probe_output_without_duration_fails():
+    with pytest.raises((TypeError, ValueError)):
+        media_cache.parse_probe_output(b'{"format": {}}')
+
+
+def test_get_put_roundtrip(tmp_path):
+    cache = MediaCache(db_path=str(tmp_path / 'media.sqlite3'))
+    video = _write(tmp_path / 'a.mp4', 'data')
+    assert cache.get(video) is None
+    cache.put(video, _info())
+    assert cache.get(video) == _info()
+    cache.close()
+
+    # 重新打开数据库后仍然命中
+    cache = MediaCache(db_path=str(tmp_path / 'media.sqlite3'))
+    assert cache.get(video) == _info()
+
+
+def test_unwritable_cache_falls_back_to_memory(tmp_path, caplog, capsys):
+    blocker = _write(tmp_path / 'blocker', 'x')
+    cache = MediaCache(db_path=os.path.join(blocker, 'media.sqlite3'))
+    assert cache.db_path == ':memory:'
+    # 提示走 logging，不写 stdout（命令行的 stdout 是事件流）
+    assert '无法打开元数据缓存' in caplog.text
+    assert capsys.readouterr().out == ''
+
+
+def test_configure_closes_the_replaced_cache(tmp_path):
+    first = media_cache.configure(db_path=str(tmp_path / 'first.sqlite3'))
+    second = media_cache.configure(db_path=str(tmp_path / 'second.sqlite3'))
+    assert media_cache.get_cache() is second
+    with pytest.raises(sqlite3.ProgrammingError):
+        first.get(_write(tmp_path / 'a.mp4', 'a'))
+    second.close()
+
+
+def test_changed_file_is_a_miss(tmp_path):
+    cache = MediaCache(db_path=':memory:')
+    video = _write(tmp_path / 'a.mp4', 'data')
+    cache.put(video, _info())
+    _write(video, 'longer data')
+    assert cache.get(video) is None
+
+
+def test_invalidate(tmp_path):
+    cache = MediaCache(db_path=':memory:')
+    first = _write(tmp_path / 'a.mp4', 'a')
+    second = _write(tmp_path / 'b.mp4', 'b')
+    cache.put(first, _info())
+    cache.put(second, _info())
+    cache.invalidate(first)
+    assert cache.get(first) is None and cache.get(second) is not None
+    cache.invalidate()
+    assert cache.get(second) is None
+
+
+def test_evict_keeps_most_recent_entries(tmp_path):
+    cache = MediaCache(db_path=':memory:', max_entries=2)
+    videos = [_write(tmp_path / f'{index}.mp4', str(index)) for index in range(4)]
+    for video in videos:
+        cache.put(video, _info())
+    cache.evict()
+    assert [cache.get(video) is not None for video in videos] == [False, False, True, True]
+
+
+def test_evict_prunes_missing_files(tmp_path):
+    cache = MediaCache(db_path=':memory:')
+    video = _write(tmp_path / 'a.mp4', 'a')
+    cache.put(video, _info())
+    os.remove(video)
+    cache.evict(prune_missing=True)
+    assert cache._conn.execute('SELECT COUNT(*) FROM media').fetchone()[0] == 0
+
+
+def test_blob_table_is_computed_once_per_file_version(tmp_path, monkeypatch):
+    calls = []
+
+    def compute(path):
+        calls.append(path)
+        with open(path) as f:
+            return f.read().upper()
+
+    monkeypatch.setitem(MediaCache.BLOB_TABLES, 'fingerprints',
+                        (compute, media_cache._pack_text, media_cache._unpack_text))
+    cache = MediaCache(db_path=':memory:')
+    video = _write(tmp_path / 'a.mp4', 'abc')
+    assert cache.fingerprint(video) == 'ABC'
+    assert cache.fingerprint(video) == 'ABC'
+    assert len(calls) == 1
+    _write(video, 'abcd')
+    assert cache.fingerprint(video) == 'ABCD'
+    assert len(calls) == 2
+
+
+def test_blob_table_writes_trigger_eviction(tmp_path, monkeypatch):
+    monkeypatch.setitem(MediaCache.BLOB_TABLES, 'fingerprints',
+                        (lambda path: path, media_cache._pack_text, media_cache._unpack_text))
+    monkeypatch.setattr(MediaCache, 'EVICT_EVERY', 5)
+    cache = MediaCache(db_path=':memory:', max_entries=3)
+    for index in range(10):
+        cache.fingerprint(_write(tmp_path / f'{index}.mp4', str(index)))
+    assert cache._conn.execute('SELECT COUNT(*) FROM fingerprints').fetchone()[0] == 3
+
+
+def test_times_pack_roundtrip():
+    times = [0.0, 2.002, 4.004, 123.5]
+    assert media_cache._unpack_times(media_cache._pack_times(times)) == times
@@ -0,0 +1,177 @@
+import logging
+import os
+import subprocess
+import threading
+
+import pytest
+
+from feijian import journal, media_cache, montage_job, render_cache, scheduler
+from feijian.analysis import Analysis
+from feijian.montage_job import DEDUPE_DROP, DEDUPE_SPREAD, SEQUENTIAL, SHUFFLED, MontageJob
+from feijian.progress import JobProgress
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """不调用 ffmpeg：render_files 写出空的输出文件并记录 (输出文件名, 素材)；fail 中的输出文件名渲染失败"""
+    calls = []
+    fail = set()
+    monkeypatch.setattr(scheduler, '_scheduler', scheduler.FFmpegScheduler(max_jobs=2, cores=2))
+
+    def render_files(video_files, output_video_path, mute=False, progress=None, renditions=None, previews=()):
+        name = os.path.basename(output_video_path)
+        calls.append((name, video_files))
+        if name.split('_')[2] in fail:
+            raise subprocess.CalledProcessError(1, ['ffmpeg'], stderr=b'boom')
+        progress(1.0, None, None)
+        with open(output_video_path, 'wb') as f:
+            f.write(b'montage')
+    monkeypatch.setattr(montage_job, 'render_files', render_files)
+    return calls, fail
+
+
+def _job(source, tmp_path, **kwargs):
+    return MontageJob(str(source), str(tmp_path / 'out'), SHUFFLED, 20, autotune=False, use_cache=False, **kwargs)
+
+
+def test_groups_render_concurrently(tmp_path, fake_media, monkeypatch, rendered):
+    for name in 'abcd':
+        fake_media(tmp_path / 'in' / f'{name}.mp4', 10)
+    barrier = threading.Barrier(2, timeout=5)
+    render = montage_job.render_files
+    # 两组都开始渲染后才能继续，串行渲染时 barrier 超时
+    monkeypatch.setattr(montage_job, 'render_files', lambda *args, **kwargs: (barrier.wait(), render(*args, **kwargs)))
+    errors = []
+    output_folder = _job(tmp_path / 'in', tmp_path, error=errors.append).run()
+    assert errors == []
+    assert len(rendered[0]) == 2
+    assert journal.Journal.load(output_folder).finished
+
+
+def test_failed_group_is_reported_without_stopping_the_others(tmp_path, fake_media, rendered):
+    calls, fail = rendered
+    for name in 'abcdef':
+        fake_media(tmp_path / 'in' / f'{name}.mp4', 10)
+    fail.add('2')
+    errors, percents = [], []
+    with pytest.raises(RuntimeError, match='1/3 个合成视频失败'):
+        _job(tmp_path / 'in', tmp_path, error=errors.append, progress=percents.append).run()
+
+    [output_folder] = [str(path) for path in (tmp_path / 'out').iterdir()]
+    assert sorted(name.split('_')[2] for name, _ in calls) == ['1', '2', '3']
+    assert errors == ["FFmpeg 错误：boom"]
+    assert percents[-1] == 100
+    outputs = sorted(name for name in os.listdir(output_folder) if name.endswith('.mp4'))
+    assert [name.split('_')[2] for name in outputs] == ['1', '3']
+    # 失败的组没有完成记录，任务也没有结束，恢复时只重做这一组
+    loaded = journal.Journal.load(output_folder)
+    assert not loaded.finished
+    assert sorted(name.split('_')[2] for name in loaded.completed) == ['1', '3']
+
+
+def test_unexpected_error_fails_only_that_group(tmp_path, monkeypatch):
+    def broken_cache():
+        raise OSError("磁盘已满")
+    monkeypatch.setattr(render_cache, 'get_cache', broken_cache)
+    errors = []
+    tracker = JobProgress(10)
+    job = MontageJob(str(tmp_path), str(tmp_path / 'out'), SHUFFLED, 20, autotune=False, error=errors.append)
+    assert job.render_group(['a.mp4'], 10, str(tmp_path / 'out' / 'x.mp4'), tracker.unit(10)) is False
+    assert errors == ["发生错误：磁盘已满"]
+    # 失败的组也按完成计入进度
+    assert tracker.snapshot().percent == 100
+
+
+def test_resume_renders_only_failed_groups_into_the_same_folder(tmp_path, fake_media, rendered):
+    calls, fail = rendered
+    for name in 'abcdef':
+        fake_media(tmp_path / 'in' / f'{name}.mp4', 10)
+    fail.add('2')
+    with pytest.raises(RuntimeError):
+        _job(tmp_path / 'in', tmp_path).run()
+    [first_folder] = [str(path) for path in (tmp_path / 'out').iterdir()]
+    first_groups = {name: files for name, files in calls}
+
+    fail.clear()
+    calls.clear()
+    assert _job(tmp_path / 'in', tmp_path, resume=True).run() == first_folder
+    [(name, files)] = calls
+    assert name.split('_')[2] == '2' and files == first_groups[name]
+    assert journal.Journal.load(first_folder).finished
+
+
+def test_pipelined_montage_raises_after_all_groups_finish(tmp_path, fake_media, rendered):
+    calls, fail = rendered
+    for name in 'abcdef':
+        fake_media(tmp_path / 'in' / f'{name}.mp4', 10)
+    fail.add('1')
+    job = MontageJob(str(tmp_path / 'in'), str(tmp_path / 'out'), SEQUENTIAL, 20, autotune=False, use_cache=False)
+    with pytest.raises(RuntimeError, match='1/3 个合成视频失败'):
+        job.run()
+    assert len(calls) == 3
+    [output_folder] = [str(path) for path in (tmp_path / 'out').iterdir()]
+    loaded = journal.Journal.load(output_folder)
+    assert not loaded.finished
+    assert sorted(name.split('_')[2] for name in loaded.completed) == ['2', '3']
+
+
+def test_skip_dead_drops_black_and_silent_clips(tmp_path, fake_media, monkeypatch, rendered, caplog, capsys):
+    caplog.set_level(logging.INFO, logger='feijian.montage_job')
+    calls, _ = rendered
+    clips = [fake_media(tmp_path / 'in' / f'{name}.mp4', 10) for name in 'abcd']
+    dead = {os.path.abspath(clips[1])}
+    monkeypatch.setattr(media_cache, 'get_analysis', lambda video_file: Analysis(
+        10.0, [], [(0.0, 10.0)] if video_file in dead else [], []))
+    job = MontageJob(str(tmp_path / 'in'), str(tmp_path / 'out'), SEQUENTIAL, 20, autotune=False, use_cache=False,
+                     skip_dead=True)
+    job.run()
+    assert [files for _, files in calls] == [[os.path.abspath(clips[0]), os.path.abspath(clips[2])]]
+    # 跳过的素材通过 logging 提示，不写 stdout
+    assert f"跳过无效素材：{os.path.abspath(clips[1])}" in caplog.messages
+    assert capsys.readouterr().out == ''
+
+
+@pytest.mark.parametrize('order, dedupe', [(SHUFFLED, 'merge'), (SEQUENTIAL, DEDUPE_SPREAD)])
+def test_invalid_dedupe_is_rejected(tmp_path, order, dedupe):
+    with pytest.raises(ValueError):
+        MontageJob(str(tmp_path), str(tmp_path / 'out'), order, 20, autotune=False, dedupe=dedupe)
+
+
+@pytest.fixture
+def clip_hashes(tmp_path, fake_media, monkeypatch):
+    """五个 10 秒的素材，b 与 a 近似重复、d 与 c 完全相同；返回素材路径"""
+    clips = [os.path.abspath(fake_media(tmp_path / 'in' / f'{name}.mp4', 10)) for name in 'abcde']
+    values = dict(zip(clips, [0xF0F0F0F0F0F0F0F0, 0xF0F0F0F0F0F0F0F3, 0x0123456789ABCDEF, 0x0123456789ABCDEF,
+                              0xFFFF00000000FFFF]))
+    monkeypatch.setattr(media_cache, 'get_phash', lambda video_file: values[video_file])
+    return clips
+
+
+@pytest.mark.parametrize('order', [SEQUENTIAL, SHUFFLED])
+def test_dedupe_drop_skips_later_duplicates(tmp_path, clip_hashes, rendered, order, caplog, capsys):
+    caplog.set_level(logging.INFO, logger='feijian.montage_job')
+    calls, _ = rendered
+    job = MontageJob(str(tmp_path / 'in'), str(tmp_path / 'out'), order, 30, autotune=False, use_cache=False,
+                     dedupe=DEDUPE_DROP)
+    job.run()
+    [(_, files)] = calls
+    assert sorted(files) == [clip_hashes[0], clip_hashes[2], clip_hashes[4]]
+    assert job.plan_stats['duplicates'] == 2
+    assert sum(message.startswith('跳过重复素材') for message in caplog.messages) == 2
+    assert capsys.readouterr().out == ''
+
+
+def test_dedupe_spread_keeps_duplicates_in_separate_groups(tmp_path, clip_hashes, rendered):
+    calls, _ = rendered
+    # 两个重复簇各两个素材、每组两个素材时，每轮各簇一个，正好分成两组
+    os.remove(clip_hashes.pop())
+    clusters = dict(zip(clip_hashes, 'aacc'))
+    for seed in range(5):
+        calls.clear()
+        job = MontageJob(str(tmp_path / 'in'), str(tmp_path / 'out'), SHUFFLED, 20, tolerance=0, autotune=False,
+                         use_cache=False, seed=seed, dedupe=DEDUPE_SPREAD)
+        job.run()
+        # 重复的素材仍然使用，只是不落在同一组
+        assert len(calls) == 2
+        assert all(len({clusters[clip] for clip in files}) == 2 for _, files in calls)
+        assert job.plan_stats['duplicates'] == 2
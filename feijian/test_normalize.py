@@ -0,0 +1,112 @@
+import os
+
+from feijian import normalize
+from feijian.media_cache import MediaInfo
+
+
+def _info(video_codec='h264', width=1280, height=720, fps=29.97, audio_codec='aac', channels=2):
+    return MediaInfo(10.0, video_codec, width, height, fps, 'yuv420p', '1/15360', audio_codec, 44100, channels,
+                     'stereo', 0.0)
+
+
+def test_profile_of_rounds_fps_and_drops_audio_when_muted():
+    profile = normalize.profile_of(_info(fps=29.97002997))
+    assert profile.fps == 29.97
+    assert (profile.audio_codec, profile.sample_rate, profile.channels) == ('aac', 44100, 2)
+    muted = normalize.profile_of(_info(), mute=True)
+    assert (muted.audio_codec, muted.sample_rate, muted.channels) == (None, None, None)
+    # 静音合成时音频不同的素材规格相同
+    assert normalize.profile_of(_info(audio_codec='mp3'), mute=True) == muted
+
+
+def test_dominant_profile_takes_the_majority():
+    common = normalize.profile_of(_info())
+    rare = normalize.profile_of(_info(width=640, height=360))
+    assert normalize.dominant_profile([rare, common, common]) == common
+
+
+def test_dominant_profile_falls_back_to_encodable_codecs():
+    profile = normalize.profile_of(_info(video_codec='vp9', audio_codec='opus'))
+    target = normalize.dominant_profile([profile])
+    assert (target.video_codec, target.pix_fmt, target.audio_codec) == ('h264', 'yuv420p', 'aac')
+    assert (target.width, target.height, target.fps) == (1280, 720, 29.97)
+
+
+def test_unknown_fps_never_reaches_the_filter():
+    unknown = normalize.profile_of(_info(fps=None))
+    known = normalize.profile_of(_info(fps=25))
+    # 多数素材帧率未知时取已知帧率中最多的
+    assert normalize.dominant_profile([unknown, unknown, known]).fps == 25
+    # 全都未知时不加 fps 滤镜
+    target = normalize.dominant_profile([unknown])
+    assert target.fps == 0
+    command = normalize.build_normalize_command('in.mp4', _info(fps=None), target, 'out.mp4')
+    video_filter = command[command.index('-vf') + 1]
+    assert 'fps=' not in video_filter
+    assert 'setsar=1,format=yuv420p' in video_filter
+
+
+def test_build_normalize_command_pads_missing_audio():
+    target = normalize.profile_of(_info())
+    command = normalize.build_normalize_command('in.mp4', _info(audio_codec=None), target, 'out.mp4')
+    assert 'anullsrc=r=44100:cl=stereo' in command
+    assert command[command.index('-map') + 3] == '1:a:0'
+    assert command[command.index('-c:v') + 1] == 'libx264'
+    assert command[command.index('-video_track_timescale') + 1] == '15360'
+    assert command[-1] == 'out.mp4'
+
+
+def test_build_normalize_command_muted_target_drops_audio():
+    target = normalize.profile_of(_info(), mute=True)
+    command = normalize.build_normalize_command('in.mp4', _info(), target, 'out.mp4')
+    assert '-an' in command
+    assert '-c:a' not in command and 'anullsrc' not in ' '.join(command)
+
+
+class _RecordingScheduler:
+    def __init__(self):
+        self.commands = []
+
+    def run(self, command, kind=None, check=False, progress=None):
+        self.commands.append(command)
+        with open(command[-1], 'wb') as f:
+            f.write(b'normalized')
+
+
+def test_normalize_group_transcodes_only_mismatched_files(tmp_path, fake_media, monkeypatch):
+    scheduler = _RecordingScheduler()
+    monkeypatch.setattr(normalize, 'get_scheduler', lambda: scheduler)
+    files = [fake_media(tmp_path / 'a.mp4', 5), fake_media(tmp_path / 'b.mp4', 6)]
+    # 假 ffprobe 给出的规格都相同，不需要转码
+    assert normalize.normalize_group(files) == files
+    assert scheduler.commands == []
+
+
+def test_normalize_file_is_cached_by_content_and_profile(tmp_path, monkeypatch):
+    scheduler = _RecordingScheduler()
+    monkeypatch.setattr(normalize, 'get_scheduler', lambda: scheduler)
+    source = tmp_path / 'a.mp4'
+    source.write_bytes(b'source')
+    profile = normalize.profile_of(_info())
+    first = normalize.normalize_file(str(source), _info(fps=25), profile)
+    assert normalize.normalize_file(str(source), _info(fps=25), profile) == first
+    assert len(scheduler.commands) == 1
+    assert first.startswith(normalize.cache_dir()) and os.path.exists(first)
+    assert not os.path.exists(first + '.part')
+    other = normalize.normalize_file(str(source), _info(fps=25), profile._replace(fps=25.0))
+    assert other != first and len(scheduler.commands) == 2
+
+
+def test_prune_removes_least_recently_used():
+    folder = os.path.join(normalize.cache_dir(), 'ab')
+    os.makedirs(folder)
+    paths = []
+    for age, name in enumerate(['new.mp4', 'old.mp4']):
+        path = os.path.join(folder, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 100)
+        os.utime(path, (1000 - age * 100, 1000 - age * 100))
+        paths.append(path)
+    normalize.prune(max_bytes=150)
+    assert [os.path.exists(path) for path in paths] == [True, False]
+
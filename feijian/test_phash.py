@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from feijian import phash
+
+
+def _flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def _random_hashes(seed, count=300, copies=100):
+    """随机哈希，加上一些翻转了几位的近似副本"""
+    rng = np.random.default_rng(seed)
+    hashes = [int(value) for value in rng.integers(0, 2 ** 64 - 1, size=count, dtype=np.uint64, endpoint=True)]
+    for _ in range(copies):
+        original = hashes[int(rng.integers(len(hashes)))]
+        hashes.append(_flip(original, *rng.choice(64, size=int(rng.integers(0, 10)), replace=False).tolist()))
+    order = rng.permutation(len(hashes))
+    return [hashes[index] for index in order]
+
+
+def _brute_pairs(hashes, max_distance=phash.DUPLICATE_DISTANCE):
+    return {(i, j) for i in range(len(hashes)) for j in range(i + 1, len(hashes))
+            if bin(hashes[i] ^ hashes[j]).count('1') <= max_distance}
+
+
+def test_hamming():
+    assert phash.hamming([0, 2 ** 64 - 1], [0b1011, 0]).tolist() == [3, 64]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_duplicate_pairs_matches_brute_force(seed):
+    hashes = _random_hashes(seed)
+    left, right = phash.duplicate_pairs(np.array(hashes, dtype=np.uint64))
+    assert set(zip(left.tolist(), right.tolist())) == _brute_pairs(hashes)
+
+
+def test_duplicate_pairs_with_no_hashes():
+    left, right = phash.duplicate_pairs(np.empty(0, dtype=np.uint64))
+    assert len(left) == len(right) == 0
+
+
+def test_first_occurrences_keeps_the_earliest():
+    base = 0x0123456789ABCDEF
+    hashes = [base, None, _flip(base, 1, 2), base, _flip(base, 3, 4, 5, 6, 7, 8, 9, 10), None]
+    # 与保留的素材距离超过阈值的不算重复，即使它与被去掉的素材相近
+    assert phash.first_occurrences(hashes).tolist() == [True, True, False, False, True, True]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_hash_index_agrees_with_first_occurrences(seed):
+    hashes = _random_hashes(seed) + [None]
+    index = phash.HashIndex()
+    kept = []
+    for key, value in enumerate(hashes):
+        duplicate = value is not None and index.find(value) is not None
+        if value is not None and not duplicate:
+            index.add(value, key)
+        kept.append(not duplicate)
+    assert kept == phash.first_occurrences(hashes).tolist()
+    assert len(index) == sum(kept) - 1
+
+
+def test_duplicate_clusters_are_transitive():
+    base = 0x0F0F0F0F0F0F0F0F
+    middle = _flip(base, 0, 1, 2, 3)
+    far = _flip(middle, 10, 11, 12, 13)
+    other = ~base & (2 ** 64 - 1)
+    # far 与 base 距离 8，经 middle 连成一簇；None 各自成簇
+    assert phash.duplicate_clusters([other, base, None, far, middle, base, None]).tolist() == [0, 1, 2, 1, 1, 1, 6]
+
+
+def test_hash_frames_ignores_brightness_and_noise():
+    rng = np.random.default_rng(0)
+    frames = rng.uniform(0, 200, size=(phash.HASH_FRAMES, phash.HASH_SIZE, phash.HASH_SIZE))
+    brighter = frames + 40
+    noisy = frames + rng.normal(0, 2, size=frames.shape)
+    unrelated = rng.uniform(0, 200, size=frames.shape)
+    batch = phash.hash_frames(np.stack([frames, brighter, noisy, unrelated]))
+    assert batch.shape == (4,) and batch.dtype == np.uint64
+    distances = phash.hamming(batch[:1], batch).tolist()
+    assert distances[1] == 0
+    assert distances[2] <= phash.DUPLICATE_DISTANCE
+    assert distances[3] > phash.DUPLICATE_DISTANCE
+
+
+def test_pack_round_trip():
+    assert phash.unpack_hash(phash.pack_hash(2 ** 64 - 1)) == 2 ** 64 - 1
+    assert phash.unpack_hash(phash.pack_hash(None)) is None
+
+
+def test_build_hash_command_decodes_one_frame_per_point():
+    command = phash.build_hash_command('/src/a.mp4', 8.0)
+    assert command.count('-i') == phash.HASH_FRAMES
+    assert [command[index + 1] for index, arg in enumerate(command) if arg == '-ss'] == \
+        ['1.000', '3.000', '5.000', '7.000']
+    assert command[-1] == '-' and command[command.index('-pix_fmt') + 1] == 'gray'
@@ -0,0 +1,114 @@
+import random
+
+import numpy as np
+import pytest
+
+from feijian import planner
+
+
+def _max_groups(durations, lo, hi):
+    """暴力求解：不相交的连续区间、每段总时长在 [lo, hi] 内时最多能分出的组数"""
+    best = [0] * (len(durations) + 1)
+    for end in range(1, len(durations) + 1):
+        best[end] = best[end - 1]
+        for start in range(end):
+            if lo <= sum(durations[start:end]) <= hi:
+                best[end] = max(best[end], best[start] + 1)
+    return best[-1]
+
+
+def test_pack_sequential_groups_are_contiguous_and_within_bounds():
+    durations = [3, 4, 9, 2, 2, 6, 5, 12, 1, 4]
+    groups = planner._pack_sequential(np.array(durations, dtype=float), 8, 10)
+    assert groups == [(2, 3), (3, 6)]
+    for start, end in groups:
+        assert 8 <= sum(durations[start:end]) <= 10
+    assert all(end <= start for (_, end), (start, _) in zip(groups, groups[1:]))
+
+
+def test_pack_sequential_finds_the_most_groups():
+    rng = random.Random(0)
+    for _ in range(200):
+        durations = [rng.choice([0.5, 1, 2, 3, 5, 8]) for _ in range(rng.randint(0, 12))]
+        groups = planner._pack_sequential(np.array(durations, dtype=float), 6, 8)
+        assert len(groups) == _max_groups(durations, 6, 8)
+
+
+def test_plan_groups_sequential_keeps_order():
+    groups, stats = planner.plan_groups([10, 10, 25, 10, 10, 10], 20, tolerance=2)
+    assert groups == [[0, 1], [3, 4]]
+    assert (stats['groups'], stats['used_clips'], stats['clips']) == (2, 4, 6)
+
+
+def test_plan_groups_shuffled_uses_each_clip_once():
+    durations = [4, 6, 5, 5, 7, 3, 10, 2, 8, 6, 5, 9]
+    groups, stats = planner.plan_groups(durations, 15, tolerance=1, shuffle=True, rng=np.random.default_rng(1))
+    used = [index for group in groups for index in group]
+    assert len(used) == len(set(used))
+    assert all(14 <= sum(durations[i] for i in group) <= 16 for group in groups)
+    assert stats['used_clips'] == len(used)
+
+
+def test_plan_groups_shuffled_is_reproducible_with_the_same_seed():
+    durations = list(range(1, 30))
+    first, _ = planner.plan_groups(durations, 40, shuffle=True, rng=np.random.default_rng(7))
+    second, _ = planner.plan_groups(durations, 40, shuffle=True, rng=np.random.default_rng(7))
+    assert first == second
+
+
+def test_plan_groups_with_no_clips():
+    assert planner.plan_groups([], 30) == ([], planner.plan_stats([], [], 30))
+    assert planner.plan_groups([], 30, shuffle=True)[0] == []
+
+
+def test_plan_stats():
+    stats = planner.plan_stats([10, 10, 5], [[0, 1]], 21)
+    assert stats == {'clips': 3, 'groups': 1, 'used_clips': 2, 'total_seconds': 25.0, 'used_seconds': 20.0,
+                     'utilisation': 0.8, 'min_group_seconds': 20.0, 'max_group_seconds': 20.0,
+                     'mean_abs_deviation': 1.0}
+
+
+@pytest.mark.parametrize('target, tolerance', [(10, 2.0), (100, 5.0)])
+def test_default_tolerance(target, tolerance):
+    assert planner.default_tolerance(target) == tolerance
+
+
+def test_stream_sequential_matches_the_batch_planner():
+    rng = random.Random(1)
+    for _ in range(300):
+        durations = [round(rng.uniform(0.5, 12), 2) for _ in range(rng.randint(0, 40))]
+        target, tolerance = rng.choice([(10, 1), (20, 2), (30, None)])
+        expected, _ = planner.plan_groups(durations, target, tolerance)
+        streamed = list(planner.stream_sequential(enumerate(durations), target, tolerance))
+        assert streamed == expected
+
+
+def test_stream_sequential_yields_as_soon_as_a_group_is_full():
+    consumed = []
+
+    def clips():
+        for index, duration in enumerate([5, 5, 5, 5, 5]):
+            consumed.append(index)
+            yield index, duration
+
+    stream = planner.stream_sequential(clips(), 10, tolerance=1)
+    assert next(stream) == [0, 1]
+    assert consumed == [0, 1]
+
+
+def test_spread_duplicates_interleaves_clusters():
+    order = np.array([5, 0, 3, 1, 2, 4])
+    clusters = np.array([0, 1, 0, 0, 4, 5])
+    # 每轮各簇出一个，轮内保持原顺序
+    assert planner.spread_duplicates(order, clusters).tolist() == [5, 0, 1, 4, 3, 2]
+
+
+def test_plan_groups_keeps_duplicates_apart():
+    durations = [5] * 12
+    # 三个簇，每簇四个素材；每组三个素材时每组各簇一个
+    clusters = [index % 3 for index in range(12)]
+    for seed in range(5):
+        groups, _ = planner.plan_groups(durations, 15, tolerance=0, shuffle=True, rng=np.random.default_rng(seed),
+                                        clusters=clusters)
+        assert len(groups) == 4
+        assert all(len({clusters[i] for i in group}) == len(group) for group in groups)
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from feijian import previews
+from feijian.montage_job import preview_outputs
+
+
+def test_parse_previews_orders_and_expands_all():
+    assert previews.parse_previews('clip, thumbnail') == ('thumbnail', 'clip')
+    assert previews.parse_previews(['sprite', 'sprite']) == ('sprite',)
+    assert previews.parse_previews('all') == previews.PREVIEW_KINDS
+    assert previews.parse_previews('') == ()
+
+
+def test_parse_previews_rejects_unknown_kinds():
+    with pytest.raises(ValueError) as raised:
+        previews.parse_previews('thumbnail,gif')
+    assert 'gif' in str(raised.value)
+
+
+def test_preview_paths_live_in_the_preview_folder():
+    folder = os.path.join('/out', previews.PREVIEW_DIR)
+    assert previews.preview_paths('/out/a_part%d.mp4', previews.PREVIEW_KINDS) == {
+        'thumbnail': os.path.join(folder, 'a_part%d.jpg'),
+        'sprite': os.path.join(folder, 'a_part%d_sprite.jpg'),
+        'clip': os.path.join(folder, 'a_part%d_preview.mp4'),
+    }
+
+
+def test_build_graph_adds_one_branch_per_image():
+    segments = [(0.0, 10.0), (10.0, 14.0)]
+    paths = [{'thumbnail': 't1.jpg', 'sprite': 's1.jpg'}, {'thumbnail': 't2.jpg'}]
+    filters, args, clip_label = previews.build_graph('0:v:0', segments, paths)
+    assert clip_label is None
+    assert len(filters) == 3 and all(item.startswith('[0:v:0]') for item in filters)
+    # 缩略图取片段 POSTER_POSITION 处
+    assert 'trim=start=3.000:end=10.000' in filters[0]
+    assert 'trim=start=11.200:end=14.000' in filters[2]
+    assert 'fps=0.900000' in filters[1] and 'tile=3x3' in filters[1]
+    assert [arg for arg in args if arg.endswith('.jpg')] == ['t1.jpg', 's1.jpg', 't2.jpg']
+    assert args.count('-frames:v') == 3
+
+
+def test_build_graph_splits_filter_outputs():
+    filters, _, clip_label = previews.build_graph('v', [(0.0, 5.0)], [{'thumbnail': 't.jpg'}], clip=True,
+                                                  split_source=True, prefix='q')
+    assert clip_label == '[qc]'
+    assert filters[0] == '[v]split=2[qin0][qin1]'
+    assert filters[1].startswith('[qin0]trim=') and filters[2].startswith('[qin1]scale=')
+
+
+def test_preview_outputs_adds_the_clip_output():
+    paths = {'thumbnail': 't.jpg', 'clip': 'c.mp4'}
+    _, args = preview_outputs('0:v:0', '0:a:0?', 8.0, paths)
+    assert args[-1] == 'c.mp4' and '0:a:0?' in args
+    _, muted = preview_outputs('0:v:0', '0:a:0?', 8.0, paths, mute=True)
+    assert '0:a:0?' not in muted and '-an' in muted
+
+
+def test_cache_args_differ_per_kind():
+    assert len({tuple(previews.cache_args(kind)) for kind in previews.PREVIEW_KINDS}) == len(previews.PREVIEW_KINDS)
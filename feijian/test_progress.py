@@ -0,0 +1,80 @@
+import pytest
+
+from feijian import progress
+from feijian.progress import JobProgress, ProgressInfo
+
+
+def test_with_progress_inserts_args_once():
+    command = progress.with_progress(['ffmpeg', '-i', 'in.mp4', 'out.mp4'])
+    assert command == ['ffmpeg', '-progress', 'pipe:1', '-nostats', '-i', 'in.mp4', 'out.mp4']
+    assert progress.with_progress(command) == command
+    assert progress.with_progress(['ffprobe', 'in.mp4']) == ['ffprobe', 'in.mp4']
+
+
+def test_parse_progress_reports_each_block():
+    lines = [b'frame=10\n', b'fps=24.5\n', b'out_time_us=2500000\n', b'speed=1.5x\n', b'progress=continue\n',
+             'out_time_ms=N/A', 'speed=N/A', 'progress=end', 'noise without separator']
+    updates = []
+    progress.parse_progress(lines, lambda *args: updates.append(args))
+    assert updates == [(2.5, 1.5, 24.5), (None, None, None)]
+
+
+def test_parse_progress_clamps_negative_positions():
+    updates = []
+    progress.parse_progress(['out_time_us=-40000', 'progress=continue'], lambda *args: updates.append(args))
+    assert updates == [(0.0, None, None)]
+
+
+@pytest.mark.parametrize('seconds, text', [(None, '--:--'), (65.9, '01:05'), (3725, '1:02:05')])
+def test_format_eta(seconds, text):
+    assert progress.format_eta(seconds) == text
+
+
+def test_format_status():
+    assert progress.format_status(ProgressInfo(40, 4, 10, 3.21, 240, 65)) == "40%  3.2x  240 fps  剩余 01:05"
+    assert progress.format_status(ProgressInfo(100, 10, 10, None, 0, None)) == "100%"
+
+
+def test_job_progress_weights_units_by_duration():
+    percents = []
+    job = JobProgress(40.0, percents.append)
+    short, long = job.unit(10.0), job.unit(30.0)
+    long.update(15.0)
+    assert job.snapshot().percent == 37
+    # 位置不后退，也不超过单元时长
+    long.update(5.0)
+    long.update(100.0)
+    assert job.snapshot().done_seconds == 30.0
+    short.finish()
+    short.finish()
+    long.finish()
+    assert job.snapshot().done_seconds == 40.0
+    assert percents == sorted(set(percents)) and percents[-1] == 100
+
+
+def test_job_progress_counts_failures_as_done():
+    job = JobProgress(20.0)
+    unit = job.unit(20.0)
+    unit.fail()
+    unit.fail()
+    assert job.failed == 1
+    assert job.snapshot().percent == 100
+
+
+def test_job_progress_status_is_throttled_but_close_always_reports():
+    statuses = []
+    job = JobProgress(10.0, status=statuses.append, interval=60)
+    unit = job.unit(10.0)
+    unit.update(2.0)
+    unit.update(4.0)
+    assert len(statuses) == 1
+    unit.finish()
+    job.close()
+    assert len(statuses) == 2 and statuses[-1].percent == 100
+
+
+def test_job_progress_with_no_work():
+    assert JobProgress(0.0).snapshot().percent == 100
+    job = JobProgress(0.0)
+    job.unit(0.0)
+    assert job.snapshot().percent == 0
@@ -0,0 +1,100 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from feijian import render_cache
+from feijian.render_cache import RenderCache
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'src.mp4'
+    path.write_bytes(b'source video')
+    return str(path)
+
+
+def test_render_key_depends_on_content_range_and_args(source):
+    key = render_cache.render_key([source], (1.0, 4.0), ['-c', 'copy'])
+    assert render_cache.render_key([source], (1.0, 4.0), ['-c', 'copy']) == key
+    # 切点按毫秒取整
+    assert render_cache.render_key([source], (1.0001, 4.0), ['-c', 'copy']) == key
+    assert render_cache.render_key([source], (1.0, 5.0), ['-c', 'copy']) != key
+    assert render_cache.render_key([source], (1.0, 4.0), ['-c:v', 'libx264']) != key
+    assert render_cache.render_key([source], None, ['-c', 'copy']) != key
+
+
+def test_render_key_changes_when_the_source_changes(source):
+    key = render_cache.render_key([source], None, [])
+    with open(source, 'ab') as f:
+        f.write(b' edited')
+    assert render_cache.render_key([source], None, []) != key
+
+
+def _rendered(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_store_then_fetch(tmp_path):
+    cache = RenderCache(root=str(tmp_path / 'renders'))
+    cache.store('ab' * 32, _rendered(tmp_path, 'out.mp4', b'rendered'))
+    target = str(tmp_path / 'again.mp4')
+    assert cache.fetch('ab' * 32, target)
+    with open(target, 'rb') as f:
+        assert f.read() == b'rendered'
+    assert not os.path.exists(target + '.part')
+    assert not cache.fetch('cd' * 32, str(tmp_path / 'missing.mp4'))
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 1, 0.5)
+
+
+def test_fetch_all_is_all_or_nothing(tmp_path):
+    cache = RenderCache(root=str(tmp_path / 'renders'))
+    cache.store('ab' * 32, _rendered(tmp_path, 'main.mp4', b'main'))
+    outputs = [str(tmp_path / 'main-copy.mp4'), str(tmp_path / 'poster-copy.jpg')]
+    assert not cache.fetch_all(['ab' * 32, 'cd' * 32], outputs)
+    assert not any(os.path.exists(path) for path in outputs)
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = RenderCache(root=str(tmp_path / 'renders'), max_bytes=10)
+    cache.store('aa' * 32, _rendered(tmp_path, 'old.mp4', b'123456'))
+    cache._conn.execute('UPDATE objects SET last_access = 0')
+    cache.store('bb' * 32, _rendered(tmp_path, 'new.mp4', b'123456'))
+    assert not cache.fetch('aa' * 32, str(tmp_path / 'a.mp4'))
+    assert cache.fetch('bb' * 32, str(tmp_path / 'b.mp4'))
+
+
+def test_fetch_drops_index_entries_without_objects(tmp_path):
+    cache = RenderCache(root=str(tmp_path / 'renders'))
+    cache.store('ab' * 32, _rendered(tmp_path, 'out.mp4', b'rendered'))
+    os.remove(cache._object_path('ab' * 32))
+    assert not cache.fetch('ab' * 32, str(tmp_path / 'again.mp4'))
+    assert cache.stats()['entries'] == 0
+
+
+def test_default_cache_lives_in_the_cache_dir():
+    assert render_cache.get_cache().root == render_cache.cache_dir()
+
+
+def test_configure_closes_the_replaced_cache(tmp_path):
+    first = render_cache.configure(root=str(tmp_path / 'first'))
+    second = render_cache.configure(root=str(tmp_path / 'second'))
+    assert render_cache.get_cache() is second
+    with pytest.raises(sqlite3.ProgrammingError):
+        first.stats()
+    second.close()
+
+
+def test_unwritable_root_falls_back_to_a_temporary_dir(tmp_path, caplog, capsys):
+    blocker = tmp_path / 'blocker'
+    blocker.write_bytes(b'x')
+    cache = RenderCache(root=str(blocker / 'renders'))
+    assert cache.root != str(blocker / 'renders')
+    assert '无法打开渲染缓存' in caplog.text
+    assert capsys.readouterr().out == ''
+    cache.close()
+    shutil.rmtree(cache.root)
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from feijian import renditions, scheduler
+from feijian.renditions import Rendition
+
+
+def test_parse_presets_and_custom_specs():
+    assert renditions.parse_renditions('720p, square=1080x1080:crop,small=640x360') == [
+        renditions.PRESETS['720p'], Rendition('square', 1080, 1080, True), Rendition('small', 640, 360, False)]
+    # 日志和分布式任务里以列表形式保存
+    assert renditions.parse_renditions([['vertical', 1080, 1920, True]]) == [renditions.PRESETS['vertical']]
+    assert renditions.parse_renditions([]) == []
+
+
+@pytest.mark.parametrize('specs', ['4k', 'odd=1279x720', 'zero=0x720', '720p,720p', [['../up', 640, 360, False]]])
+def test_parse_rejects_invalid_specs(specs):
+    with pytest.raises(ValueError):
+        renditions.parse_renditions(specs)
+
+
+def test_output_paths_go_into_rendition_folders():
+    parsed = renditions.parse_renditions('720p,vertical')
+    path = os.path.join('out', 'clip_part1.mp4')
+    assert renditions.output_paths(path, parsed) == [os.path.join('out', '720p', 'clip_part1.mp4'),
+                                                     os.path.join('out', 'vertical', 'clip_part1.mp4')]
+    assert renditions.output_paths(path, []) == [path]
+
+
+def test_video_filter_pads_or_crops():
+    assert 'pad=1280:720' in renditions.video_filter(renditions.PRESETS['720p'])
+    vertical = renditions.video_filter(renditions.PRESETS['vertical'])
+    assert 'force_original_aspect_ratio=increase,crop=1080:1920' in vertical and 'pad' not in vertical
+
+
+def test_fan_out_splits_the_decoded_video_once():
+    filters, labels = renditions.fan_out('0:v:0', renditions.parse_renditions('1080p,720p,vertical'))
+    assert filters[0] == '[0:v:0]split=3[rs0][rs1][rs2]'
+    assert labels == ['[r0]', '[r1]', '[r2]']
+    assert [f.split(']')[0] + ']' for f in filters[1:]] == ['[rs0]', '[rs1]', '[rs2]']
+    single, label = renditions.fan_out('v', renditions.parse_renditions('720p'))
+    assert len(single) == 1 and 'split' not in single[0] and label == ['[r0]']
+
+
+def test_thread_args_share_the_job_threads(monkeypatch):
+    monkeypatch.setattr(scheduler, '_scheduler', scheduler.FFmpegScheduler(max_jobs=2, cores=8))
+    assert renditions.thread_args() == ['-threads', '4']
+    assert renditions.thread_args(3) == ['-threads', '1']
+    assert renditions.thread_args(8) == ['-threads', '1']
+
+
+def test_cache_args_differ_per_rendition():
+    parsed = renditions.parse_renditions('1080p,vertical')
+    assert renditions.cache_args(parsed[0]) != renditions.cache_args(parsed[1])
@@ -0,0 +1,120 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from feijian import scheduler as scheduler_module
+from feijian.scheduler import COPY, PROBE, FFmpegScheduler
+
+
+def _python(code):
+    return [sys.executable, '-c', code]
+
+
+def test_threads_per_job():
+    assert FFmpegScheduler(max_jobs=2, cores=8).threads_per_job == 4
+    assert FFmpegScheduler(max_jobs=16, cores=8).threads_per_job == 1
+
+
+def test_with_threads_caps_every_output():
+    scheduler = FFmpegScheduler(max_jobs=2, cores=8)
+    command = scheduler.with_threads(['ffmpeg', '-y', '-ss', '1', '-i', 'in.mp4', '-c:v', 'libx264', 'main.mp4',
+                                      '-map', '[p]', '-threads', '1', 'poster.jpg', '-f', 'rawvideo', '-'])
+    assert command == ['ffmpeg', '-y', '-ss', '1', '-i', 'in.mp4', '-c:v', 'libx264', '-threads', '4', 'main.mp4',
+                       '-map', '[p]', '-threads', '1', 'poster.jpg', '-f', 'rawvideo', '-threads', '4', '-']
+
+
+def test_with_threads_leaves_other_commands_alone():
+    scheduler = FFmpegScheduler(max_jobs=2, cores=8)
+    command = ['ffprobe', '-v', 'error', 'in.mp4']
+    assert scheduler.with_threads(command) == command
+
+
+def test_run_returns_output():
+    result = FFmpegScheduler(max_jobs=1).run(_python("print('hello')"), kind=COPY)
+    assert result.returncode == 0
+    assert result.stdout.strip() == b'hello'
+
+
+def test_run_check_raises_on_failure():
+    with pytest.raises(subprocess.CalledProcessError):
+        FFmpegScheduler(max_jobs=1).run(_python("import sys; sys.exit(3)"), kind=COPY, check=True)
+
+
+def test_run_parses_progress():
+    script = "print('out_time_us=1500000'); print('speed=2.5x'); print('fps=30'); print('progress=end')"
+    updates = []
+    result = FFmpegScheduler(max_jobs=1).run(_python(script), kind=COPY,
+                                             progress=lambda *args: updates.append(args))
+    assert updates == [(1.5, 2.5, 30.0)]
+    assert result.stdout == b''
+
+
+def test_encode_jobs_never_exceed_max_jobs():
+    scheduler = FFmpegScheduler(max_jobs=2, cores=4)
+    peak = 0
+    running = threading.Event()
+
+    def watch():
+        nonlocal peak
+        while not running.is_set():
+            peak = max(peak, scheduler._jobs)
+            time.sleep(0.005)
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    futures = [scheduler.submit(scheduler.run, _python("import time; time.sleep(0.1)"), kind=COPY)
+               for _ in range(6)]
+    for future in futures:
+        assert future.result().returncode == 0
+    running.set()
+    watcher.join()
+    assert 1 <= peak <= 2
+    assert scheduler.completed_jobs == 6
+
+
+def test_probes_do_not_wait_for_encode_slots():
+    scheduler = FFmpegScheduler(max_jobs=1)
+    busy = scheduler.submit(scheduler.run, _python("import time; time.sleep(1)"), kind=COPY)
+    time.sleep(0.1)
+    started = time.monotonic()
+    scheduler.run(_python("pass"), kind=PROBE)
+    assert time.monotonic() - started < 0.8
+    busy.result()
+
+
+def test_submit_blocks_when_the_window_is_full():
+    scheduler = FFmpegScheduler(max_jobs=1, window=2)
+    release = threading.Event()
+    futures = [scheduler.submit(release.wait) for _ in range(2)]
+    submitted = threading.Event()
+
+    def submit_third():
+        futures.append(scheduler.submit(lambda: None))
+        submitted.set()
+
+    thread = threading.Thread(target=submit_third)
+    thread.start()
+    assert not submitted.wait(0.2)
+    release.set()
+    assert submitted.wait(2)
+    thread.join()
+    for future in futures:
+        future.result()
+
+
+def test_configure_shuts_down_the_previous_scheduler(monkeypatch):
+    monkeypatch.setattr(scheduler_module, '_scheduler', None)
+    first = scheduler_module.configure(max_jobs=1)
+    release = threading.Event()
+    running = first.submit(release.wait, 2)
+    second = scheduler_module.configure(max_jobs=2)
+    assert scheduler_module.get_scheduler() is second
+    # 旧调度器不再接受新任务，已提交的任务照常完成
+    with pytest.raises(RuntimeError):
+        first.submit(lambda: None)
+    release.set()
+    assert running.result(timeout=2)
+    second.shutdown()
@@ -0,0 +1,203 @@
+import os
+import random
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from feijian import previews, split_engine
+from feijian.render_cache import RenderCache
+from feijian.renditions import parse_renditions
+
+
+def _assert_contiguous(segments, duration):
+    assert segments[0][0] == 0.0
+    assert segments[-1][1] == pytest.approx(duration)
+    for (_, end), (start, _) in zip(segments, segments[1:]):
+        assert start == end
+
+
+def test_plan_segments_covers_the_whole_source():
+    segments = split_engine.plan_segments(95.5, 3, 8, random.Random(1))
+    _assert_contiguous(segments, 95.5)
+    # 只有最后一段可能短于下限
+    assert all(3 <= end - start <= 8 for start, end in segments[:-1])
+    assert segments[-1][1] - segments[-1][0] <= 8
+
+
+def test_plan_segments_is_reproducible_with_the_same_rng():
+    assert (split_engine.plan_segments(60, 2, 5, random.Random('x'))
+            == split_engine.plan_segments(60, 2, 5, random.Random('x')))
+
+
+@pytest.mark.parametrize('min_duration, max_duration', [(5, 3), (0, 0), (-2, -1)])
+def test_plan_segments_rejects_invalid_ranges(min_duration, max_duration):
+    with pytest.raises(ValueError):
+        split_engine.plan_segments(60, min_duration, max_duration)
+
+
+def test_build_split_commands_uses_one_decode():
+    segments = [(0.0, 4.0), (4.0, 9.0), (9.0, 12.5)]
+    commands = split_engine.build_split_commands('/src/clip.mp4', segments, '/out', suffix='.part')
+    assert len(commands) == 1
+    command, first, count = commands[0]
+    assert (first, count) == (1, 3)
+    assert command.count('-i') == 1
+    assert command[command.index('-segment_times') + 1] == '4.000,9.000'
+    assert command[command.index('-force_key_frames') + 1] == '4.000,9.000'
+    assert command[command.index('-t') + 1] == '12.500'
+    assert '-ss' not in command
+    assert command[-1] == os.path.join('/out', 'clip_part%d.mp4.part')
+
+
+def test_build_split_commands_single_segment_is_not_cut():
+    command, _, _ = split_engine.build_split_commands('/src/clip.mp4', [(0.0, 7.0)], '/out')[0]
+    assert '-segment_times' not in command
+    # segment_time 大于片段长度，复用器不会按默认的 2 秒切开
+    assert float(command[command.index('-segment_time') + 1]) > 7.0
+
+
+def test_build_split_commands_chunks_long_cut_lists(monkeypatch):
+    monkeypatch.setattr(split_engine, 'MAX_CUTS_PER_PASS', 2)
+    segments = [(float(start), float(start + 1)) for start in range(5)]
+    commands = split_engine.build_split_commands('/src/clip.mp4', segments, '/out')
+    assert [(first, count) for _, first, count in commands] == [(1, 2), (3, 2), (5, 1)]
+    second = commands[1][0]
+    # 后面的块输入端 seek 到块起点，切点和编号相对于本块
+    assert second[second.index('-ss') + 1] == '2.000'
+    assert second[second.index('-segment_times') + 1] == '1.000'
+    assert second[second.index('-segment_start_number') + 1] == '3'
+
+
+def test_build_split_commands_escapes_percent_in_names():
+    command, _, _ = split_engine.build_split_commands('/src/100%.mp4', [(0.0, 3.0), (3.0, 6.0)], '/out')[0]
+    assert command[-1] == os.path.join('/out', '100%%_part%d.mp4')
+
+
+def test_segment_output_path():
+    assert split_engine.segment_output_path('/src/a.b.mov', '/out', 3) == os.path.join('/out', 'a.b_part3.mp4')
+
+
+def test_run_ffmpeg_failure_raises_with_stderr(monkeypatch, capsys):
+    class FailingScheduler:
+        def run(self, command, **kwargs):
+            raise subprocess.CalledProcessError(1, command, stderr=b'Invalid data\n')
+    monkeypatch.setattr(split_engine, 'get_scheduler', FailingScheduler)
+    with pytest.raises(Exception, match='FFmpeg 错误: Invalid data'):
+        split_engine.run_ffmpeg(['ffmpeg', '-i', 'a.mp4', 'b.mp4'])
+    # 错误只通过异常上报，不写 stdout
+    assert capsys.readouterr().out == ''
+
+
+KEYFRAMES = [0.0, 2.0, 4.0, 6.5, 9.0, 15.0, 16.0, 18.0]
+
+
+def test_plan_keyframe_segments_cuts_only_on_keyframes():
+    segments = split_engine.plan_keyframe_segments(20.0, KEYFRAMES, 2, 4, random.Random(3))
+    _assert_contiguous(segments, 20.0)
+    assert all(end in KEYFRAMES for _, end in segments[:-1])
+
+
+def test_plan_keyframe_segments_takes_nearest_keyframe_outside_the_range():
+    # 9 秒之后 [2, 4] 范围内没有关键帧，取离范围最近的 15 秒
+    segments = split_engine.plan_keyframe_segments(20.0, [0.0, 9.0, 15.0], 2, 4, random.Random(0))
+    assert (9.0, 15.0) in segments
+
+
+def test_plan_keyframe_segments_zero_min_duration_makes_progress():
+    segments = split_engine.plan_keyframe_segments(10.0, [0.0, 5.0], 0, 1, random.Random(0))
+    assert segments == [(0.0, 5.0), (5.0, 10.0)]
+
+
+def test_can_stream_copy():
+    from feijian.media_cache import MediaInfo
+
+    def info(video, audio):
+        return MediaInfo(10.0, video, 640, 360, 30.0, 'yuv420p', '1/15360', audio, 44100, 2, 'stereo', 0.0)
+    assert split_engine.can_stream_copy(info('h264', 'aac'))
+    assert split_engine.can_stream_copy(info('hevc', None))
+    assert not split_engine.can_stream_copy(info('vp9', 'aac'))
+    assert not split_engine.can_stream_copy(info('h264', 'pcm_s16le'))
+
+
+def test_plan_split_fast_copy_uses_the_keyframe_index(tmp_path, fake_media):
+    # 假 ffprobe 每 2 秒一个关键帧，编码为 h264/aac
+    video = fake_media(tmp_path / 'a.mp4', 30)
+    segments, codec_args = split_engine.plan_split(video, 3, 5, fast_copy=True, rng=random.Random(0))
+    assert codec_args == split_engine.COPY_ARGS
+    _assert_contiguous(segments, 30.0)
+    assert all(end % 2 == 0 for _, end in segments)
+
+    segments, codec_args = split_engine.plan_split(video, 3, 5, fast_copy=False, rng=random.Random(0))
+    assert codec_args == split_engine.ENCODE_ARGS
+
+
+def test_copy_commands_do_not_force_keyframes():
+    segments = [(0.0, 4.0), (4.0, 8.0)]
+    command, _, _ = split_engine.build_split_commands('/src/clip.mp4', segments, '/out', split_engine.COPY_ARGS)[0]
+    assert '-force_key_frames' not in command
+    assert command[command.index('-c') + 1] == 'copy'
+
+
+def test_split_video_reuses_cached_segments(tmp_path, monkeypatch):
+    runs = []
+
+    def run_ffmpeg(command, kind, progress=None):
+        runs.append(command)
+        for number in (1, 2):
+            with open(command[-1] % number, 'wb') as f:
+                f.write(b'segment %d' % number)
+    monkeypatch.setattr(split_engine, 'run_ffmpeg', run_ffmpeg)
+    source = tmp_path / 'clip.mp4'
+    source.write_bytes(b'source')
+    cache = RenderCache(root=str(tmp_path / 'renders'))
+    segments = [(0.0, 4.0), (4.0, 8.0)]
+    for name in ('out1', 'out2', 'out3'):
+        (tmp_path / name).mkdir()
+
+    first = split_engine.split_video(str(source), segments, str(tmp_path / 'out1'), cache=cache)
+    second = split_engine.split_video(str(source), segments, str(tmp_path / 'out2'), cache=cache)
+    assert len(runs) == 1
+    assert [Path(path).read_bytes() for path in second] == [b'segment 1', b'segment 2']
+    assert [os.path.basename(path) for path in second] == [os.path.basename(path) for path in first]
+
+    # 参数不同的分割不能命中
+    split_engine.split_video(str(source), segments, str(tmp_path / 'out3'), split_engine.COPY_ARGS, cache=cache)
+    assert len(runs) == 2
+
+
+def test_plan_scene_segments_prefers_scene_cuts():
+    cuts = [3.5, 7.2, 12.0, 30.0]
+    segments = split_engine.plan_scene_segments(20.0, cuts, 3, 6, random.Random(2))
+    _assert_contiguous(segments, 20.0)
+    assert all(3 <= end - start <= 6 for start, end in segments[:-1])
+    # 区间内有切换点时切在切换点上
+    assert [end for _, end in segments[:3]] == [3.5, 7.2, 12.0]
+
+
+def test_renditions_share_one_decode():
+    parsed = parse_renditions('720p,vertical')
+    [(command, _, _)] = split_engine.build_split_commands('/src/clip.mp4', [(0.0, 4.0), (4.0, 8.0)], '/out',
+                                                          renditions=parsed)
+    assert command.count('-i') == 1
+    assert command.count('-f') == 2 and command.count('segment') == 2
+    assert command[command.index('-filter_complex') + 1].startswith('[0:v:0]split=2')
+    assert [arg for arg in command if arg.endswith('%d.mp4')] == [
+        os.path.join('/out', '720p', 'clip_part%d.mp4'), os.path.join('/out', 'vertical', 'clip_part%d.mp4')]
+    assert split_engine.segment_outputs('/src/clip.mp4', '/out', range(1, 3), parsed, ()) == [
+        os.path.join('/out', name, f'clip_part{number}.mp4') for name in ('720p', 'vertical') for number in (1, 2)]
+
+
+def test_previews_come_from_the_split_decode():
+    [(command, _, _)] = split_engine.build_split_commands('/src/clip.mp4', [(0.0, 4.0), (4.0, 8.0)], '/out',
+                                                          previews=('thumbnail', 'clip'))
+    assert command.count('-i') == 1
+    folder = os.path.join('/out', previews.PREVIEW_DIR)
+    assert [arg for arg in command if arg.endswith('.jpg')] == [
+        os.path.join(folder, 'clip_part1.jpg'), os.path.join(folder, 'clip_part2.jpg')]
+    # 预览短片和片段按同样的切点分段
+    assert command[-1] == os.path.join(folder, 'clip_part%d_preview.mp4')
+    assert command.count('-segment_times') == 2
+    assert split_engine.segment_outputs('/src/clip.mp4', '/out', range(1, 2), None, ('thumbnail', 'clip')) == [
+        os.path.join('/out', 'clip_part1.mp4'), os.path.join(folder, 'clip_part1.jpg'),
+        os.path.join(folder, 'clip_part1_preview.mp4')]
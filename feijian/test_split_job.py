@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from feijian import journal, split_engine
+from feijian.split_job import OUTPUT_PREFIX, SplitJob
+
+
+@pytest.fixture
+def split_calls(monkeypatch):
+    """不调用 ffmpeg，记录每次 split_video 的 (源文件, 片段, 输出目录)"""
+    calls = []
+
+    def split_video(video_path, segments, output_folder, codec_args=None, progress=None, **kwargs):
+        calls.append((video_path, segments, output_folder))
+        progress(segments[-1][1] - segments[0][0], None, None)
+    monkeypatch.setattr(split_engine, 'split_video', split_video)
+    return calls
+
+
+def test_one_failing_file_does_not_stop_the_folder(tmp_path, fake_media, split_calls):
+    source = tmp_path / 'source'
+    good = [fake_media(source / 'a.mp4', 10), fake_media(source / 'c.mp4', 12)]
+    broken = fake_media(source / 'b.mp4', None)
+    percents = []
+    job = SplitJob(str(source), str(tmp_path / 'out'), 3, 5, autotune=False, use_cache=False,
+                   progress=percents.append)
+
+    with pytest.raises(RuntimeError) as raised:
+        job.run()
+
+    assert '1/3' in str(raised.value) and 'b.mp4' in str(raised.value)
+    assert sorted(video for video, _, _ in split_calls) == good
+    assert percents[-1] == 100
+    # 失败的文件记入日志，没有完成记录；整个任务没有结束记录，恢复时只重做它
+    loaded = journal.Journal.load(str(tmp_path / 'out'))
+    assert loaded.completed == {os.path.abspath(video) for video in good}
+    assert list(loaded.failures) == [os.path.abspath(broken)]
+    assert not loaded.finished
+
+
+
+def test_resume_redoes_only_unfinished_files(tmp_path, fake_media, split_calls):
+    source = tmp_path / 'source'
+    fake_media(source / 'a.mp4', 10)
+    broken = fake_media(source / 'b.mp4', None)
+    with pytest.raises(RuntimeError):
+        SplitJob(str(source), str(tmp_path / 'out'), 3, 5, autotune=False, use_cache=False).run()
+
+    # 修好文件后恢复：已完成的文件跳过，只分割上次失败的
+    fake_media(broken, 8)
+    split_calls.clear()
+    SplitJob(str(source), str(tmp_path / 'out'), 3, 5, autotune=False, use_cache=False, resume=True).run()
+    assert [video for video, _, _ in split_calls] == [broken]
+    assert journal.Journal.load(str(tmp_path / 'out')).finished
+
+    # 参数不同时不沿用旧日志，全部重做
+    split_calls.clear()
+    SplitJob(str(source), str(tmp_path / 'out'), 3, 6, autotune=False, use_cache=False, resume=True).run()
+    assert len(split_calls) == 2
+
+
+def test_subfolders_keep_their_relative_paths(tmp_path, fake_media, split_calls):
+    source = tmp_path / 'source'
+    fake_media(source / 'a.mp4', 10)
+    fake_media(source / 'day2' / 'b.mp4', 10)
+    out = tmp_path / 'out'
+    SplitJob(str(source), str(out), 3, 5, autotune=False, use_cache=False).run()
+    assert sorted(folder for _, _, folder in split_calls) == [str(out), str(out / 'day2')]
+
+    # 导出目录在输入目录里时不把其中的输出当作素材
+    split_calls.clear()
+    export = source / 'export'
+    fake_media(export / 'a_part1.mp4', 4)
+    SplitJob(str(source), str(export), 3, 5, autotune=False, use_cache=False).run()
+    assert sorted(folder for _, _, folder in split_calls) == [str(export), str(export / 'day2')]
+
+
+def test_earlier_split_outputs_are_not_split_again(tmp_path, fake_media, split_calls):
+    source = tmp_path / 'source'
+    video = fake_media(source / 'a.mp4', 10)
+    # 界面把输出放在带时间戳的目录里，导出到输入目录时上一次的输出就在输入目录中
+    fake_media(source / f'{OUTPUT_PREFIX}20240101000000' / 'a_part1.mp4', 4)
+    SplitJob(str(source), str(source / f'{OUTPUT_PREFIX}20240102000000'), 3, 5, autotune=False,
+             use_cache=False).run()
+    assert [video_path for video_path, _, _ in split_calls] == [video]
@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from feijian import tracing
+from feijian.scheduler import COPY, FFmpegScheduler
+
+
+@pytest.fixture
+def tracer(tmp_path, monkeypatch):
+    """开启追踪，结果写入 tmp_path；测试结束后恢复原来的追踪器"""
+    monkeypatch.setattr(tracing, '_tracer', None)
+    return tracing.enable(trace_path=str(tmp_path / 'trace.json'), metrics_path=str(tmp_path / 'feijian.prom'))
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(tracing, '_tracer', None)
+    monkeypatch.delenv('FEIJIAN_TRACE_DIR', raising=False)
+    assert tracing.get_tracer() is tracing.NULL_TRACER
+    with tracing.span('scan'):
+        pass
+
+
+def test_trace_dir_from_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, '_tracer', None)
+    monkeypatch.setenv('FEIJIAN_TRACE_DIR', str(tmp_path))
+    tracer = tracing.get_tracer()
+    assert tracer.enabled and tracer.metrics_path == str(tmp_path / 'feijian.prom')
+
+
+def test_span_records_event_and_counters(tracer):
+    with tracing.span('probe', file='a.mp4'):
+        pass
+    with pytest.raises(RuntimeError):
+        with tracing.span('probe', file='b.mp4'):
+            raise RuntimeError
+    events = [event for event in tracer.chrome_trace()['traceEvents'] if event['ph'] == 'X']
+    assert [(event['name'], event['args']['file']) for event in events] == [('probe', 'a.mp4'), ('probe', 'b.mp4')]
+    assert 'feijian_stage_runs_total{stage="probe"} 2' in tracer.prometheus_text()
+
+
+def test_prometheus_text_declares_each_metric_once(tracer):
+    usage = tracing.ProcessUsage(1.5, 0.25, 2048, 10, 20, None, 4096)
+    tracer.process(['/usr/bin/ffmpeg', '-i', 'a.mp4'], 'encode', 0.0, 2.0, 0, usage)
+    tracer.process(['ffmpeg', '-i', 'b.mp4'], 'encode', 0.0, 1.0, 1, None)
+    lines = tracer.prometheus_text().splitlines()
+    assert lines.count('# TYPE feijian_processes_total counter') == 1
+    assert 'feijian_processes_total{kind="encode",program="ffmpeg",status="failed"} 1' in lines
+    assert 'feijian_process_cpu_seconds_total{kind="encode",program="ffmpeg",mode="user"} 1.5' in lines
+    assert 'feijian_process_disk_bytes_total{kind="encode",program="ffmpeg",direction="write"} 4096' in lines
+    assert not any(line.startswith('feijian_process_disk_bytes_total') and 'read' in line for line in lines)
+    assert '# TYPE feijian_process_max_rss_bytes gauge' in lines
+    assert 'feijian_process_wall_seconds_total{kind="encode",program="ffmpeg"} 3' in lines
+
+
+@pytest.mark.skipif(not hasattr(os, 'wait4'), reason="需要 os.wait4")
+def test_wait_with_usage_reports_exit_code_and_cpu():
+    process = subprocess.Popen([sys.executable, '-c', 'import sys; sum(range(10 ** 6)); sys.exit(3)'])
+    usage = tracing.wait_with_usage(process)
+    assert process.returncode == 3
+    assert usage.cpu_user + usage.cpu_system > 0
+    assert usage.max_rss > 0
+
+
+def test_scheduler_records_processes_and_flush_writes_files(tracer, tmp_path):
+    FFmpegScheduler(max_jobs=1).run([sys.executable, '-c', 'pass'], kind=COPY)
+    tracing.flush()
+    trace = json.loads((tmp_path / 'trace.json').read_text(encoding='utf-8'))
+    names = [event['name'] for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert any(name.endswith(':copy') for name in names)
+    assert 'feijian_processes_total{kind="copy"' in (tmp_path / 'feijian.prom').read_text(encoding='utf-8')
@@ -0,0 +1,296 @@
+"""性能追踪
+
+记录任务各阶段（scan、probe、analyze、plan、encode、concat、write）的耗时、等待调度槽位的时间，
+以及每个 ffmpeg/ffprobe 子进程的 CPU 时间、峰值内存和 I/O 字节数。
+结果可以导出为 Chrome trace（chrome://tracing 或 Perfetto 打开）和 Prometheus textfile，
+还可以用 cProfile 分析 Python 侧（每个工作线程单独采样，导出时合并）。
+
+默认关闭，关闭时 span() 等调用几乎没有开销。开启方式：
+- 命令行 --trace / --metrics / --profile
+- 环境变量 FEIJIAN_TRACE_DIR=目录，每个任务结束后写入 trace.json 和 feijian.prom（界面同样适用）
+"""
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+# 超过这个数量后不再记录 trace 事件（Prometheus 汇总不受影响），避免超大批量任务占满内存
+MAX_EVENTS = 500000
+
+# CPU 时间为秒；max_rss、I/O 为字节。io_* 含页缓存命中和管道，disk_* 是实际读写存储的量，拿不到时为 None
+ProcessUsage = namedtuple('ProcessUsage', [
+    'cpu_user', 'cpu_system', 'max_rss', 'io_read', 'io_write', 'disk_read', 'disk_write',
+])
+
+
+def _exit_code(status):
+    if hasattr(os, 'waitstatus_to_exitcode'):
+        return os.waitstatus_to_exitcode(status)
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _read_proc_io(pid):
+    try:
+        with open(f'/proc/{pid}/io') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines() if ': ' in line)
+        return {key: int(value) for key, value in fields.items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def wait_with_usage(process):
+    """代替 process.wait()，返回子进程的 ProcessUsage；平台不支持时只等待并返回 None
+
+    先用 waitid(WNOWAIT) 等进程退出但不回收，趁 /proc/<pid>/io 还在时读取 I/O 计数，
+    再用 wait4 回收并取得 rusage。
+    """
+    if not hasattr(os, 'wait4'):
+        process.wait()
+        return None
+    io = {}
+    try:
+        if hasattr(os, 'waitid'):
+            os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+            io = _read_proc_io(process.pid)
+        _, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # 已被其它地方（如 kill_all 中的 poll）回收
+        process.wait()
+        return None
+    process.returncode = _exit_code(status)
+    # Linux 的 ru_maxrss 单位是 KB，macOS 是字节
+    max_rss = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+    return ProcessUsage(
+        cpu_user=rusage.ru_utime,
+        cpu_system=rusage.ru_stime,
+        max_rss=max_rss,
+        io_read=io.get('rchar'),
+        io_write=io.get('wchar'),
+        disk_read=io.get('read_bytes', rusage.ru_inblock * 512),
+        disk_write=io.get('write_bytes', rusage.ru_oublock * 512),
+    )
+
+
+class Tracer:
+    """线程安全的追踪记录"""
+    enabled = True
+
+    def __init__(self, trace_path=None, metrics_path=None, profile_path=None):
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.profile_path = profile_path
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._events = []
+        self._threads = {}
+        self._profiles = []
+        # Prometheus 汇总：(指标名, 标签元组) -> 值
+        self._counters = defaultdict(float)
+        self._gauges = {}
+
+    def _now_us(self):
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def _tid(self):
+        ident = threading.get_ident()
+        tid = self._threads.get(ident)
+        if tid is None:
+            tid = self._threads[ident] = (len(self._threads) + 1, threading.current_thread().name)
+        return tid[0]
+
+    def _add_event(self, name, cat, start_us, end_us, args):
+        with self._lock:
+            if len(self._events) < MAX_EVENTS:
+                self._events.append({'name': name, 'cat': cat, 'ph': 'X', 'ts': round(start_us, 1),
+                                     'dur': round(end_us - start_us, 1), 'pid': os.getpid(), 'tid': self._tid(),
+                                     'args': args})
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        """记录一个阶段，如 with tracer.span('probe', file=...):"""
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            end = self._now_us()
+            self._add_event(name, 'stage', start, end, args)
+            with self._lock:
+                self._counters[('feijian_stage_seconds_total', (('stage', name),))] += (end - start) / 1e6
+                self._counters[('feijian_stage_runs_total', (('stage', name),))] += 1
+
+    def slot_wait(self, kind, start, end):
+        """等待调度器槽位的时间（time.perf_counter 时间点）"""
+        start_us, end_us = (start - self._origin) * 1e6, (end - self._origin) * 1e6
+        if end_us - start_us >= 1000:
+            self._add_event(f'wait:{kind}', 'scheduler', start_us, end_us, {})
+        with self._lock:
+            self._counters[('feijian_slot_wait_seconds_total', (('kind', kind),))] += end - start
+
+    def process(self, command, kind, start, end, returncode, usage):
+        """记录一个子进程，start/end 为 time.perf_counter 时间点，usage 为 ProcessUsage 或 None"""
+        program = os.path.basename(command[0])
+        args = {'command': ' '.join(command), 'returncode': returncode}
+        if usage is not None:
+            args.update(usage._asdict())
+        self._add_event(f'{program}:{kind}', 'process', (start - self._origin) * 1e6, (end - self._origin) * 1e6,
+                        args)
+
+        labels = (('kind', kind), ('program', program))
+        status = 'ok' if returncode == 0 else 'failed'
+        with self._lock:
+            self._counters[('feijian_processes_total', labels + (('status', status),))] += 1
+            self._counters[('feijian_process_wall_seconds_total', labels)] += end - start
+            if usage is None:
+                return
+            self._counters[('feijian_process_cpu_seconds_total', labels + (('mode', 'user'),))] += usage.cpu_user
+            self._counters[('feijian_process_cpu_seconds_total', labels + (('mode', 'system'),))] += usage.cpu_system
+            for field, direction in (('io_read', 'read'), ('io_write', 'write')):
+                if getattr(usage, field) is not None:
+                    self._counters[('feijian_process_io_bytes_total', labels + (('direction', direction),))] += \
+                        getattr(usage, field)
+            for field, direction in (('disk_read', 'read'), ('disk_write', 'write')):
+                if getattr(usage, field) is not None:
+                    self._counters[('feijian_process_disk_bytes_total', labels + (('direction', direction),))] += \
+                        getattr(usage, field)
+            key = ('feijian_process_max_rss_bytes', labels)
+            self._gauges[key] = max(self._gauges.get(key, 0), usage.max_rss)
+
+    def wrap(self, fn):
+        """开启 cProfile 时让 fn 在自己的 Profile 中运行（cProfile 只采样启用它的线程）"""
+        if self.profile_path is None:
+            return fn
+
+        import cProfile
+
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12 起同一时间只能有一个 Profile 处于启用状态
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                with self._lock:
+                    self._profiles.append(profile)
+        return profiled
+
+    def chrome_trace(self):
+        with self._lock:
+            events = list(self._events)
+            threads = list(self._threads.values())
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                    for tid, name in threads]
+        return {'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}
+
+    def prometheus_text(self):
+        with self._lock:
+            samples = [(name, labels, value, 'counter') for (name, labels), value in self._counters.items()]
+            samples += [(name, labels, value, 'gauge') for (name, labels), value in self._gauges.items()]
+        lines = []
+        declared = set()
+        for name, labels, value, metric_type in sorted(samples):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f'# TYPE {name} {metric_type}')
+            label_text = ','.join(f'{key}="{value_}"' for key, value_ in labels)
+            value = int(value) if float(value).is_integer() else round(value, 6)
+            lines.append(f'{name}{{{label_text}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """把当前结果写入配置的路径（先写临时文件再替换，textfile 收集器不会读到半个文件）"""
+        if self.trace_path:
+            _write_atomic(self.trace_path, json.dumps(self.chrome_trace(), ensure_ascii=False))
+        if self.metrics_path:
+            _write_atomic(self.metrics_path, self.prometheus_text())
+        if self.profile_path:
+            with self._lock:
+                profiles = list(self._profiles)
+            if profiles:
+                import pstats
+                stats = pstats.Stats(profiles[0])
+                for profile in profiles[1:]:
+                    stats.add(profile)
+                stats.dump_stats(self.profile_path)
+
+
+class _NullTracer:
+    """关闭追踪时使用，所有记录都是空操作"""
+    enabled = False
+
+    def span(self, name, **args):
+        return contextlib.nullcontext()
+
+    def slot_wait(self, kind, start, end):
+        pass
+
+    def process(self, command, kind, start, end, returncode, usage):
+        pass
+
+    def wrap(self, fn):
+        return fn
+
+    def flush(self):
+        pass
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    partial_path = f'{path}.{os.getpid()}.tmp'
+    with open(partial_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(partial_path, path)
+
+
+NULL_TRACER = _NullTracer()
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def _from_env():
+    directory = os.environ.get('FEIJIAN_TRACE_DIR')
+    if not directory:
+        return NULL_TRACER
+    return Tracer(trace_path=os.path.join(directory, 'trace.json'),
+                  metrics_path=os.path.join(directory, 'feijian.prom'))
+
+
+def get_tracer():
+    """当前的追踪器；未开启时返回空操作的 NULL_TRACER"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = _from_env()
+    return _tracer
+
+
+def enable(trace_path=None, metrics_path=None, profile_path=None):
+    """开启追踪，替换当前追踪器"""
+    global _tracer
+    with _tracer_lock:
+        _tracer = Tracer(trace_path, metrics_path, profile_path)
+    return _tracer
+
+
+def disable():
+    global _tracer
+    with _tracer_lock:
+        _tracer = NULL_TRACER
+
+
+def span(name, **args):
+    return get_tracer().span(name, **args)
+
+
+def flush():
+    get_tracer().flush()
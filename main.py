@@ -1,12 +1,14 @@
 import sys
-import os
 import webbrowser
 from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget, QVBoxLayout, QWidget, QTabBar, QFileDialog, QProgressBar, QMessageBox
 from PyQt5.QtGui import QFont, QIcon, QCursor
 from PyQt5.QtCore import Qt, pyqtSignal, QThreadPool
 from image_base64 import get_icon_pixmap
-from split_tab import create_split_tab, SplitTask
-from montage_tab import create_montage_tab, MontageSignals, DurationCalculationTask, MontageTask
+from ui_components import STYLE_SHEET, LazyTab
+from feijian.progress import format_details
+
+# 启动时只导入界面骨架：两个标签页的模块在各自第一次显示时导入，
+# feijian 的处理模块（sqlite3、asyncio、numpy 等）在开始任务时才导入。启动耗时见 benchmarks/startup.py
 
 
 class CustomTabBar(QTabBar):
@@ -18,6 +20,7 @@ class CustomTabBar(QTabBar):
 class VideoEditorApp(QMainWindow):
     process_completed = pyqtSignal(str)
     progress_update = pyqtSignal(int)
+    status_update = pyqtSignal(object)
 
     def __init__(self):
         super().__init__()
@@ -28,11 +31,16 @@ class VideoEditorApp(QMainWindow):
         self.setWindowIcon(QIcon(get_icon_pixmap()))
 
         self.setFont(QFont('微软雅黑', 10))
+        # 所有控件共用一份样式表，只解析一次
+        self.setStyleSheet(STYLE_SHEET)
         self.threadpool = QThreadPool()
-        self.signals = MontageSignals()
-        self.signals.duration_calculated.connect(self.update_duration_label)
+        self.signals = None  # 混剪标签页创建时初始化
+        self.duration_task = None
+        self.probe_failures = 0
         self.process_completed.connect(self.show_completion_message)
         self.progress_update.connect(self.update_progress)
+        self.status_update.connect(self.update_status)
+        self.progress_details = ""
 
         cursor_pos = QCursor.pos()
         self.move(cursor_pos.x() - self.width() // 2, cursor_pos.y() - self.height() // 2)
@@ -51,52 +59,29 @@ class VideoEditorApp(QMainWindow):
         self.progress_bar.setValue(0)
         self.progress_bar.setFormat("0%")
         self.progress_bar.setAlignment(Qt.AlignRight)
-        self.progress_bar.setStyleSheet("""
-            QProgressBar {
-                border: 2px solid grey;
-                border-radius: 5px;
-                text-align: center;
-                font: bold 14px '微软雅黑';
-                color: black;
-            }
-            QProgressBar::chunk {
-                background-color: #6200EE;
-                width: 20px;
-                margin: 0.5px;
-            }
-        """)
         layout.addWidget(self.progress_bar)
 
         tabs = QTabWidget(self)
         custom_tab_bar = CustomTabBar(tabs)
         tabs.setTabBar(custom_tab_bar)
-        tabs.setStyleSheet("""
-            QTabWidget::pane {
-                border-top: 2px solid #6200EE;
-                background: #FFFFFF;
-                border-radius: 4px;
-            }
-            QTabBar::tab {
-                background: #F5F5F5;
-                padding: 16px 12px;  /* 增加上下内边距为16px，左右为12px */
-                min-height: 18px;    /* 设置最小高度为20px，根据需要调整 */
-                font: bold 18px '微软雅黑';  /* Tab上的字号显示大小 */
-                margin-right: 2px;
-                border: 1px solid #CCCCCC;
-                border-radius: 4px;
-                font-family: '微软雅黑';
-            }
-            QTabBar::tab:selected {
-                background: #6200EE;
-                color: white;
-                border: 1px solid #6200EE;
-            }
-        """)
-
-        tabs.addTab(create_split_tab(self), "分割")
-        tabs.addTab(create_montage_tab(self), "混剪")
+
+        # 标签页内容在第一次显示时才创建
+        tabs.addTab(LazyTab(self.build_split_tab), "分割")
+        tabs.addTab(LazyTab(self.build_montage_tab), "混剪")
         layout.addWidget(tabs)
 
+    def build_split_tab(self):
+        from split_tab import create_split_tab
+        return create_split_tab(self)
+
+    def build_montage_tab(self):
+        from montage_tab import create_montage_tab, MontageSignals
+        self.signals = MontageSignals()
+        self.signals.duration_calculated.connect(self.update_duration_label)
+        self.signals.duration_progress.connect(self.update_duration_progress)
+        self.signals.probe_failed.connect(self.record_probe_failure)
+        return create_montage_tab(self)
+
     def browse_folder(self):
         folder_path = QFileDialog.getExistingDirectory(self, "选择视频文件夹")
         if folder_path:
@@ -125,9 +110,12 @@ class VideoEditorApp(QMainWindow):
             QMessageBox.warning(self, "警告", "时长区间必须为整数！")
             return
 
+        from split_tab import SplitTask
         task = SplitTask(folder_path, export_path, min_duration, max_duration)
         task.signals.completed.connect(self.show_completion_message)
         task.signals.progress.connect(self.update_progress)  # 确保连接了进度信号
+        task.signals.error.connect(self.show_error_message)
+        task.signals.status.connect(self.update_status)
         self.threadpool.start(task)
 
     def browse_folder_montage(self):
@@ -141,12 +129,6 @@ class VideoEditorApp(QMainWindow):
         if export_path:
             self.export_input_montage.setText(export_path)
 
-    def handle_input_dropped(self, folder_path):
-        self.folder_input_deduplication.setText(folder_path)
-
-    def handle_output_dropped(self, folder_path):
-        self.export_input_deduplication.setText(folder_path)
-
     def start_montage(self):
         try:
             self.reset_progress_bar()
@@ -167,10 +149,42 @@ class VideoEditorApp(QMainWindow):
             # 使用最新的控件名称和逻辑
             order = "顺序合成" if self.sequential_radio.isChecked() else "乱序合成"
             mute = self.mute_checkbox.isChecked()
-
-            task = MontageTask(folder_path, export_path, order, target_duration, mute)
+            skip_dead = self.skip_dead_checkbox.isChecked()
+            # 近似重复的素材（重新上传、转码的同一段画面）只保留第一个
+            dedupe = 'drop' if self.dedupe_checkbox.isChecked() else None
+            cut_range = None
+            if self.cut_checkbox.isChecked():
+                try:
+                    cut_range = (int(self.cut_min_input.text()), int(self.cut_max_input.text()))
+                except ValueError:
+                    QMessageBox.warning(self, "警告", "片段时长必须为整数！")
+                    return
+                if cut_range[1] <= 0 or cut_range[0] > cut_range[1]:
+                    QMessageBox.warning(self, "警告", "片段时长区间无效！")
+                    return
+            renditions = None
+            if self.renditions_input_montage.text().strip():
+                from feijian.renditions import parse_renditions
+                try:
+                    renditions = parse_renditions(self.renditions_input_montage.text())
+                except ValueError as e:
+                    QMessageBox.warning(self, "警告", str(e))
+                    return
+
+            from montage_tab import MontageTask
+            task = MontageTask(folder_path, export_path, order, target_duration, mute, skip_dead=skip_dead,
+                               cut_range=cut_range, renditions=renditions,
+                               previews='all' if self.previews_checkbox_montage.isChecked() else (), dedupe=dedupe)
+            # 同样参数的混剪上次没有完成时，询问是否接着做
+            resume_folder = task.job.resumable_folder()
+            if resume_folder is not None:
+                reply = QMessageBox.question(self, '继续未完成的任务',
+                                             f"发现未完成的混剪任务：\n{resume_folder}\n是否继续？选择“否”将重新开始。",
+                                             QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+                task.job.resume = reply == QMessageBox.Yes
             task.signals.completed.connect(self.show_completion_message)
             task.signals.progress.connect(self.update_progress)
+            task.signals.status.connect(self.update_status)
             task.signals.error.connect(self.show_error_message)
             self.threadpool.start(task)
         except Exception as e:
@@ -184,28 +198,19 @@ class VideoEditorApp(QMainWindow):
         webbrowser.open(output_folder)
 
     def reset_progress_bar(self):
+        self.progress_details = ""
         self.progress_bar.setValue(0)
         self.progress_bar.setFormat("0%")
 
     def update_progress(self, value):
         # 在主线程中更新进度条
         self.progress_bar.setValue(value)
-        self.progress_bar.setFormat(f"{value}%")
+        self.progress_bar.setFormat(f"{value}%  {self.progress_details}".rstrip())
 
-    def show_completion_message(self, output_folder):
-        webbrowser.open(output_folder)
-
-    def load_folder_details(self, folder_path):
-        if not os.path.isdir(folder_path):
-            return
-        total_duration = 0
-        video_extensions = ('.mp4', '.avi', '.mov', '.mkv', '.3gp', '.flv', '.wmv', '.mpeg', '.mpg')
-        for video_file in os.listdir(folder_path):
-            if video_file.lower().endswith(video_extensions):
-                video_path = os.path.join(folder_path, video_file)
-                total_duration += self.get_video_duration(video_path)
-        self.total_duration_label.setText(f"总时长：{int(total_duration)}秒")
-        self.total_duration = total_duration
+    def update_status(self, info):
+        """速度、帧率和剩余时间显示在进度条文字里"""
+        self.progress_details = format_details(info)
+        self.update_progress(max(info.percent, self.progress_bar.value()))
 
     def handle_input_dropped(self, folder_path):
         self.folder_input_montage.setText(folder_path)
@@ -215,12 +220,30 @@ class VideoEditorApp(QMainWindow):
         self.export_input_montage.setText(folder_path)
 
     def start_duration_calculation_task(self, folder_path):
-        duration_task = DurationCalculationTask(folder_path, self.signals)
-        self.threadpool.start(duration_task)
+        # 换了文件夹就取消上一次还没跑完的扫描
+        if self.duration_task is not None:
+            self.duration_task.cancel()
+        self.total_duration = 0
+        self.probe_failures = 0
+        self.total_duration_label.setText("总时长：计算中...")
+        from montage_tab import DurationCalculationTask
+        self.duration_task = DurationCalculationTask(folder_path, self.signals)
+        self.threadpool.start(self.duration_task)
+
+    def update_duration_progress(self, duration, scanned):
+        self.total_duration_label.setText(f"总时长：{int(duration)}秒（已扫描{scanned}个）")
+        self.total_duration = duration
+        self.calculate_video_count()
+
+    def record_probe_failure(self, video_path, message):
+        # 无法读取的文件不计入总时长，只在统计结果里提示数量
+        self.probe_failures += 1
 
     def update_duration_label(self, duration):
-        self.total_duration_label.setText(f"总时长：{int(duration)}秒")
+        failures = f"（{self.probe_failures}个文件无法读取）" if self.probe_failures else ""
+        self.total_duration_label.setText(f"总时长：{int(duration)}秒{failures}")
         self.total_duration = duration
+        self.calculate_video_count()
 
     def calculate_video_count(self):
         if hasattr(self, 'total_duration') and self.total_duration > 0:
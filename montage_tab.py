@@ -1,166 +1,118 @@
-import math
 import os
-import sys
-import ctypes
-import tempfile
-import random
 import time
-import subprocess
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QCheckBox, QMessageBox, QFileDialog, \
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QCheckBox, QMessageBox, \
     QRadioButton, QButtonGroup
-from PyQt5.QtCore import QRunnable, pyqtSlot, QObject, pyqtSignal, QThreadPool
+from PyQt5.QtCore import QRunnable, pyqtSlot, QObject, pyqtSignal
 from PyQt5.QtGui import QFont
-from ui_components import MaterialButton, MaterialLineEdit
+from ui_components import MaterialButton, MaterialLineEdit as BaseLineEdit
 
+# 本模块在混剪标签页第一次显示时才导入；feijian 的处理模块在真正开始任务时才导入
 
-if sys.platform == 'win32':
-    no_window = subprocess.CREATE_NO_WINDOW
-else:
-    no_window = 0
 
 class MontageSignals(QObject):
     completed = pyqtSignal(str)
     error = pyqtSignal(str)
     duration_calculated = pyqtSignal(float)
+    duration_progress = pyqtSignal(float, int)  # 已扫描部分的总时长, 已扫描文件数
     progress = pyqtSignal(int)
+    status = pyqtSignal(object)  # feijian.progress.ProgressInfo
+    probe_failed = pyqtSignal(str, str)  # 探测失败的文件, 错误信息
 
 class MontageTask(QRunnable):
-    def __init__(self, folder_path, export_path, order, target_duration, mute=False):
+    def __init__(self, folder_path, export_path, order, target_duration, mute=False, resume=False, skip_dead=False,
+                 cut_range=None, renditions=None, previews=(), dedupe=None):
         super().__init__()
-        self.folder_path = folder_path
-        self.export_path = export_path
-        self.order = order
-        self.target_duration = target_duration
-        self.mute = mute
         self.signals = MontageSignals()
-
-    def get_short_path_name(self, long_name):
-        buffer = ctypes.create_unicode_buffer(512)
-        ctypes.windll.kernel32.GetShortPathNameW(long_name, buffer, len(buffer))
-        return buffer.value
-
-    def process_with_ffmpeg(self, video_files, output_video_path):
-        try:
-            video_files = [os.path.abspath(video_file) for video_file in video_files]
-
-            with tempfile.NamedTemporaryFile(delete=False, mode='w', encoding='utf-8', suffix='.txt') as f:
-                for video_file in video_files:
-                    f.write(f"file '{video_file}'\n")
-                f.flush()
-
-            command = [
-                'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
-                '-f', 'concat', '-safe', '0', '-i', f.name,
-                '-c:v', 'copy',
-            ]
-
-            if self.mute:
-                command.extend(['-an'])
-            else:
-                command.extend(['-c:a', 'copy'])
-
-            command.append(output_video_path)
-
-            result = subprocess.run(command, check=True, creationflags=no_window)
-
-            if result.returncode != 0:
-                self.signals.error.emit(f"FFmpeg 返回非零退出状态：{result.returncode}")
-
-        except subprocess.CalledProcessError as e:
-            self.signals.error.emit(f"FFmpeg 错误：{str(e)}")
-        except Exception as e:
-            self.signals.error.emit(f"发生错误：{str(e)}")
+        # 具体处理逻辑在不依赖 Qt 的 MontageJob 中，这里只负责把回调转成信号
+        options = dict(mute=mute, resume=resume, progress=self.signals.progress.emit,
+                       error=self.signals.error.emit, status=self.signals.status.emit, skip_dead=skip_dead,
+                       dedupe=dedupe)
+        if renditions:
+            # 输出规格：预设名/规格字符串的列表（见 feijian.renditions），每组只解码一次输出各规格
+            from feijian.renditions import parse_renditions
+            options['renditions'] = parse_renditions(renditions)
+        if previews:
+            # 预览种类（见 feijian.previews），'all' 表示缩略图、拼图和预览短片都生成
+            from feijian.previews import parse_previews
+            options['previews'] = parse_previews(previews)
+        if cut_range is not None:
+            # 剪切混剪：按 (最小, 最大) 时长直接从原素材取区间合成，不生成分割文件
+            from feijian.cut_montage_job import CutMontageJob
+            self.job = CutMontageJob(folder_path, export_path, order, target_duration, *cut_range, **options)
+        else:
+            from feijian.montage_job import MontageJob
+            self.job = MontageJob(folder_path, export_path, order, target_duration, **options)
 
     @pyqtSlot()
     def run(self):
         try:
-            video_files = []
-            video_extensions = ('.mp4', '.avi', '.mov', '.mkv', '.3gp', '.flv', '.wmv', '.mpeg', '.mpg')
-            for video_file in os.listdir(self.folder_path):
-                if video_file.lower().endswith(video_extensions):
-                    video_path = os.path.join(self.folder_path, video_file)
-                    video_files.append(video_path)
-
-            if self.order == "乱序合成":
-                random.shuffle(video_files)
-
-            # 获取所有视频的时长
-            video_durations = []
-            for video_file in video_files:
-                duration = self.get_video_duration(video_file)
-                video_durations.append((video_file, duration))
-
-            # 根据目标时长分组
-            groups = []
-            current_group = []
-            current_duration = 0.0
-            for video_file, duration in video_durations:
-                current_group.append(video_file)
-                current_duration += duration
-                if current_duration >= self.target_duration - 2:
-                    groups.append(current_group)
-                    current_group = []
-                    current_duration = 0.0
-
-            # 只有当current_duration达到目标时长时，才添加最后一组
-            if current_group and current_duration >= self.target_duration - 2:
-                groups.append(current_group)
-
-            total_groups = len(groups)
-
-            timestamp = time.strftime("%Y%m%d%H%M%S")
-            output_folder = os.path.join(self.export_path, f"合成结果_{timestamp}")
-            os.makedirs(output_folder, exist_ok=True)
-
-            for idx, group in enumerate(groups):
-                progress_percent = int((idx + 1) / total_groups * 100)
-                self.signals.progress.emit(progress_percent)
-
-                output_video_path = os.path.join(output_folder, f"montage_part_{idx + 1}_{timestamp}.mp4")
-                self.process_with_ffmpeg(group, output_video_path)
-
+            output_folder = self.job.run()
             self.signals.completed.emit(output_folder)
         except Exception as e:
             self.signals.error.emit(str(e))
-
-    def get_video_duration(self, video_path):
-        command = ['ffprobe', '-v', 'error', '-show_entries',
-                   'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', video_path]
-        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=no_window)
-        return float(process.stdout.decode().strip())
+        finally:
+            # 设置了 FEIJIAN_TRACE_DIR 时写出本次的追踪结果
+            from feijian import tracing
+            tracing.flush()
 
 
 class DurationCalculationTask(QRunnable):
-    def __init__(self, folder_path, signals):
+    """在线程池的一个线程里运行 asyncio 引擎，并发探测文件夹中所有视频，结果通过信号回到界面"""
+    # 进度信号的最短发送间隔（秒），避免几千个文件把界面事件队列塞满
+    PROGRESS_INTERVAL = 0.2
+
+    def __init__(self, folder_path, signals, max_probes=None):
         super().__init__()
         self.folder_path = folder_path
         self.signals = signals
+        from feijian.async_engine import AsyncProcessEngine
+        self.engine = AsyncProcessEngine(max_probes=max_probes)
+
+    def cancel(self):
+        """取消扫描：正在运行的 ffprobe 立即终止，不再发送任何信号"""
+        self.engine.cancel()
+
+    def is_cancelled(self):
+        return self.engine.cancelled
 
     @pyqtSlot()
     def run(self):
+        import asyncio
         try:
             total_duration = self.calculate_total_duration()
-            self.signals.duration_calculated.emit(total_duration)
+            if not self.is_cancelled():
+                self.signals.duration_calculated.emit(total_duration)
+        except asyncio.CancelledError:
+            pass
         except Exception as e:
-            self.signals.error.emit(str(e))
+            if not self.is_cancelled():
+                self.signals.error.emit(str(e))
 
     def calculate_total_duration(self):
-        total_duration = 0
-        video_extensions = ('.mp4', '.avi', '.mov', '.mkv', '.3gp', '.flv', '.wmv', '.mpeg', '.mpg')
-        for video_file in os.listdir(self.folder_path):
-            if video_file.lower().endswith(video_extensions):
-                video_path = os.path.join(self.folder_path, video_file)
-                total_duration += self.get_video_duration(video_path)
-        return total_duration
-
-    def get_video_duration(self, video_path):
-        command = ['ffprobe', '-v', 'error', '-show_entries',
-                   'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', video_path]
-        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=no_window)
-        return float(process.stdout.decode().strip())
-
-
-class MaterialLineEdit(QLineEdit):
+        state = {'total': 0.0, 'scanned': 0, 'last_emit': time.monotonic()}
+
+        def on_result(video_path, info, error):
+            # 在事件循环线程中回调
+            if error is not None:
+                # 单个文件探测失败不影响整体统计
+                if not self.is_cancelled():
+                    self.signals.probe_failed.emit(video_path, str(error))
+            else:
+                state['total'] += info.duration
+            state['scanned'] += 1
+
+            now = time.monotonic()
+            if now - state['last_emit'] >= self.PROGRESS_INTERVAL and not self.is_cancelled():
+                state['last_emit'] = now
+                self.signals.duration_progress.emit(state['total'], state['scanned'])
+
+        # 递归扫描，找到一个文件就开始探测，扫描大目录时总时长也会持续更新
+        from feijian import library
+        self.engine.run_sync(self.engine.probe_stream(library.scan(self.folder_path), on_result))
+        return state['total']
+
+
+class MaterialLineEdit(BaseLineEdit):
     pathDropped = pyqtSignal(str)
 
     def __init__(self, parent=None, app_reference=None, target="input"):
@@ -169,19 +121,6 @@ class MaterialLineEdit(QLineEdit):
         self.target = target
         self.setAcceptDrops(True)
         self.setFont(QFont('微软雅黑', 9))
-        self.setStyleSheet("""
-            MaterialLineEdit {
-                padding: 8px;
-                border: 1px solid #CCCCCC;
-                border-radius: 4px;
-                background-color: #F5F5F5;
-                font-family: '微软雅黑';
-                font-size: 9pt;
-            }
-            MaterialLineEdit:focus {
-                border-color: #6200EE;
-            }
-        """)
 
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
@@ -266,66 +205,32 @@ def create_montage_tab(parent):
     mute_layout = QHBoxLayout()
     parent.mute_checkbox = QCheckBox("静音导出")
     mute_layout.addWidget(parent.mute_checkbox)
+    parent.skip_dead_checkbox = QCheckBox("跳过黑屏/静音素材")
+    mute_layout.addWidget(parent.skip_dead_checkbox)
+    parent.dedupe_checkbox = QCheckBox("跳过重复素材")
+    mute_layout.addWidget(parent.dedupe_checkbox)
     layout.addLayout(mute_layout)
 
+    cut_layout = QHBoxLayout()
+    parent.cut_checkbox = QCheckBox("直接从原素材剪切（不生成分割文件），片段时长（秒）：")
+    cut_layout.addWidget(parent.cut_checkbox)
+    parent.cut_min_input = MaterialLineEdit()
+    parent.cut_min_input.setPlaceholderText("最小")
+    cut_layout.addWidget(parent.cut_min_input)
+    parent.cut_max_input = MaterialLineEdit()
+    parent.cut_max_input.setPlaceholderText("最大")
+    cut_layout.addWidget(parent.cut_max_input)
+    layout.addLayout(cut_layout)
+
+    parent.renditions_input_montage = MaterialLineEdit()
+    parent.renditions_input_montage.setPlaceholderText("输出规格（可选，逗号分隔，如 1080p,720p,vertical）")
+    layout.addWidget(parent.renditions_input_montage)
+
+    parent.previews_checkbox_montage = QCheckBox("同时生成预览（缩略图、拼图、预览短片）")
+    layout.addWidget(parent.previews_checkbox_montage)
+
     montage_button = MaterialButton("开始混剪")
     montage_button.clicked.connect(parent.start_montage)
     layout.addWidget(montage_button)
 
     return tab
-
-
-def handle_input_dropped(self, folder_path):
-    self.folder_input_montage.setText(folder_path)
-    self.calculate_total_duration()
-
-def handle_output_dropped(self, folder_path):
-    self.export_input_montage.setText(folder_path)
-
-def browse_folder_montage(self):
-    folder_path = QFileDialog.getExistingDirectory(self, "选择导入文件夹")
-    if folder_path:
-        self.folder_input_montage.setText(folder_path)
-        self.calculate_total_duration()
-
-def browse_export_folder_montage(self):
-    folder_path = QFileDialog.getExistingDirectory(self, "选择导出文件夹")
-    if folder_path:
-        self.export_input_montage.setText(folder_path)
-
-def calculate_total_duration(self):
-    folder_path = self.folder_input_montage.text()
-    if os.path.isdir(folder_path):
-        self.total_duration_label.setText("计算中...")
-        self.signals = MontageSignals()
-        self.signals.duration_calculated.connect(self.update_total_duration)
-        self.signals.error.connect(self.show_error_message)
-        self.duration_task = DurationCalculationTask(folder_path, self.signals)
-        QThreadPool.globalInstance().start(self.duration_task)
-
-def update_total_duration(self, total_duration):
-    self.total_duration = total_duration
-    self.total_duration_label.setText(f"总时长：{int(total_duration)}秒")
-    self.calculate_video_count()
-
-def calculate_video_count(self):
-    try:
-        target_duration = float(self.duration_input_montage.text())
-        if self.total_duration:
-            video_count = math.ceil(self.total_duration / self.target_duration)
-            self.video_count_label.setText(f"可合成的视频数量：{video_count}")
-        else:
-            self.video_count_label.setText("可合成的视频数量：0")
-    except ValueError:
-        self.video_count_label.setText("可合成的视频数量：0")
-
-
-def update_progress(self, value):
-    # 更新进度条逻辑，例如更新一个进度条组件
-    pass
-
-def montage_completed(self, output_folder):
-    QMessageBox.information(self, "完成", f"混剪完成，文件保存在：{output_folder}")
-
-def show_error_message(self, message):
-    QMessageBox.critical(self, "错误", message)
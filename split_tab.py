@@ -1,39 +1,19 @@
 import os
-import sys
-import platform
-import random
 import time
 import subprocess
-from concurrent.futures import ThreadPoolExecutor
-from PyQt5.QtCore import QRunnable, pyqtSlot, QObject, pyqtSignal, Qt, QThreadPool
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QFileDialog, QDialog, QPushButton, QSpacerItem, QSizePolicy, QMessageBox
+from PyQt5.QtCore import QRunnable, pyqtSlot, QObject, pyqtSignal, Qt
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QCheckBox, QFileDialog, QDialog, QPushButton, QSpacerItem, QSizePolicy, QMessageBox
 from PyQt5.QtGui import QFont, QDesktopServices
 from PyQt5.QtCore import QUrl
-from ui_components import MaterialButton
+from ui_components import MaterialButton, MaterialLineEdit as BaseLineEdit
 
-# 定义 no_window 变量
-if sys.platform == 'win32':
-    no_window = subprocess.CREATE_NO_WINDOW
-else:
-    no_window = 0
+# feijian 的处理模块（sqlite3、asyncio 等）在真正开始任务时才导入，不拖慢启动
 
-class MaterialLineEdit(QLineEdit):
+class MaterialLineEdit(BaseLineEdit):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setAcceptDrops(True)
         self.setFont(QFont('微软雅黑', 9))  # 设置字体为微软雅黑
-        self.setStyleSheet("""
-            MaterialLineEdit {
-                padding: 8px;
-                border: 1px solid #CCCCCC;
-                border-radius: 4px;
-                background-color: #F5F5F5;
-                font-family: '微软雅黑';
-            }
-            MaterialLineEdit:focus {
-                border-color: #6200EE;
-            }
-        """)
 
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
@@ -43,140 +23,51 @@ class MaterialLineEdit(QLineEdit):
         urls = event.mimeData().urls()
         if urls and urls[0].isLocalFile():
             file_path = urls[0].toLocalFile()
+            from feijian.library import is_video_name
             # 检查是否为有效的视频文件或目录
             if os.path.isdir(file_path):
                 self.setText(file_path)  # 处理文件夹
                 event.acceptProposedAction()
-            elif os.path.isfile(file_path) and file_path.lower().endswith(
-                    ('.mp4', '.mov', '.3gp', '.avi', '.mkv', '.flv', '.wmv', '.mpeg', '.mpg')):
+            elif os.path.isfile(file_path) and is_video_name(file_path):
                 self.setText(file_path)  # 处理有效的视频文件
                 event.acceptProposedAction()
 
 class SplitSignals(QObject):
     completed = pyqtSignal(str)
+    error = pyqtSignal(str)
     progress = pyqtSignal(int)
+    status = pyqtSignal(object)  # feijian.progress.ProgressInfo
 
 class SplitTask(QRunnable):
-    def __init__(self, path, export_path, min_duration, max_duration):
+    def __init__(self, path, export_path, min_duration, max_duration, fast_copy=False, autotune=True, resume=False,
+                 snap_scenes=False, renditions=None, previews=()):
         super(SplitTask, self).__init__()
-        self.path = path
-        self.export_path = export_path
-        self.min_duration = min_duration
-        self.max_duration = max_duration
         self.signals = SplitSignals()
-
-    def get_video_duration(self, video_path):
-        """获取视频的持续时间"""
-        command = ['ffprobe', '-v', 'error', '-show_entries',
-                   'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', video_path]
-        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=no_window)
-        return float(process.stdout.decode().strip())
+        from feijian.split_job import SplitJob
+        if renditions:
+            # 输出规格：预设名/规格字符串的列表（见 feijian.renditions），每个源文件只解码一次输出各规格
+            from feijian.renditions import parse_renditions
+            renditions = parse_renditions(renditions)
+        if previews:
+            # 预览种类（见 feijian.previews），'all' 表示缩略图、拼图和预览短片都生成
+            from feijian.previews import parse_previews
+            previews = parse_previews(previews)
+        # 具体处理逻辑在不依赖 Qt 的 SplitJob 中，这里只负责把进度转成信号
+        self.job = SplitJob(path, export_path, min_duration, max_duration, fast_copy, autotune,
+                            progress=self.signals.progress.emit, status=self.signals.status.emit, resume=resume,
+                            snap_scenes=snap_scenes, renditions=renditions, previews=previews)
 
     @pyqtSlot()
     def run(self):
         try:
-            # 如果是文件夹，遍历文件夹中的视频文件
-            if os.path.isdir(self.path):
-                output_folder = self.split_videos_in_folder()
-            # 如果是单个文件，直接处理该文件
-            else:
-                output_folder = self.split_single_video(self.path)
-
+            output_folder = self.job.run()
             self.signals.completed.emit(output_folder)
         except Exception as e:
-            print(f"Error occurred: {e}")
-
-    def split_videos_in_folder(self):
-        output_folder = self.export_path
-
-        video_extensions = ('.mp4', '.avi', '.mov', '.mkv', '.3gp', '.flv', '.wmv', '.mpeg', '.mpg')
-        video_files = [f for f in os.listdir(self.path) if f.lower().endswith(video_extensions)]
-
-        total_videos = len(video_files)
-        processed_videos = 0
-
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            futures = []
-            for video_file in video_files:
-                video_path = os.path.join(self.path, video_file)
-                futures.append(executor.submit(self.split_single_video, video_path, output_folder))
-
-            for future in futures:
-                future.result()
-
-                processed_videos += 1
-                progress = int((processed_videos / total_videos) * 100)
-                self.signals.progress.emit(progress)  # 这里更新总进度
-
-        return output_folder
-
-    def split_single_video(self, video_path, output_folder=None):
-        if output_folder is None:
-            output_folder = self.export_path
-
-        video_clip_duration = self.get_video_duration(video_path)
-        start_time = 0
-        total_segments = 0  # 记录总片段数
-
-        # 先计算片段数
-        while start_time < video_clip_duration:
-            duration = random.randint(self.min_duration, self.max_duration)
-            start_time += duration
-            total_segments += 1
-
-        start_time = 0  # 重置开始时间
-        progress_increment = 100 / total_segments if total_segments > 0 else 0
-
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            futures = []
-            for part in range(1, total_segments + 1):
-                duration = random.randint(self.min_duration, self.max_duration)
-                end_time = min(start_time + duration, video_clip_duration)
-
-                output_video_path = os.path.join(output_folder,
-                                                 f"{os.path.splitext(os.path.basename(video_path))[0]}_part{part}.mp4")
-                futures.append(executor.submit(self.process_clip, video_path, start_time, end_time, output_video_path))
-
-                # 记录处理开始时间
-                start_time = end_time  # Move to the next segment
-
-            # 遍历所有的 future，确保捕获任何异常
-            for i, future in enumerate(futures):
-                try:
-                    future.result()  # 获取结果，捕获异常
-                    self.signals.progress.emit(min(int((i + 1) * progress_increment), 100))  # 避免超出100%
-                except Exception as e:
-                    print(f"Error processing segment {i + 1}: {e}")
-                    self.signals.progress.emit(min(int((i + 1) * progress_increment), 100))  # 强制更新进度
-
-        # 确保最后一次更新进度条为100%
-        self.signals.progress.emit(100)
-
-        return output_folder
-
-    def process_clip(self, video_path, start_time, end_time, output_video_path):
-        self.extract_subclip(video_path, start_time, end_time, output_video_path)
-
-    def extract_subclip(self, video_path, start_time, end_time, output_path):
-        """提取子剪辑"""
-        video_codec = 'libx264'
-        preset = 'ultrafast'
-
-        command = [
-            'ffmpeg', '-y', '-loglevel', 'error', '-i', video_path,
-            '-ss', str(start_time), '-to', str(end_time),
-            '-c:v', video_codec, '-preset', preset, '-crf', '23',
-            '-c:a', 'aac', '-b:a', '128k',
-            output_path
-        ]
-
-        try:
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
-                                    creationflags=no_window)
-        except subprocess.CalledProcessError as e:
-            error_message = e.stderr.decode('utf-8').strip()
-            print(f"Failed to extract subclip: {error_message}")
-            raise Exception(f"FFmpeg 错误: {error_message}")
+            self.signals.error.emit(str(e))
+        finally:
+            # 设置了 FEIJIAN_TRACE_DIR 时写出本次的追踪结果
+            from feijian import tracing
+            tracing.flush()
 
 
 class SplitTab(QWidget):
@@ -230,6 +121,19 @@ class SplitTab(QWidget):
 
         layout.addLayout(duration_layout)
 
+        self.fast_copy_checkbox = QCheckBox("快速分割（不重新编码，切点对齐关键帧）")
+        layout.addWidget(self.fast_copy_checkbox)
+
+        self.snap_scenes_checkbox = QCheckBox("切点对齐镜头切换（首次需要分析素材）")
+        layout.addWidget(self.snap_scenes_checkbox)
+
+        self.renditions_input = MaterialLineEdit()
+        self.renditions_input.setPlaceholderText("输出规格（可选，逗号分隔，如 1080p,720p,vertical）")
+        layout.addWidget(self.renditions_input)
+
+        self.previews_checkbox = QCheckBox("同时生成预览（缩略图、拼图、预览短片）")
+        layout.addWidget(self.previews_checkbox)
+
         self.split_button = MaterialButton("开始分割")
         self.split_button.clicked.connect(self.on_split_button_clicked)
         layout.addWidget(self.split_button)
@@ -237,7 +141,7 @@ class SplitTab(QWidget):
     def on_split_button_clicked(self):
         """当用户点击‘开始分割’按钮后执行"""
         # 重置进度条
-        self.main_window.progress_bar.setValue(0)
+        self.main_window.reset_progress_bar()
         self.dialog_shown = False  # 重置对话框状态
         self.split_button.setEnabled(True)  # 确保按钮可用
 
@@ -264,8 +168,8 @@ class SplitTab(QWidget):
             return
 
         # **检查导入路径是否为目录或支持的视频文件**
-        valid_video_extensions = ('.mp4', '.avi', '.mov', '.mkv', '.3gp', '.flv', '.wmv', '.mpeg', '.mpg')
-        if not (os.path.isdir(folder_path) or folder_path.lower().endswith(valid_video_extensions)):
+        from feijian.library import is_video_name
+        if not (os.path.isdir(folder_path) or is_video_name(folder_path)):
             QMessageBox.warning(self, "输入错误", "指定的导入路径不是有效的文件夹或支持的视频文件。")
             return
 
@@ -302,10 +206,39 @@ class SplitTab(QWidget):
             QMessageBox.warning(self, "输入错误", "最小时长不能大于最大时长。")
             return
 
-        # 创建带时间戳的导出目录
-        timestamp = time.strftime("%Y%m%d%H%M%S")
-        export_folder = os.path.join(export_path, f"非丨本次分割结果_{timestamp}")
-        os.makedirs(export_folder, exist_ok=True)
+        fast_copy = self.fast_copy_checkbox.isChecked()
+        snap_scenes = self.snap_scenes_checkbox.isChecked()
+        renditions = None
+        if self.renditions_input.text().strip():
+            from feijian.renditions import parse_renditions
+            try:
+                renditions = parse_renditions(self.renditions_input.text())
+            except ValueError as e:
+                QMessageBox.warning(self, "输入错误", str(e))
+                return
+        previews = ()
+        if self.previews_checkbox.isChecked():
+            from feijian.previews import PREVIEW_KINDS
+            previews = PREVIEW_KINDS
+
+        # 同样参数的任务上次没有完成时，询问是否接着做
+        from feijian import journal
+        from feijian.split_job import OUTPUT_PREFIX, SplitJob
+        params = SplitJob(folder_path, export_path, min_duration, max_duration, fast_copy,
+                          snap_scenes=snap_scenes, renditions=renditions, previews=previews).journal_params()
+        export_folder = journal.find_resumable(export_path, 'split', params, OUTPUT_PREFIX)
+        resume = False
+        if export_folder is not None:
+            reply = QMessageBox.question(self, '继续未完成的任务',
+                                         f"发现未完成的分割任务：\n{export_folder}\n是否继续？选择“否”将重新开始。",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            resume = reply == QMessageBox.Yes
+
+        if not resume:
+            # 创建带时间戳的导出目录
+            timestamp = time.strftime("%Y%m%d%H%M%S")
+            export_folder = os.path.join(export_path, f"{OUTPUT_PREFIX}{timestamp}")
+            os.makedirs(export_folder, exist_ok=True)
 
         # 自动打开新建的导出文件夹
         if os.name == 'nt':  # Windows 系统
@@ -314,13 +247,17 @@ class SplitTab(QWidget):
             subprocess.run(['xdg-open', export_folder])
 
         # 创建分割任务，使用新建的导出文件夹
-        split_task = SplitTask(folder_path, export_folder, min_duration, max_duration)
+        split_task = SplitTask(folder_path, export_folder, min_duration, max_duration,
+                               fast_copy=fast_copy, resume=resume, snap_scenes=snap_scenes, renditions=renditions,
+                               previews=previews)
 
         # 将 SplitTask 的 progress 信号连接到主窗口的 progress_update 信号
         split_task.signals.progress.connect(self.main_window.progress_update, Qt.QueuedConnection)
+        split_task.signals.status.connect(self.main_window.status_update, Qt.QueuedConnection)
 
         split_task.signals.completed.connect(self.on_split_completed)
-        QThreadPool.globalInstance().start(split_task)
+        # 与混剪共用主窗口的线程池
+        self.main_window.threadpool.start(split_task)
 
     def on_split_completed(self, output_folder):
         """当分割完成时执行"""
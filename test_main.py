@@ -0,0 +1,12 @@
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from benchmarks import startup  # noqa: E402
+
+
+def test_import_main_defers_processing_modules():
+    # 在新进程中 import main，本进程已导入的模块不影响结果
+    _, modules = startup.measure_import()
+    assert startup.loaded(modules, startup.DEFERRED_MODULES) == []
+
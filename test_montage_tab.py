@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from montage_tab import DurationCalculationTask  # noqa: E402
+
+
+class _Signal:
+    def __init__(self):
+        self.calls = []
+
+    def emit(self, *args):
+        self.calls.append(args)
+
+
+class _Signals:
+    def __init__(self):
+        self.duration_calculated = _Signal()
+        self.duration_progress = _Signal()
+        self.error = _Signal()
+        self.probe_failed = _Signal()
+
+
+def test_total_duration_with_progress(tmp_path, fake_media):
+    folder = tmp_path / 'clips'
+    fake_media(folder / 'a.mp4', 10)
+    fake_media(folder / 'b.mp4', 20.5)
+    fake_media(folder / 'sub' / 'c.mp4', 4)
+    # 探测失败的文件不计入总时长，也不中断统计
+    fake_media(folder / 'broken.mp4', None)
+    signals = _Signals()
+    task = DurationCalculationTask(str(folder), signals, max_probes=2)
+    task.PROGRESS_INTERVAL = 0
+
+    task.run()
+
+    assert signals.duration_calculated.calls == [(pytest.approx(34.5),)]
+    assert signals.error.calls == []
+    # 探测失败的文件通过信号报告，由界面提示数量
+    assert [os.path.basename(path) for path, _ in signals.probe_failed.calls] == ['broken.mp4']
+    totals = [total for total, _ in signals.duration_progress.calls]
+    assert totals == sorted(totals)
+    assert [scanned for _, scanned in signals.duration_progress.calls][-1] == 4
+
+
+def test_cancelled_task_emits_nothing(tmp_path, fake_media):
+    fake_media(tmp_path / 'clips' / 'a.mp4', 10)
+    signals = _Signals()
+    task = DurationCalculationTask(str(tmp_path / 'clips'), signals)
+    task.cancel()
+
+    task.run()
+
+    assert signals.duration_calculated.calls == []
+    assert signals.duration_progress.calls == []
+    assert signals.error.calls == []
@@ -1,40 +1,94 @@
-from PyQt5.QtWidgets import QPushButton, QLineEdit
+from PyQt5.QtWidgets import QPushButton, QLineEdit, QWidget, QVBoxLayout
+
+# 整个窗口共用的样式表，由主窗口设置一次；控件本身不再各自解析样式
+STYLE_SHEET = """
+    QProgressBar {
+        border: 2px solid grey;
+        border-radius: 5px;
+        text-align: center;
+        font: bold 14px '微软雅黑';
+        color: black;
+    }
+    QProgressBar::chunk {
+        background-color: #6200EE;
+        width: 20px;
+        margin: 0.5px;
+    }
+    QTabWidget::pane {
+        border-top: 2px solid #6200EE;
+        background: #FFFFFF;
+        border-radius: 4px;
+    }
+    QTabBar::tab {
+        background: #F5F5F5;
+        padding: 16px 12px;  /* 增加上下内边距为16px，左右为12px */
+        min-height: 18px;    /* 设置最小高度为20px，根据需要调整 */
+        font: bold 18px '微软雅黑';  /* Tab上的字号显示大小 */
+        margin-right: 2px;
+        border: 1px solid #CCCCCC;
+        border-radius: 4px;
+        font-family: '微软雅黑';
+    }
+    QTabBar::tab:selected {
+        background: #6200EE;
+        color: white;
+        border: 1px solid #6200EE;
+    }
+    MaterialButton {
+        background-color: #6200EE;
+        color: white;
+        padding: 8px 16px;
+        border-radius: 4px;
+        font-family: '微软雅黑';
+        font-size: 14px;  /* 确保字体大小适中 */
+        font-weight: normal;  /* 不加粗字体 */
+    }
+    MaterialButton:hover {
+        background-color: #3700B3;
+    }
+    MaterialButton:pressed {
+        background-color: #03DAC5;
+    }
+    MaterialButton:focus {
+        outline: none;  /* 去除焦点虚线 */
+    }
+    MaterialLineEdit {
+        padding: 8px;
+        border: 1px solid #CCCCCC;
+        border-radius: 4px;
+        background-color: #F5F5F5;
+        font-family: '微软雅黑';
+    }
+    MaterialLineEdit:focus {
+        border-color: #6200EE;
+    }
+"""
+
 
 class MaterialButton(QPushButton):
-    def __init__(self, text, parent=None):
-        super().__init__(text, parent)
-        self.setStyleSheet("""
-            MaterialButton {
-                background-color: #6200EE;
-                color: white;
-                padding: 8px 16px;
-                border-radius: 4px;
-                font-family: '微软雅黑';
-                font-size: 14px;  /* 确保字体大小适中 */
-                font-weight: normal;  /* 不加粗字体 */
-            }
-            MaterialButton:hover {
-                background-color: #3700B3;
-            }
-            MaterialButton:pressed {
-                background-color: #03DAC5;
-            }
-            MaterialButton:focus {
-                outline: none;  /* 去除焦点虚线 */
-            }
-        """)
+    """样式见 STYLE_SHEET"""
+
+
 class MaterialLineEdit(QLineEdit):
-    def __init__(self, parent=None):
+    """样式见 STYLE_SHEET"""
+
+
+class LazyTab(QWidget):
+    """标签页容器，第一次显示时才调用 builder() 创建里面的内容"""
+
+    def __init__(self, builder, parent=None):
         super().__init__(parent)
-        self.setStyleSheet("""
-            MaterialLineEdit {
-                padding: 8px;
-                border: 1px solid #CCCCCC;
-                border-radius: 4px;
-                background-color: #F5F5F5;
-                font-family: '微软雅黑';
-            }
-            MaterialLineEdit:focus {
-                border-color: #6200EE;
-            }
-        """)
+        self.builder = builder
+        self.content = None
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+    def ensure_built(self):
+        if self.content is None:
+            self.content = self.builder()
+            self.layout().addWidget(self.content)
+        return self.content
+
+    def showEvent(self, event):
+        self.ensure_built()
+        super().showEvent(event)